@@ -1,11 +1,10 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import Optional, List
-from app.services import processor, analytics_engine
-from app.core.agent import LLMAgent
+from app.services import processor, analytics_engine, agent
+from app.core.column_cache import dataset_token
 
 router = APIRouter(prefix="/analytics", tags=["analytics"])
-agent = LLMAgent()
 
 class AnalyticsRequest(BaseModel):
     file_id: str
@@ -50,14 +49,17 @@ async def initial_analysis(request: AnalysisRequest):
     metadata_list = []
     target_files = set(request.filenames)
     
-    for filename, df in processor.data_store.items():
+    for filename in processor.data_store:
         if filename in target_files:
+            df = processor.data_store[filename]
             # Extract metadata
             meta = {
                 "filename": filename,
                 "columns": list(df.columns),
                 "shape": df.shape,
-                "head": df.head().to_dict(orient='records')
+                "head": df.head().to_dict(orient='records'),
+                # Parsed date columns are cached per dataset version
+                "token": dataset_token(processor.data_store, filename),
             }
             metadata_list.append(meta)
     
@@ -1,39 +1,112 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from typing import List
-import shutil
-import os
-from app.services import processor, lineage_tracker
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query, Request, Response
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel
+from typing import List, Optional
+import hashlib
+import json
+from app.services import processor, lineage_tracker, ingestion_jobs
 
 router = APIRouter(prefix="/data", tags=["data"])
 
+class PinRequest(BaseModel):
+    filename: str
+    pinned: bool = True
+
+def _ingest(file_obj, filename, size, chunked=None, all_sheets=False, sheets=None, progress=None):
+    """Load one uploaded file (optionally per sheet) and record its lineage; returns the metas."""
+    if all_sheets or sheets:
+        sheet_metas = processor.load_sheets(file_obj, filename, sheets, progress=progress)
+    else:
+        sheet_metas = [processor.load_file(file_obj, filename, chunked, progress=progress)]
+
+    # Track Lineage
+    lineage_tracker.add_node(filename, "source", filename, {"size": size})
+    for meta in sheet_metas:
+        if meta["filename"] != filename:
+            lineage_tracker.add_node(meta["filename"], "source", meta["sheet_name"], {"rows": meta["shape"][0]})
+            lineage_tracker.add_edge(filename, meta["filename"], "Sheet")
+    return sheet_metas
+
 @router.post("/upload")
-async def upload_files(files: List[UploadFile] = File(...)):
+async def upload_files(
+    files: List[UploadFile] = File(...),
+    chunked: Optional[bool] = Query(None, description="Force (true) or disable (false) chunked CSV ingestion; default picks by size"),
+    all_sheets: bool = Query(False, description="Load every sheet of a workbook as its own dataset (<file>::<sheet>)"),
+    sheets: Optional[List[str]] = Query(None, description="Load only these sheets as separate datasets"),
+    background: bool = Query(False, description="Return job IDs immediately and parse in the background (poll /data/jobs/{job_id})"),
+):
     results = []
+    jobs = []
     for file in files:
-        temp_path = f"temp_{file.filename}"
         try:
-            with open(temp_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
+            if background:
+                # The job gets its own copy of the upload; parsing happens in
+                # the ingestion worker pool, not in this request
+                filename, size = file.filename, file.size
+                work = lambda stream, progress, filename=filename, size=size: _ingest(
+                    stream, filename, size, chunked, all_sheets, sheets, progress
+                )
+                job = await run_in_threadpool(ingestion_jobs.submit, file.file, filename, work)
+                jobs.append(job.to_dict())
+                continue
 
-            with open(temp_path, "rb") as f:
-                meta = processor.load_file(f, file.filename)
-
-            results.append(meta)
-
-            # Track Lineage
-            lineage_tracker.add_node(file.filename, "source", file.filename, {"size": file.size})
+            # Parse straight from the spooled upload stream; no temp_ copy in the
+            # working directory. Parsing runs in the threadpool so the event loop
+            # stays free for other requests.
+            sheet_metas = await run_in_threadpool(
+                _ingest, file.file, file.filename, file.size, chunked, all_sheets, sheets
+            )
+            results.extend(sheet_metas)
         except Exception as exc:
             raise HTTPException(status_code=400, detail=str(exc))
         finally:
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
+            await file.close()
 
+    if background:
+        return {"uploaded": results, "jobs": jobs}
     return {"uploaded": results}
 
+@router.get("/jobs")
+def list_jobs():
+    return [job.to_dict() for job in ingestion_jobs.list()]
+
+@router.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    """Status of a background upload: stage, bytes read, rows parsed and, once done, the metadata."""
+    job = ingestion_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@router.post("/jobs/{job_id}/cancel")
+def cancel_job(job_id: str):
+    job = ingestion_jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
 @router.get("/list")
-def list_data():
-    files = []
-    for filename, df in processor.data_store.items():
-        meta = processor._extract_metadata(df, filename)
-        files.append(meta)
+def list_data(request: Request, response: Response):
+    # The list only changes when a dataset is added, replaced or removed, and
+    # each of those changes the name -> version map
+    versions = processor.data_store.versions()
+    etag = '"' + hashlib.sha1(json.dumps(sorted(versions.items())).encode("utf-8")).hexdigest() + '"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    files = processor.get_metadata_many(versions)
+    response.headers["ETag"] = etag
     return files
+
+@router.get("/store")
+def store_stats():
+    """Memory budget, resident/spilled datasets and hit/load/eviction counters."""
+    return processor.data_store.stats()
+
+@router.post("/store/pin")
+def pin_dataset(request: PinRequest):
+    try:
+        processor.data_store.pin(request.filename, request.pinned)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="File not found")
+    return {"success": True, "filename": request.filename, "pinned": request.pinned}
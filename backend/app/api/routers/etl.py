@@ -1,32 +1,70 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
-from app.services import processor, etl, anomaly_detector, reconciler, lineage_tracker
+from app.services import processor, etl, anomaly_detector, anomaly_runs, reconciler, lineage_tracker, ontology_engine
+from app.core.anomaly_runs import DEFAULT_PAGE_SIZE
+from app.core.anomaly_rules import ExpressionRule
+from app.core.column_cache import dataset_token
+from app.core.reconciliation import MAX_DRILLDOWN_ROWS
 
 router = APIRouter(prefix="/etl", tags=["etl"])
 
 class MergeRequest(BaseModel):
     filenames: List[str]
     output_name: str = "merged_dataset"
+    # Line up differently named columns through the ontology concepts
+    use_ontology: bool = False
 
 class AnomalyRequest(BaseModel):
     filename: str
     rules: Optional[Dict[str, Any]] = None
+    # Only check rows appended since the previous incremental run
+    incremental: bool = False
+    # Details returned inline; the whole run is paged via /etl/anomaly/runs/{run_id}
+    page_size: int = DEFAULT_PAGE_SIZE
+
+class RuleRequest(BaseModel):
+    name: str
+    expression: str
+    description: str = ""
+    type: Optional[str] = None
 
 class ReconcileRequest(BaseModel):
     internal_filename: str
     external_filename: str
     mapping: Dict[str, Dict[str, str]]
+    # "exact", "fuzzy", "partitioned", "incremental" or "aggregate" (see Reconciler.reconcile); options are mode specific
+    mode: str = "exact"
+    options: Dict[str, Any] = {}
+
+class DrilldownRequest(BaseModel):
+    internal_filename: str
+    external_filename: str
+    mapping: Dict[str, Dict[str, str]]
+    # Internal key column -> value, as reported in reconcile results
+    key: Dict[str, Any]
+    limit: int = MAX_DRILLDOWN_ROWS
 
 @router.post("/merge")
 def merge_data(request: MergeRequest):
     try:
-        merged_df = etl.merge_files(processor.data_store, request.filenames)
+        column_mapping = None
+        if request.use_ontology:
+            metadata_list = [processor.get_metadata(f) for f in request.filenames if f in processor.data_store]
+            column_mapping = ontology_engine.column_mapping(metadata_list)
+
+        merged_df = etl.merge_files(
+            processor.data_store,
+            request.filenames,
+            column_mapping=column_mapping,
+            output_path=processor.new_partition_path(),
+        )
         
         output_name = f"{request.output_name}.csv"
         processor.data_store[output_name] = merged_df
         
-        meta = processor._extract_metadata(merged_df, output_name)
+        meta = processor.get_metadata(output_name)
         
         # Lineage
         merge_node_id = f"merge_{output_name}"
@@ -52,25 +90,146 @@ def detect_anomalies(request: AnomalyRequest):
     try:
         # If rules are not provided, infer sensible defaults from the data itself.
         rules = request.rules or anomaly_detector.infer_rules(df)
-        results = anomaly_detector.check_rules(df, rules)
-        return {"success": True, "results": results}
+        token = dataset_token(processor.data_store, request.filename)
+        if request.incremental:
+            results = anomaly_detector.check_rules_incremental(df, rules, request.filename, token=token)
+        else:
+            results = anomaly_detector.check_rules(df, rules, token=token)
+        run = anomaly_runs.save(results["details"], request.filename, {"incremental": results.get("incremental")})
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+    # First page inline so the UI can render right away
+    try:
+        page = anomaly_runs.page(run["run_id"], 0, request.page_size)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Anomaly run not found")
+    results.update({
+        "run_id": run["run_id"],
+        "counts": run["counts"],
+        "details": page["details"],
+        "page": {"offset": 0, "limit": request.page_size, "returned": len(page["details"])},
+    })
+    return {"success": True, "results": results}
+
+@router.get("/anomaly/runs")
+def list_anomaly_runs():
+    return {"runs": anomaly_runs.list()}
+
+@router.get("/anomaly/runs/{run_id}")
+def get_anomaly_page(
+    run_id: str,
+    offset: int = 0,
+    limit: int = DEFAULT_PAGE_SIZE,
+    type: Optional[str] = None,
+    rule: Optional[str] = None,
+    column: Optional[str] = None,
+    user_id: Optional[str] = None,
+):
+    run = anomaly_runs.get(run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail="Anomaly run not found")
+    try:
+        page = anomaly_runs.page(run_id, offset, limit, type=type, rule=rule, column=column, user_id=user_id)
+    except KeyError:
+        # Pruned since the lookup
+        raise HTTPException(status_code=404, detail="Anomaly run not found")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"success": True, "run": run, **page}
+
+@router.get("/anomaly/runs/{run_id}/stream")
+def stream_anomalies(
+    run_id: str,
+    type: Optional[str] = None,
+    rule: Optional[str] = None,
+    column: Optional[str] = None,
+    user_id: Optional[str] = None,
+):
+    """All (filtered) anomalies of a run, one JSON object per line."""
+    try:
+        lines = anomaly_runs.stream(run_id, type=type, rule=rule, column=column, user_id=user_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Anomaly run not found")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(lines, media_type="application/x-ndjson")
+
+@router.delete("/anomaly/runs/{run_id}")
+def delete_anomaly_run(run_id: str):
+    if not anomaly_runs.delete(run_id):
+        raise HTTPException(status_code=404, detail="Anomaly run not found")
+    return {"success": True}
+
+@router.get("/anomaly/rules")
+def list_anomaly_rules():
+    return {"rules": anomaly_detector.rules.list()}
+
+@router.post("/anomaly/rules")
+def add_anomaly_rule(request: RuleRequest):
+    """Register an expression rule; enable it per run with {"<name>": true} in `rules`."""
+    try:
+        rule = anomaly_detector.rules.register(
+            ExpressionRule(request.name, request.expression, request.description, request.type)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"success": True, "rule": rule.to_dict()}
+
+@router.delete("/anomaly/rules/{name}")
+def remove_anomaly_rule(name: str):
+    try:
+        removed = anomaly_detector.rules.unregister(name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not removed:
+        raise HTTPException(status_code=404, detail="Rule not found")
+    return {"success": True}
+
 @router.post("/reconcile")
 def reconcile_data(request: ReconcileRequest):
     if request.internal_filename not in processor.data_store or request.external_filename not in processor.data_store:
         raise HTTPException(status_code=404, detail="One or both files not found")
     
-    df_int = processor.data_store[request.internal_filename]
-    df_ext = processor.data_store[request.external_filename]
+    if request.mode == "partitioned":
+        # Read chunk by chunk; lazy datasets are never loaded whole
+        df_int = processor.data_store[request.internal_filename]
+        df_ext = processor.data_store[request.external_filename]
+    else:
+        df_int = processor.get_dataframe(request.internal_filename)
+        df_ext = processor.get_dataframe(request.external_filename)
     
     try:
-        results = reconciler.reconcile_datasets(
+        results = reconciler.reconcile(
             df_int, 
             df_ext, 
-            request.mapping
+            request.mapping,
+            mode=request.mode,
+            options=request.options,
+            internal_token=dataset_token(processor.data_store, request.internal_filename),
+            external_token=dataset_token(processor.data_store, request.external_filename),
         )
         return {"success": True, "results": results}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/reconcile/drilldown")
+def reconcile_drilldown(request: DrilldownRequest):
+    if request.internal_filename not in processor.data_store or request.external_filename not in processor.data_store:
+        raise HTTPException(status_code=404, detail="One or both files not found")
+
+    df_int = processor.get_dataframe(request.internal_filename)
+    df_ext = processor.get_dataframe(request.external_filename)
+    try:
+        members = reconciler.drilldown(
+            df_int,
+            df_ext,
+            request.mapping,
+            request.key,
+            internal_token=dataset_token(processor.data_store, request.internal_filename),
+            external_token=dataset_token(processor.data_store, request.external_filename),
+            limit=request.limit,
+        )
+    except (KeyError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"success": True, **members}
@@ -9,7 +9,7 @@ def download_file(filename: str, format: str = "csv"):
     if filename not in processor.data_store:
         raise HTTPException(status_code=404, detail="File not found")
     
-    df = processor.data_store[filename]
+    df = processor.get_dataframe(filename)
     
     if format.lower() == "excel":
         output_filename = f"download_{filename.split('.')[0]}.xlsx"
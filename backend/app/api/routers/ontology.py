@@ -2,6 +2,7 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import List, Dict, Any
 from app.services import processor, ontology_engine
+from app.core.processor import split_dataset_name
 
 router = APIRouter(prefix="/ontology", tags=["ontology"])
 
@@ -9,11 +10,16 @@ router = APIRouter(prefix="/ontology", tags=["ontology"])
 def infer_ontology():
     # Get metadata from all loaded files
     metadata_list = []
-    for filename, df in processor.data_store.items():
+    # Cached metadata: no need to load every dataset just for its columns
+    for meta in processor.get_metadata_many(list(processor.data_store)):
+        filename = meta["filename"]
+        source_id, sheet_name = split_dataset_name(filename)
         metadata_list.append({
             "filename": filename,
-            "columns": list(df.columns),
-            "shape": df.shape
+            "source_id": source_id,
+            "sheet_name": sheet_name,
+            "columns": meta["columns"],
+            "shape": meta["shape"]
         })
     
     try:
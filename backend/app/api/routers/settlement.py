@@ -2,6 +2,7 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
 from app.services import processor, franchise_settlement, biz_settlement
+from app.core.column_cache import dataset_token
 
 router = APIRouter(prefix="/settlement", tags=["settlement"])
 
@@ -27,13 +28,16 @@ def check_franchise_integrity(request: FranchiseCheckRequest):
     if request.admin_file not in processor.data_store:
         raise HTTPException(status_code=404, detail="Admin file not found")
     
-    admin_df = processor.data_store[request.admin_file]
-    call_df = processor.data_store.get(request.call_file) if request.call_file else None
-    payment_df = processor.data_store.get(request.payment_file) if request.payment_file else None
-    billing_df = processor.data_store.get(request.billing_file) if request.billing_file else None
+    admin_df = processor.get_dataframe(request.admin_file)
+    call_df = processor.get_dataframe(request.call_file) if request.call_file in processor.data_store else None
+    payment_df = processor.get_dataframe(request.payment_file) if request.payment_file in processor.data_store else None
+    billing_df = processor.get_dataframe(request.billing_file) if request.billing_file in processor.data_store else None
     
     try:
-        results = franchise_settlement.check_integrity(admin_df, call_df, payment_df, billing_df)
+        results = franchise_settlement.check_integrity(
+            admin_df, call_df, payment_df, billing_df,
+            admin_token=dataset_token(processor.data_store, request.admin_file),
+        )
         return {"success": True, "results": results}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -43,8 +47,8 @@ def compare_biz_files(request: BizCompareRequest):
     if request.file_a not in processor.data_store or request.file_b not in processor.data_store:
         raise HTTPException(status_code=404, detail="One or both files not found")
     
-    df_a = processor.data_store[request.file_a]
-    df_b = processor.data_store[request.file_b]
+    df_a = processor.get_dataframe(request.file_a)
+    df_b = processor.get_dataframe(request.file_b)
     
     try:
         results = biz_settlement.compare_with_reasoning(df_a, df_b, request.keys)
@@ -57,8 +61,8 @@ def reaggregate_biz_files(request: BizReaggregateRequest):
     if request.file_a not in processor.data_store or request.file_b not in processor.data_store:
         raise HTTPException(status_code=404, detail="One or both files not found")
     
-    df_a = processor.data_store[request.file_a]
-    df_b = processor.data_store[request.file_b]
+    df_a = processor.get_dataframe(request.file_a)
+    df_b = processor.get_dataframe(request.file_b)
     
     try:
         results = biz_settlement.reaggregate_and_compare(df_a, df_b, request.keys, request.filters)
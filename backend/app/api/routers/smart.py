@@ -49,7 +49,7 @@ def generate_code(request: GenerateCodeRequest):
     if request.source_filename not in processor.data_store:
         raise HTTPException(status_code=404, detail="Source file not found")
     
-    df = processor.data_store[request.source_filename]
+    df = processor.get_dataframe(request.source_filename)
     source_meta = {"columns": list(df.columns)}
     
     try:
@@ -63,7 +63,7 @@ def transform_data(request: TransformRequest):
     if request.file_id not in processor.data_store:
         raise HTTPException(status_code=404, detail="Source file not found")
     
-    df = processor.data_store[request.file_id]
+    df = processor.get_dataframe(request.file_id)
     
     try:
         result_df = smart_transformer.execute_transformation(df, request.mapping)
@@ -112,7 +112,7 @@ async def execute_code(request: ExecuteRequest):
     if request.file_id not in processor.data_store:
         raise HTTPException(status_code=404, detail="File not found")
     
-    df = processor.data_store[request.file_id].copy()
+    df = processor.get_dataframe(request.file_id).copy()
     code_content = request.code.replace("```python", "").replace("```", "").strip()
     
     local_vars = {"df": df, "pd": pd}
@@ -138,7 +138,7 @@ def generate_plan(request: PlanRequest):
     if not request.file_ids or request.file_ids[0] not in processor.data_store:
          raise HTTPException(status_code=404, detail="File not found")
          
-    df = processor.data_store[request.file_ids[0]]
+    df = processor.get_dataframe(request.file_ids[0])
     schema = {"columns": list(df.columns)}
     
     try:
@@ -152,7 +152,7 @@ def execute_plan(request: ExecutePlanRequest):
     if not request.file_ids or request.file_ids[0] not in processor.data_store:
          raise HTTPException(status_code=404, detail="File not found")
          
-    df = processor.data_store[request.file_ids[0]]
+    df = processor.get_dataframe(request.file_ids[0])
     
     try:
         results = smart_transformer.execute_plan(df, request.plan)
@@ -50,7 +50,7 @@ async def auto_insight(request: AutoInsightRequest):
     if request.filename not in processor.data_store:
         raise HTTPException(status_code=404, detail="File not found")
     
-    df = processor.data_store[request.filename]
+    df = processor.get_dataframe(request.filename)
     columns = list(df.columns)
     
     insights = []
@@ -77,14 +77,14 @@ async def auto_insight(request: AutoInsightRequest):
         transformed_data = stats_data
     
     # 2. 카테고리별 분석 (그룹화 가능한 컬럼이 있으면)
-    categorical_cols = df.select_dtypes(include=['object', 'category']).columns.tolist()
+    categorical_cols = df.select_dtypes(include=['object', 'category', 'string']).columns.tolist()
     
     if categorical_cols and numeric_cols:
         # 첫 번째 카테고리 컬럼과 첫 번째 숫자 컬럼으로 그룹 분석
         cat_col = categorical_cols[0]
         num_col = numeric_cols[0]
         
-        group_stats = df.groupby(cat_col)[num_col].agg(['sum', 'mean', 'count']).reset_index()
+        group_stats = df.groupby(cat_col, observed=True)[num_col].agg(['sum', 'mean', 'count']).reset_index()
         group_stats.columns = [cat_col, '합계', '평균', '건수']
         group_stats = group_stats.sort_values('합계', ascending=False)
         
@@ -144,8 +144,8 @@ async def smart_format(request: SmartFormatRequest):
     if request.reference_filename not in processor.data_store:
         raise HTTPException(status_code=404, detail="Reference file not found")
     
-    source_df = processor.data_store[request.filename].copy()
-    reference_df = processor.data_store[request.reference_filename]
+    source_df = processor.get_dataframe(request.filename).copy()
+    reference_df = processor.get_dataframe(request.reference_filename)
     
     output_name = f"formatted_{request.filename}"
     mapping_info = []
@@ -288,7 +288,7 @@ async def suggest_templates(request: SuggestTemplatesRequest):
     if request.filename not in processor.data_store:
         raise HTTPException(status_code=404, detail="File not found")
     
-    df = processor.data_store[request.filename]
+    df = processor.get_dataframe(request.filename)
     columns = list(df.columns)
     
     templates = []
@@ -497,7 +497,7 @@ async def execute_transform(request: ExecuteRequest):
             detail=f"⚠️ 분석 불가: {validation['reason']}"
         )
 
-    df = processor.data_store[request.filename]
+    df = processor.get_dataframe(request.filename)
 
     # Build a simple schema description from the DataFrame
     schema = {
@@ -523,6 +523,7 @@ async def execute_transform(request: ExecuteRequest):
             break
 
     if preview_df is None:
+        # Stored under a second name: must not share the source's frame
         preview_df = df.copy()
 
     # Store the transformed result so it can be exported later (raw types 유지)
@@ -538,6 +539,7 @@ async def execute_transform(request: ExecuteRequest):
             if pd.api.types.is_datetime64_any_dtype(series) or pd.api.types.is_datetime64tz_dtype(series):
                 preview_df_display[col] = pd.to_datetime(series, errors="coerce").dt.strftime("%Y-%m-%d")
             elif series.dtype == object:
+                # Only the displayed rows are parsed
                 parsed = pd.to_datetime(series, errors="coerce")
                 # 절반 이상이 날짜로 파싱되면 날짜 컬럼으로 간주
                 if parsed.notna().sum() >= max(1, len(parsed) // 2):
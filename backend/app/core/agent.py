@@ -1,9 +1,11 @@
 import re
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+
+from app.core.column_cache import ParsedColumnCache, dataset_token
 
 class LLMAgent:
-    def __init__(self):
-        pass
+    def __init__(self, column_cache: Optional[ParsedColumnCache] = None):
+        self.column_cache = column_cache or ParsedColumnCache()
 
     def propose_analysis(self, metadata_list):
         """
@@ -58,9 +60,13 @@ class LLMAgent:
                 
                 # Calculate actual trend from data with intelligent grouping
                 try:
-                    # Convert date column to datetime
-                    df_copy = df.copy()
-                    df_copy[date_col_original] = pd.to_datetime(df_copy[date_col_original], errors='coerce')
+                    # Convert date column to datetime (parsed once per dataset version)
+                    # Only the two columns we need (also avoids loading lazy datasets in full)
+                    df_copy = df[[date_col_original, value_col_original]]
+                    token = meta.get('token') or dataset_token(data_store, filename)
+                    df_copy = df_copy.assign(**{
+                        date_col_original: self.column_cache.get(token, df_copy, date_col_original, "datetime")
+                    })
                     df_copy = df_copy.dropna(subset=[date_col_original, value_col_original])
                     
                     if len(df_copy) > 0:
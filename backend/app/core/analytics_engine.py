@@ -11,20 +11,25 @@ class AnalyticsEngine:
             "total_rows": len(df),
             "total_columns": len(df.columns),
             "columns": [],
-            "missing_values": int(df.isnull().sum().sum()),
-            "completeness": round((1 - (df.isnull().sum().sum() / (len(df) * len(df.columns)))) * 100, 2) if len(df) > 0 else 0
         }
 
+        # Column at a time, so lazy (chunked) datasets only load one column at once
+        total_missing = 0
         for col in df.columns:
             col_data = df[col]
+            missing = int(col_data.isnull().sum())
+            total_missing += missing
             col_info = {
                 "name": col,
                 "type": str(col_data.dtype),
-                "missing": int(col_data.isnull().sum()),
+                "missing": missing,
                 "unique": int(col_data.nunique()),
             }
             summary["columns"].append(col_info)
 
+        summary["missing_values"] = total_missing
+        summary["completeness"] = round((1 - (total_missing / (len(df) * len(df.columns)))) * 100, 2) if len(df) > 0 else 0
+
         return summary
 
     def get_column_distribution(self, df: pd.DataFrame, column: str) -> Dict[str, Any]:
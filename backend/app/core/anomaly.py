@@ -1,8 +1,96 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import pandas as pd
 import numpy as np
 from typing import List, Dict, Any, Optional, Tuple
 
+from app.core.anomaly_rules import FunctionRule, Rule, RuleRegistry
+from app.core.column_cache import ParsedColumnCache, DatasetToken
+from app.core.partitioned import PartitionedDataset
+from app.core.sketches import KLLSketch
+
+# Cap on overlapping pairs reported per run ("all" mode can be quadratic for
+# heavily nested trips)
+MAX_OVERLAP_PAIRS = 100_000
+
+OVERLAP_MODES = ("adjacent", "all")
+
+# Rules of one run evaluated concurrently
+RULE_WORKERS = int(os.environ.get("ANOMALY_RULE_WORKERS", "4"))
+
+NAT = np.iinfo(np.int64).min
+
+
+class DateParseError(ValueError):
+    pass
+
+
+class IncrementalState:
+    """
+    What incremental anomaly runs remember about a dataset: how many rows
+    were already checked (plus fingerprints of the first and last of them,
+    to notice when the dataset was replaced rather than appended to), one
+    quantile sketch per numeric column, and each user's latest trips.
+    """
+
+    def __init__(self, rules_key: str):
+        self.rules_key = rules_key
+        self.rows_seen = 0
+        self.boundary: Tuple[int, ...] = ()
+        self.sketches: Dict[str, KLLSketch] = {}
+        # Per user: the trip that starts last and the one that ends last
+        self.intervals: Optional[pd.DataFrame] = None
+
+    def matches(self, df: pd.DataFrame, rules_key: str) -> bool:
+        return (
+            rules_key == self.rules_key
+            and len(df) >= self.rows_seen
+            and _boundary_hash(df, self.rows_seen) == self.boundary
+        )
+
+    def advance(self, df: pd.DataFrame) -> None:
+        self.rows_seen = len(df)
+        self.boundary = _boundary_hash(df, self.rows_seen)
+
+
 class AnomalyDetector:
+    def __init__(self, column_cache: Optional[ParsedColumnCache] = None):
+        # Parsed time columns are shared across runs instead of being
+        # written back into the dataset
+        self.column_cache = column_cache or ParsedColumnCache()
+        # Dataset name -> IncrementalState
+        self._incremental: Dict[str, IncrementalState] = {}
+        self._lock = threading.Lock()
+        self.rules = RuleRegistry()
+        self._register_builtin_rules()
+
+    def _register_builtin_rules(self) -> None:
+        def numeric_columns(df, cfg):
+            return [col for col, dtype in df.dtypes.items() if pd.api.types.is_numeric_dtype(dtype)]
+
+        def mapped_columns(*keys):
+            return lambda df, cfg: [cfg[k] for k in keys if isinstance(cfg, dict) and isinstance(cfg.get(k), str)]
+
+        self.rules.register(FunctionRule(
+            "statistical_outliers", numeric_columns,
+            lambda df, cfg, token: self.detect_statistical_outliers(df),
+            "Values far outside the interquartile range of numeric columns",
+        ), builtin=True)
+        self.rules.register(FunctionRule(
+            "overlapping_time", mapped_columns("start_col", "end_col", "user_id_col"),
+            self._overlapping_time_rule,
+            "Trips of the same user whose time ranges overlap",
+        ), builtin=True)
+        self.rules.register(FunctionRule(
+            "zero_distance", mapped_columns("distance_col", "amount_col"),
+            self._zero_distance_rule,
+            "Rides with no distance that were still charged",
+            row_local=True,
+        ), builtin=True)
+
     def _column_exists(self, df: pd.DataFrame, col: str) -> bool:
         """Safely check if a column exists in the dataframe."""
         return col in df.columns
@@ -86,50 +174,106 @@ class AnomalyDetector:
 
         return rules
 
-    def detect_statistical_outliers(self, df: pd.DataFrame) -> List[Dict[str, Any]]:
+    def detect_statistical_outliers(self, df: pd.DataFrame, per_column: int = 5) -> List[Dict[str, Any]]:
         """
         Detects statistical outliers in numeric columns using IQR method.
         This provides generic anomaly detection for any dataset.
+
+        All numeric columns are handled as one block: quartiles come from a
+        single quantile call and bounds are checked with one vectorized
+        comparison. Per column the `per_column` most extreme outliers (by
+        distance outside the bounds, in IQRs) are reported, most extreme first.
         """
+        numeric_cols, values = self._outlier_block(df)
+        if not numeric_cols:
+            return []
+
+        # Calculate IQR for every column at once
+        Q1, Q3 = _column_quartiles(values)
+        return self._rank_outliers(df, numeric_cols, values, Q1, Q3, per_column)
+
+    def _outlier_block(self, df: pd.DataFrame) -> Tuple[List[str], np.ndarray]:
+        """Numeric columns eligible for outlier checks, and their values as rows of a float block."""
+        # Skip ID-like columns (simple heuristic)
+        numeric_cols = [
+            col for col in df.select_dtypes(include=[np.number]).columns
+            if 'id' not in str(col).lower() and 'key' not in str(col).lower()
+        ]
+        if not numeric_cols or len(df) == 0:
+            return [], np.empty((0, len(df)))
+
+        # Column-major, so per-column work runs over contiguous memory
+        values = _column_block(df, numeric_cols)
+        keep = ~self._unique_columns(df, numeric_cols, values)
+        return [col for col, k in zip(numeric_cols, keep) if k], values[keep]
+
+    def _rank_outliers(self, df: pd.DataFrame, numeric_cols: List[str], values: np.ndarray, Q1: np.ndarray, Q3: np.ndarray, per_column: int = 5) -> List[Dict[str, Any]]:
+        """Report the `per_column` values furthest outside Q1/Q3 -/+ 3*IQR in each column."""
         anomalies = []
-        numeric_cols = df.select_dtypes(include=[np.number]).columns
-
-        for col in numeric_cols:
-            # Skip ID-like columns (simple heuristic)
-            if 'id' in col.lower() or 'key' in col.lower() or df[col].nunique() == len(df):
+        IQR = Q3 - Q1
+
+        # Define bounds (using 3.0 for extreme outliers to reduce noise, or 1.5 for standard)
+        lower_bound = Q1 - 3.0 * IQR
+        upper_bound = Q3 + 3.0 * IQR
+
+        with np.errstate(invalid="ignore"):
+            excess = np.fmax(lower_bound[:, None] - values, values - upper_bound[:, None])
+        # How far outside the bounds, relative to the spread; NaN never counts
+        scale = np.where(IQR > 0, IQR, 1.0)[:, None]
+        extremity = np.where(excess > 0, excess / scale, 0.0)
+
+        labels = df.index
+        for j, col in enumerate(numeric_cols):
+            scores = extremity[j]
+            hits = np.flatnonzero(scores > 0)
+            if not len(hits):
                 continue
-
-            # Calculate IQR
-            Q1 = df[col].quantile(0.25)
-            Q3 = df[col].quantile(0.75)
-            IQR = Q3 - Q1
-            
-            # Define bounds (using 3.0 for extreme outliers to reduce noise, or 1.5 for standard)
-            lower_bound = Q1 - 3.0 * IQR
-            upper_bound = Q3 + 3.0 * IQR
-
-            outliers = df[(df[col] < lower_bound) | (df[col] > upper_bound)]
-            
-            if not outliers.empty:
-                # Limit to top 5 extreme outliers per column to avoid flooding
-                top_outliers = outliers.head(5)
-                for idx, row in top_outliers.iterrows():
-                    val = row[col]
-                    anomalies.append({
-                        "type": "Statistical Outlier",
-                        "column": col,
-                        "row_index": int(idx),
-                        "details": f"Value {val} in column '{col}' is a statistical outlier (Range: {lower_bound:.2f} ~ {upper_bound:.2f})"
-                    })
+            if len(hits) > per_column:
+                hits = hits[np.argpartition(-scores[hits], per_column - 1)[:per_column]]
+            hits = hits[np.argsort(-scores[hits], kind="stable")]
+
+            column = df[col]
+            for pos in hits:
+                val = column.iloc[pos]
+                anomalies.append({
+                    "type": "Statistical Outlier",
+                    "column": col,
+                    "row_index": int(labels[pos]),
+                    "score": round(float(scores[pos]), 3),
+                    "details": f"Value {val} in column '{col}' is a statistical outlier (Range: {lower_bound[j]:.2f} ~ {upper_bound[j]:.2f})"
+                })
 
         return anomalies
 
-    def detect_overlapping_times(self, df: pd.DataFrame, start_col: str, end_col: str, user_id_col: str) -> List[Dict[str, Any]]:
+    def _unique_columns(self, df: pd.DataFrame, columns: List[str], values: np.ndarray, sample_size: int = 2048) -> np.ndarray:
+        """
+        Cheap test for ID-like columns (every value present and distinct);
+        `values` holds the columns as rows.
+
+        Decided on an evenly spaced sample of rows where possible: a missing
+        value, a fractional value (measurements, not identifiers) or a
+        duplicate in the sample settles it for all columns at once, without
+        hashing whole columns. Only columns whose sample looks like unique
+        integers get the exact check.
+        """
+        n = values.shape[1]
+        rows = np.linspace(0, n - 1, min(n, sample_size)).astype(np.int64)
+        sample = np.sort(values[:, rows], axis=1)
+        candidate = (
+            ~np.isnan(sample).any(axis=1)
+            & (sample == np.round(sample)).all(axis=1)
+            & ~(np.diff(sample, axis=1) == 0).any(axis=1)
+        )
+        unique = np.zeros(len(columns), dtype=bool)
+        for j in np.flatnonzero(candidate):
+            series = df[columns[j]]
+            unique[j] = bool(series.notna().all() and series.is_unique)
+        return unique
+
+    def detect_overlapping_times(self, df: pd.DataFrame, start_col: str, end_col: str, user_id_col: str, mode: str = "adjacent", max_pairs: int = MAX_OVERLAP_PAIRS, token: Optional[DatasetToken] = None) -> List[Dict[str, Any]]:
         """
         Detects overlapping time intervals for the same user.
         """
-        anomalies = []
-
         # Validate required columns
         missing_cols = [c for c in [start_col, end_col, user_id_col] if c not in df.columns]
         if missing_cols:
@@ -137,42 +281,101 @@ class AnomalyDetector:
                 "type": "Rule Error",
                 "details": f"Required columns for overlapping_time rule not found: {', '.join(missing_cols)}"
             }]
-        
-        # Ensure datetime type
+
+        if mode not in OVERLAP_MODES:
+            return [{
+                "type": "Rule Error",
+                "details": f"Unknown overlapping_time mode '{mode}' (expected one of: {', '.join(OVERLAP_MODES)})"
+            }]
+
         try:
-            df[start_col] = pd.to_datetime(df[start_col])
-            df[end_col] = pd.to_datetime(df[end_col])
-        except Exception as e:
+            pairs = self.find_overlaps(df, start_col, end_col, user_id_col, mode=mode, max_pairs=max_pairs, token=token)
+        except DateParseError as e:
             return [{"error": f"Date parsing failed: {str(e)}"}]
 
-        # Sort by user and start time
-        df_sorted = df.sort_values(by=[user_id_col, start_col])
-
-        # Group by user and check overlaps
-        for user_id, group in df_sorted.groupby(user_id_col):
-            group = group.reset_index()
-            for i in range(len(group) - 1):
-                current_row = group.iloc[i]
-                next_row = group.iloc[i+1]
-
-                # Check if current end time is greater than next start time
-                if current_row[end_col] > next_row[start_col]:
-                    anomalies.append({
-                        "type": "Overlapping Time",
-                        "user_id": str(user_id),
-                        "row_a": int(current_row['index']), # Original index
-                        "row_b": int(next_row['index']),
-                        "details": f"Ride {current_row['index']} overlaps with {next_row['index']}"
-                    })
-        
-        return anomalies
+        return [
+            {
+                "type": "Overlapping Time",
+                "user_id": str(user_id),
+                "row_a": row_a,
+                "row_b": row_b,
+                "details": f"Ride {row_a} overlaps with {row_b}"
+            }
+            for user_id, row_a, row_b in zip(pairs["user_id"], pairs["row_a"].tolist(), pairs["row_b"].tolist())
+        ]
+
+    def find_overlaps(self, df: pd.DataFrame, start_col: str, end_col: str, user_id_col: str, mode: str = "adjacent", max_pairs: int = MAX_OVERLAP_PAIRS, token: Optional[DatasetToken] = None) -> pd.DataFrame:
+        """
+        Vectorized overlap search; returns one row per overlapping pair
+        (user_id, row_a, row_b, start_a, end_a, start_b, end_b), where row_a/row_b
+        are index labels of `df`.
+
+        mode="adjacent": each trip is compared with the user's next trip by
+        start time (end_a > start_b), like a grouped shift.
+        mode="all": sweep line over each user's trips sorted by start time;
+        every later trip starting before a trip ends is reported, so trips
+        nested inside a long one are all found, not only the first.
+
+        At most `max_pairs` pairs are returned (result.attrs["truncated"]).
+        `token` identifies the dataset version for the parsed-column cache.
+        """
+        if mode not in OVERLAP_MODES:
+            raise ValueError(f"Unknown overlap mode: {mode}")
+
+        try:
+            start = _datetime_values(self.column_cache.get(token, df, start_col, "datetime_strict"))
+            end = _datetime_values(self.column_cache.get(token, df, end_col, "datetime_strict"))
+        except (ValueError, TypeError) as e:
+            raise DateParseError(str(e)) from e
+        codes, users = pd.factorize(df[user_id_col], sort=True)
+
+        # Users without an id are skipped (as groupby does); trips without a
+        # start can't overlap anything
+        rows = np.flatnonzero((codes >= 0) & (start != NAT))
+        codes, start, end = codes[rows], start[rows], end[rows]
+        has_end = end != NAT
+
+        start_keys, end_keys = _user_time_keys(codes, start, np.where(has_end, end, start))
+        order = np.argsort(start_keys, kind="stable")
+        start_keys, end_keys = start_keys[order], end_keys[order]
+        has_end = has_end[order]
+
+        if mode == "adjacent":
+            # Same user and the current end is after the next start
+            hit = np.flatnonzero(
+                (codes[order][1:] == codes[order][:-1]) & has_end[:-1] & (end_keys[:-1] > start_keys[1:])
+            )
+            pos_a, pos_b = hit, hit + 1
+        else:
+            # Trips of the same user starting before this one ends lie in
+            # (i, hi): the keys of the sorted starts are monotone
+            hi = np.searchsorted(start_keys, end_keys, side="left")
+            counts = np.where(has_end, np.clip(hi - np.arange(len(hi)) - 1, 0, None), 0)
+            pos_a = np.repeat(np.arange(len(counts)), counts)
+            first = np.repeat(np.cumsum(counts) - counts, counts)
+            pos_b = pos_a + 1 + (np.arange(len(pos_a)) - first)
+
+        truncated = len(pos_a) > max_pairs
+        pos_a, pos_b = pos_a[:max_pairs], pos_b[:max_pairs]
+
+        idx_a, idx_b = rows[order[pos_a]], rows[order[pos_b]]
+        labels = df.index.to_numpy()
+        result = pd.DataFrame({
+            "user_id": users.take(codes[order[pos_a]]),
+            "row_a": labels[idx_a],
+            "row_b": labels[idx_b],
+            "start_a": df[start_col].iloc[idx_a].to_numpy(),
+            "end_a": df[end_col].iloc[idx_a].to_numpy(),
+            "start_b": df[start_col].iloc[idx_b].to_numpy(),
+            "end_b": df[end_col].iloc[idx_b].to_numpy(),
+        })
+        result.attrs["truncated"] = bool(truncated)
+        return result
 
     def detect_zero_distance_paid(self, df: pd.DataFrame, distance_col: str, amount_col: str) -> List[Dict[str, Any]]:
         """
         Detects rides where distance is 0 (or near 0) but amount is > 0.
         """
-        anomalies = []
-
         # Validate required columns
         missing_cols = [c for c in [distance_col, amount_col] if c not in df.columns]
         if missing_cols:
@@ -182,21 +385,86 @@ class AnomalyDetector:
             }]
         
         # Filter conditions
-        mask = (df[distance_col] <= 0) & (df[amount_col] > 0)
-        suspicious_rows = df[mask]
+        mask = ((df[distance_col] <= 0) & (df[amount_col] > 0)).to_numpy(dtype=bool)
+        suspicious_rows = df.loc[mask, [distance_col, amount_col]]
 
-        for idx, row in suspicious_rows.iterrows():
-            anomalies.append({
+        return [
+            {
                 "type": "Zero Distance Payment",
                 "row_index": int(idx),
-                "details": f"Distance is {row[distance_col]} but Amount is {row[amount_col]}"
-            })
-            
-        return anomalies
+                "details": f"Distance is {distance} but Amount is {amount}"
+            }
+            for idx, distance, amount in zip(suspicious_rows.index, suspicious_rows[distance_col], suspicious_rows[amount_col])
+        ]
+
+    def _overlapping_time_rule(self, df: pd.DataFrame, cfg: Dict[str, Any], token: Optional[DatasetToken] = None) -> List[Dict[str, Any]]:
+        start_col = cfg.get("start_col")
+        end_col = cfg.get("end_col")
+        user_id_col = cfg.get("user_id_col")
 
-    def check_rules(self, df: pd.DataFrame, rules_config: Dict[str, Any]) -> Dict[str, Any]:
+        if not all([start_col, end_col, user_id_col]):
+            return [{
+                "type": "Rule Error",
+                "details": "overlapping_time rule is missing required column mappings."
+            }]
+        return self.detect_overlapping_times(
+            df, start_col, end_col, user_id_col,
+            mode=cfg.get("mode", "adjacent"),
+            max_pairs=cfg.get("max_pairs", MAX_OVERLAP_PAIRS),
+            token=token,
+        )
+
+    def _zero_distance_rule(self, df: pd.DataFrame, cfg: Dict[str, Any], token: Optional[DatasetToken] = None) -> List[Dict[str, Any]]:
+        distance_col = cfg.get("distance_col")
+        amount_col = cfg.get("amount_col")
+
+        if not all([distance_col, amount_col]):
+            return [{
+                "type": "Rule Error",
+                "details": "zero_distance rule is missing required column mappings."
+            }]
+        return self.detect_zero_distance_paid(df, distance_col, amount_col)
+
+    def _required_columns(self, df, plan: List[Tuple[Rule, Any]]) -> List[str]:
+        """Columns the planned rules read, in the dataset's column order."""
+        needed = set()
+        for rule, cfg in plan:
+            needed.update(rule.columns(df, cfg))
+        return [c for c in df.columns if c in needed]
+
+    def _run_rules(self, df: pd.DataFrame, plan: List[Tuple[Rule, Any]], token: Optional[DatasetToken] = None) -> List[Dict[str, Any]]:
+        """Evaluate independent rules concurrently; details come back in plan order."""
+        if not plan:
+            return []
+        if len(plan) == 1 or RULE_WORKERS <= 1:
+            outputs = [self._run_rule(rule, df, cfg, token) for rule, cfg in plan]
+        else:
+            with ThreadPoolExecutor(max_workers=min(RULE_WORKERS, len(plan)), thread_name_prefix="anomaly-rule") as pool:
+                outputs = list(pool.map(lambda item: self._run_rule(item[0], df, item[1], token), plan))
+        return [detail for output in outputs for detail in output]
+
+    def _run_rule(self, rule: Rule, df: pd.DataFrame, cfg: Any, token: Optional[DatasetToken] = None) -> List[Dict[str, Any]]:
+        try:
+            return rule.evaluate(df, cfg, token)
+        except Exception as e:
+            # One broken (e.g. user-defined) rule shouldn't sink the others
+            return [{"type": "Rule Error", "rule": rule.name, "details": f"Rule '{rule.name}' failed: {str(e)}"}]
+
+    def _plan(self, rules_config: Dict[str, Any]) -> Tuple[List[Tuple[Rule, Any]], List[Dict[str, Any]]]:
+        """Rules to run for a config, plus Rule Errors for names that aren't registered."""
+        errors = [
+            {"type": "Rule Error", "details": f"Unknown anomaly rule: {name}"}
+            for name in self.rules.unknown(rules_config)
+        ]
+        return self.rules.plan(rules_config), errors
+
+    def check_rules(self, df: pd.DataFrame, rules_config: Dict[str, Any], token: Optional[DatasetToken] = None) -> Dict[str, Any]:
         """
-        Orchestrator to run configured rules.
+        Orchestrator to run configured rules. `df` is only read, never modified.
+
+        Keys of `rules_config` name registered rules (built-in or added via
+        `self.rules`); ad-hoc expression rules go under "expressions". All
+        rules read the same projection of the dataset and run concurrently.
         """
         results = {
             "total_anomalies": 0,
@@ -207,41 +475,228 @@ class AnomalyDetector:
         if not rules_config:
             return results
 
-        # Statistical Outliers (General)
-        if rules_config.get("statistical_outliers"):
-            stats_anomalies = self.detect_statistical_outliers(df)
-            results["details"].extend(stats_anomalies)
-
-        # Overlapping time rule
-        if "overlapping_time" in rules_config:
-            cfg = rules_config["overlapping_time"]
-            start_col = cfg.get("start_col")
-            end_col = cfg.get("end_col")
-            user_id_col = cfg.get("user_id_col")
-
-            if not all([start_col, end_col, user_id_col]):
-                results["details"].append({
-                    "type": "Rule Error",
-                    "details": "overlapping_time rule is missing required column mappings."
-                })
-            else:
-                overlaps = self.detect_overlapping_times(df, start_col, end_col, user_id_col)
-                results["details"].extend(overlaps)
-
-        # Zero distance rule
-        if "zero_distance" in rules_config:
-            cfg = rules_config["zero_distance"]
-            distance_col = cfg.get("distance_col")
-            amount_col = cfg.get("amount_col")
-
-            if not all([distance_col, amount_col]):
-                results["details"].append({
-                    "type": "Rule Error",
-                    "details": "zero_distance rule is missing required column mappings."
-                })
-            else:
-                zeros = self.detect_zero_distance_paid(df, distance_col, amount_col)
-                results["details"].extend(zeros)
+        try:
+            plan, errors = self._plan(rules_config)
+        except ValueError as e:
+            # Invalid ad-hoc expression
+            plan, errors = [], [{"type": "Rule Error", "details": str(e)}]
+        results["details"].extend(errors)
+
+        # Lazy (chunked) datasets: load only the columns the rules touch, once for all rules
+        if isinstance(df, PartitionedDataset):
+            df = df.select(self._required_columns(df, plan))
 
+        results["details"].extend(self._run_rules(df, plan, token))
         results["total_anomalies"] = len(results["details"])
         return results
+
+    def check_rules_incremental(self, df: pd.DataFrame, rules_config: Dict[str, Any], name: str, token: Optional[DatasetToken] = None) -> Dict[str, Any]:
+        """
+        Like check_rules, but only rows appended since the previous run on
+        `name` are checked.
+
+        The first run (and any run after the rules changed or the dataset was
+        replaced rather than appended to) is a normal full run that builds the
+        running state. Later runs score the new rows against it:
+        - outliers: bounds from per-column KLL quantile sketches
+        - overlaps: new trips against each user's latest trips (the one that
+          starts last and the one that ends last) and against each other
+        - row-local rules (zero distance, expression rules): only new rows
+        and then fold the new rows into the state. The state lives in memory
+        and is rebuilt by a full run after a restart.
+        """
+        try:
+            plan, errors = self._plan(rules_config)
+        except ValueError:
+            # Invalid ad-hoc expression; a full run reports it
+            return self.check_rules(df, rules_config, token)
+
+        if isinstance(df, PartitionedDataset):
+            df = df.select(self._required_columns(df, plan))
+
+        rules_key = json.dumps(rules_config, sort_keys=True, default=str)
+        with self._lock:
+            state = self._incremental.get(name)
+            if state is None or not state.matches(df, rules_key):
+                results = self.check_rules(df, rules_config, token)
+                state = IncrementalState(rules_key)
+                self._extend_state(state, df, df, rules_config, token)
+                self._incremental[name] = state
+                results["incremental"] = {"mode": "full", "rows_scanned": len(df), "rows_seen": len(df)}
+                return results
+
+            new_rows = df.iloc[state.rows_seen:]
+            details = list(errors)
+            if len(new_rows):
+                if rules_config.get("statistical_outliers"):
+                    details.extend(self._new_outliers(state, new_rows))
+
+                cfg = rules_config.get("overlapping_time")
+                if isinstance(cfg, dict) and all(cfg.get(k) for k in ("start_col", "end_col", "user_id_col")):
+                    details.extend(self._new_overlaps(state, new_rows, cfg))
+
+                details.extend(self._run_rules(new_rows, [(rule, cfg) for rule, cfg in plan if rule.row_local]))
+
+                self._extend_state(state, df, new_rows, rules_config)
+
+            return {
+                "total_anomalies": len(details),
+                "details": details,
+                "incremental": {"mode": "incremental", "rows_scanned": len(new_rows), "rows_seen": len(df)},
+            }
+
+    def _extend_state(self, state: IncrementalState, df: pd.DataFrame, rows: pd.DataFrame, rules_config: Dict[str, Any], token: Optional[DatasetToken] = None) -> None:
+        """Fold `rows` (all of `df` on a full run, else the appended tail) into the state."""
+        if rules_config.get("statistical_outliers"):
+            if not state.sketches:
+                columns, values = self._outlier_block(rows)
+                state.sketches = {col: KLLSketch() for col in columns}
+            else:
+                columns = [col for col in state.sketches if col in rows.columns]
+                values = _column_block(rows, columns)
+            for j, col in enumerate(columns):
+                state.sketches[col].update(values[j])
+
+        cfg = rules_config.get("overlapping_time")
+        if isinstance(cfg, dict) and all(c in rows.columns for c in (cfg.get("start_col"), cfg.get("end_col"), cfg.get("user_id_col"))):
+            try:
+                trips = self._trip_frame(rows, cfg, token)
+            except (ValueError, TypeError):
+                trips = None
+            if trips is not None:
+                if state.intervals is not None:
+                    trips = pd.concat([state.intervals, trips])
+                state.intervals = _latest_trips(trips)
+
+        state.advance(df)
+
+    def _new_outliers(self, state: IncrementalState, new_rows: pd.DataFrame) -> List[Dict[str, Any]]:
+        columns = [col for col in state.sketches if col in new_rows.columns]
+        if not columns:
+            return []
+        quartiles = np.array([state.sketches[col].quantiles([0.25, 0.75]) for col in columns])
+        values = _column_block(new_rows, columns)
+        return self._rank_outliers(new_rows, columns, values, quartiles[:, 0], quartiles[:, 1])
+
+    def _new_overlaps(self, state: IncrementalState, new_rows: pd.DataFrame, cfg: Dict[str, Any]) -> List[Dict[str, Any]]:
+        mode = cfg.get("mode", "adjacent")
+        missing_cols = [c for c in (cfg["start_col"], cfg["end_col"], cfg["user_id_col"]) if c not in new_rows.columns]
+        if missing_cols or mode not in OVERLAP_MODES:
+            # Same errors a full run reports
+            return self.detect_overlapping_times(new_rows, cfg["start_col"], cfg["end_col"], cfg["user_id_col"], mode=mode)
+
+        try:
+            trips = self._trip_frame(new_rows, cfg)
+        except (ValueError, TypeError) as e:
+            return [{"error": f"Date parsing failed: {str(e)}"}]
+        if state.intervals is not None:
+            trips = pd.concat([state.intervals, trips])
+
+        pairs = self.find_overlaps(trips, "start", "end", "user", mode=mode, max_pairs=cfg.get("max_pairs", MAX_OVERLAP_PAIRS))
+        # Pairs between two already checked trips were reported before
+        is_new = pairs["row_a"].isin(new_rows.index) | pairs["row_b"].isin(new_rows.index)
+        pairs = pairs[is_new.to_numpy()]
+        return [
+            {
+                "type": "Overlapping Time",
+                "user_id": str(user_id),
+                "row_a": row_a,
+                "row_b": row_b,
+                "details": f"Ride {row_a} overlaps with {row_b}"
+            }
+            for user_id, row_a, row_b in zip(pairs["user_id"], pairs["row_a"].tolist(), pairs["row_b"].tolist())
+        ]
+
+    def _trip_frame(self, rows: pd.DataFrame, cfg: Dict[str, Any], token: Optional[DatasetToken] = None) -> pd.DataFrame:
+        """user/start/end of `rows` with parsed times, indexed like `rows`."""
+        return pd.DataFrame({
+            "user": rows[cfg["user_id_col"]],
+            "start": self.column_cache.get(token, rows, cfg["start_col"], "datetime_strict"),
+            "end": self.column_cache.get(token, rows, cfg["end_col"], "datetime_strict"),
+        }, index=rows.index)
+
+
+def _latest_trips(trips: pd.DataFrame) -> pd.DataFrame:
+    """Per user, the trip that starts last and the one that ends last."""
+    trips = trips.dropna(subset=["user", "start"])
+    last_start = trips.sort_values("start", kind="stable").groupby("user", sort=False, observed=True).tail(1)
+    last_end = trips.dropna(subset=["end"]).sort_values("end", kind="stable").groupby("user", sort=False, observed=True).tail(1)
+    latest = pd.concat([last_start, last_end])
+    return latest[~latest.index.duplicated()]
+
+
+def _boundary_hash(df: pd.DataFrame, rows: int) -> Tuple[int, ...]:
+    """Fingerprint of the first and last of the first `rows` rows."""
+    if rows == 0:
+        return ()
+    edge = df.iloc[[0, rows - 1]]
+    return tuple(int(h) for h in pd.util.hash_pandas_object(edge, index=False))
+
+
+def _column_block(df: pd.DataFrame, columns: List[str]) -> np.ndarray:
+    """Columns as contiguous float64 rows (NaN for missing)."""
+    return np.ascontiguousarray(df[columns].to_numpy(dtype="float64", na_value=np.nan).T)
+
+
+def _column_quartiles(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    25th/75th percentiles of each row of `values` (one column per row; NaN
+    ignored, linear interpolation like Series.quantile). Gap-free columns
+    share one np.quantile call; columns with missing values are sorted at
+    once (NaN last) and interpolated at their own valid-count positions.
+    """
+    quartiles = np.full((2, values.shape[0]), np.nan)
+    has_nan = np.isnan(values).any(axis=1)
+    complete = np.flatnonzero(~has_nan)
+    if len(complete):
+        quartiles[:, complete] = np.quantile(values[complete], [0.25, 0.75], axis=1)
+
+    gappy = np.flatnonzero(has_nan)
+    if len(gappy):
+        ordered = np.sort(values[gappy], axis=1)
+        counts = np.count_nonzero(~np.isnan(ordered), axis=1)
+        present = counts > 0
+        rows = np.flatnonzero(present)
+        for i, q in enumerate((0.25, 0.75)):
+            position = q * (counts[present] - 1)
+            lower = np.floor(position).astype(np.int64)
+            upper = np.minimum(lower + 1, counts[present] - 1)
+            low_values = ordered[rows, lower]
+            high_values = ordered[rows, upper]
+            quartiles[i, gappy[rows]] = low_values + (high_values - low_values) * (position - lower)
+    return quartiles[0], quartiles[1]
+
+
+def _datetime_values(parsed: pd.Series) -> np.ndarray:
+    """int64 nanoseconds of a datetime Series (NaT as NAT)."""
+    if getattr(parsed.dt, "tz", None) is not None:
+        parsed = parsed.dt.tz_convert(None)
+    return parsed.to_numpy(dtype="datetime64[ns]").view(np.int64)
+
+
+def _user_time_keys(codes: np.ndarray, start: np.ndarray, end: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Single int64 keys that order like (user, time) pairs, so one argsort /
+    searchsorted replaces a two-column sort. Times are shifted to the minimum
+    and divided by their common unit; if user and time bits still don't fit,
+    times are replaced by their dense rank.
+    """
+    n = len(start)
+    if n == 0:
+        return start.copy(), end.copy()
+
+    times = np.concatenate([start, end])
+    offsets = times - times.min()
+    for unit in (10**9, 10**6, 10**3, 1):
+        if not (offsets % unit).any():
+            offsets //= unit
+            break
+
+    time_bits = int(offsets.max()).bit_length()
+    if time_bits + int(codes.max()).bit_length() > 62:
+        _, offsets = np.unique(times, return_inverse=True)
+        time_bits = int(offsets.max()).bit_length()
+
+    codes = np.concatenate([codes, codes]).astype(np.int64)
+    keys = (codes << time_bits) | offsets.astype(np.int64)
+    return keys[:n], keys[n:]
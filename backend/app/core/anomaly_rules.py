@@ -0,0 +1,177 @@
+import ast
+import re
+from abc import ABC, abstractmethod
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Identifiers in a pandas expression: `quoted names` or bare names
+_IDENTIFIER = re.compile(r"`([^`]+)`|\b([A-Za-z_][A-Za-z0-9_]*)\b")
+# Rules config key for ad-hoc expressions (not a rule name)
+EXPRESSIONS_KEY = "expressions"
+
+
+class Rule(ABC):
+    """
+    One anomaly rule. `columns` lists what it reads (all rules of a run share
+    a single projection of the dataset), `evaluate` returns anomaly dicts.
+    Row-local rules judge every row on its own, so appended rows can be
+    checked without the rest of the dataset.
+    """
+
+    row_local = False
+
+    def __init__(self, name: str, description: str = ""):
+        self.name = name
+        self.description = description
+
+    @abstractmethod
+    def columns(self, df, cfg: Any) -> List[str]:
+        ...
+
+    @abstractmethod
+    def evaluate(self, df: pd.DataFrame, cfg: Any, token=None) -> List[Dict[str, Any]]:
+        ...
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"name": self.name, "description": self.description, "row_local": self.row_local}
+
+
+class FunctionRule(Rule):
+    """Rule backed by plain functions (used for the built-in rules)."""
+
+    def __init__(self, name: str, columns: Callable, evaluate: Callable, description: str = "", row_local: bool = False):
+        super().__init__(name, description)
+        self._columns = columns
+        self._evaluate = evaluate
+        self.row_local = row_local
+
+    def columns(self, df, cfg: Any) -> List[str]:
+        return self._columns(df, cfg)
+
+    def evaluate(self, df: pd.DataFrame, cfg: Any, token=None) -> List[Dict[str, Any]]:
+        return self._evaluate(df, cfg, token)
+
+
+class ExpressionRule(Rule):
+    """
+    User-defined rule: a boolean pandas expression over the columns, e.g.
+    "fare > 0 and distance <= 0" or "`End Time` < `Start Time`". Rows where it
+    is true are anomalies; evaluated for the whole frame at once (DataFrame.eval).
+    """
+
+    row_local = True
+
+    def __init__(self, name: str, expression: str, description: str = "", anomaly_type: Optional[str] = None):
+        super().__init__(name, description or expression)
+        self.expression = validate_expression(expression)
+        self.anomaly_type = anomaly_type or name
+        self.referenced = _referenced_names(expression)
+
+    def columns(self, df, cfg: Any) -> List[str]:
+        return [c for c in df.columns if str(c) in self.referenced]
+
+    def evaluate(self, df: pd.DataFrame, cfg: Any, token=None) -> List[Dict[str, Any]]:
+        mask = df.eval(self.expression)
+        if not isinstance(mask, pd.Series) or not pd.api.types.is_bool_dtype(mask.dtype):
+            raise ValueError(f"Expression of rule '{self.name}' must evaluate to true/false per row")
+        hits = np.flatnonzero(mask.fillna(False).to_numpy(dtype=bool))
+        if not len(hits):
+            return []
+
+        # "col=value, col=value" for the columns the expression reads
+        rows = df.iloc[hits]
+        shown = self.columns(df, cfg)
+        values = None
+        for col in shown:
+            part = f"{col}=" + rows[col].astype(str)
+            values = part if values is None else values + ", " + part
+        details = values.tolist() if values is not None else [self.expression] * len(hits)
+
+        return [
+            {"type": self.anomaly_type, "rule": self.name, "row_index": int(label), "details": text}
+            for label, text in zip(rows.index, details)
+        ]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**super().to_dict(), "expression": self.expression, "type": self.anomaly_type}
+
+
+class RuleRegistry:
+    """Built-in and user-registered rules by name; user rules can be removed again."""
+
+    def __init__(self):
+        self._rules: Dict[str, Rule] = {}
+        self._builtin = set()
+        self._lock = threading.Lock()
+
+    def register(self, rule: Rule, builtin: bool = False) -> Rule:
+        with self._lock:
+            if rule.name == EXPRESSIONS_KEY or rule.name in self._builtin:
+                raise ValueError(f"Rule name '{rule.name}' is reserved")
+            self._rules[rule.name] = rule
+            if builtin:
+                self._builtin.add(rule.name)
+        return rule
+
+    def unregister(self, name: str) -> bool:
+        with self._lock:
+            if name in self._builtin:
+                raise ValueError(f"Built-in rule '{name}' can't be removed")
+            return self._rules.pop(name, None) is not None
+
+    def get(self, name: str) -> Optional[Rule]:
+        return self._rules.get(name)
+
+    def list(self) -> List[Dict[str, Any]]:
+        return [{**rule.to_dict(), "builtin": name in self._builtin} for name, rule in self._rules.items()]
+
+    def plan(self, rules_config: Dict[str, Any]) -> List[Tuple[Rule, Any]]:
+        """
+        (rule, config) pairs enabled by a rules config, in config order;
+        unknown names are skipped (see `unknown`). Ad-hoc expressions can be
+        passed under "expressions" as [{"name": ..., "expression": ...}]
+        without registering them.
+        """
+        plan = []
+        for key, cfg in rules_config.items():
+            if key == EXPRESSIONS_KEY:
+                for i, spec in enumerate(cfg or []):
+                    if isinstance(spec, str):
+                        spec = {"expression": spec}
+                    plan.append((ExpressionRule(
+                        spec.get("name") or f"expression_{i + 1}",
+                        spec.get("expression", ""),
+                        spec.get("description", ""),
+                        spec.get("type"),
+                    ), None))
+                continue
+            rule = self._rules.get(key)
+            if rule is None or cfg is False or cfg is None:
+                continue
+            plan.append((rule, cfg))
+        return plan
+
+    def unknown(self, rules_config: Dict[str, Any]) -> List[str]:
+        return [key for key in rules_config if key != EXPRESSIONS_KEY and key not in self._rules]
+
+
+def validate_expression(expression: str) -> str:
+    """Reject anything that isn't a plain expression over columns."""
+    expression = (expression or "").strip()
+    if not expression:
+        raise ValueError("Rule expression is empty")
+    if "@" in expression or "__" in expression:
+        raise ValueError("Rule expressions may only reference columns")
+    # Backtick-quoted column names aren't Python; swap them for placeholders
+    try:
+        ast.parse(re.sub(r"`[^`]+`", "_col", expression), mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"Invalid rule expression: {e.msg}") from e
+    return expression
+
+
+def _referenced_names(expression: str) -> set:
+    return {quoted or bare for quoted, bare in _IDENTIFIER.findall(expression)}
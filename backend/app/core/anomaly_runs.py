@@ -0,0 +1,229 @@
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.feather as feather
+
+# Finished runs kept on disk; older ones are deleted
+ANOMALY_RUN_HISTORY = int(os.environ.get("ANOMALY_RUN_HISTORY", "50"))
+DEFAULT_PAGE_SIZE = 1000
+STREAM_BATCH_ROWS = 10_000
+
+# Fields anomalies can be filtered on
+FILTER_FIELDS = ("type", "rule", "column", "user_id")
+# Low-cardinality text fields, stored dictionary-encoded
+_CATEGORICAL_FIELDS = ("type", "rule", "column", "user_id", "error")
+# Row labels; missing in details of other rules, so they'd turn into floats
+_INTEGER_FIELDS = ("row_index", "row_a", "row_b")
+_META_KEY = b"anomaly_run"
+
+
+class AnomalyRunStore:
+    """
+    Anomaly runs kept server-side as one Arrow file per run
+    (a column per detail field, text fields dictionary-encoded), so a run
+    with hundreds of thousands of anomalies is served a page at a time or
+    streamed as NDJSON instead of as one response.
+
+    Files are written uncompressed so they can be memory-mapped: a page only
+    touches the record batches it covers. Run metadata (dataset, totals,
+    counts by type) lives in the file's schema metadata; the index is
+    rebuilt from the file schemas after a restart.
+    """
+
+    def __init__(self, root: Union[str, Path], max_runs: int = ANOMALY_RUN_HISTORY):
+        self.root = Path(root)
+        self.max_runs = max_runs
+        self._lock = threading.Lock()
+        # run_id -> metadata, oldest first
+        self._runs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._load_index()
+
+    def save(self, details: List[Dict[str, Any]], filename: str, extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Store the details of one run; returns its metadata (including run_id)."""
+        frame = _details_frame(details)
+        counts = frame["type"].value_counts(sort=False).to_dict() if "type" in frame else {}
+        meta = {
+            "run_id": uuid.uuid4().hex,
+            "filename": filename,
+            "created_at": time.time(),
+            "total_anomalies": len(frame),
+            "counts": {str(k): int(v) for k, v in counts.items() if v},
+            **(extra or {}),
+        }
+
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        table = table.replace_schema_metadata({_META_KEY: json.dumps(meta, default=str).encode("utf-8")})
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.root / f".{meta['run_id']}.tmp"
+        feather.write_feather(table, tmp_path, compression="uncompressed", chunksize=STREAM_BATCH_ROWS)
+        os.replace(tmp_path, self._path(meta["run_id"]))
+
+        with self._lock:
+            self._runs[meta["run_id"]] = meta
+            self._prune()
+        return meta
+
+    def get(self, run_id: str) -> Optional[Dict[str, Any]]:
+        return self._runs.get(run_id)
+
+    def list(self) -> List[Dict[str, Any]]:
+        return list(reversed(self._runs.values()))
+
+    def delete(self, run_id: str) -> bool:
+        with self._lock:
+            meta = self._runs.pop(run_id, None)
+        if meta is None:
+            return False
+        self._remove(run_id)
+        return True
+
+    def page(self, run_id: str, offset: int = 0, limit: int = DEFAULT_PAGE_SIZE, **filters) -> Dict[str, Any]:
+        """
+        `limit` anomalies from `offset`, optionally filtered by equality on
+        type / rule / column / user_id. Raises KeyError for unknown (or
+        meanwhile pruned) runs.
+        """
+        offset = max(0, offset)
+        limit = max(0, limit)
+        if any(value is not None for value in filters.values()):
+            table = self._filtered(run_id, filters)
+            total, window = table.num_rows, table.slice(offset, limit)
+        else:
+            # Unfiltered: read only the batches the page overlaps
+            reader = self._open(run_id)
+            total = self._runs[run_id]["total_anomalies"]
+            window = _slice(reader, offset, limit)
+        return {
+            "run_id": run_id,
+            "total": total,
+            "offset": offset,
+            "limit": limit,
+            "details": _records(window),
+        }
+
+    def stream(self, run_id: str, **filters) -> Iterator[str]:
+        """
+        The (filtered) anomalies of a run as NDJSON lines. The run is opened
+        right away, so unknown runs raise KeyError here, not while streaming.
+        """
+        table = self._filtered(run_id, filters)
+
+        def lines() -> Iterator[str]:
+            for batch in table.to_batches(max_chunksize=STREAM_BATCH_ROWS):
+                batch_lines = [json.dumps(record, ensure_ascii=False, default=str) for record in _records(batch)]
+                if batch_lines:
+                    yield "\n".join(batch_lines) + "\n"
+
+        return lines()
+
+    def _open(self, run_id: str) -> pa.ipc.RecordBatchFileReader:
+        if run_id not in self._runs:
+            raise KeyError(run_id)
+        try:
+            return pa.ipc.open_file(pa.memory_map(str(self._path(run_id))))
+        except FileNotFoundError:
+            # Pruned or deleted since the lookup
+            raise KeyError(run_id)
+
+    def _filtered(self, run_id: str, filters: Dict[str, Any]) -> pa.Table:
+        table = self._open(run_id).read_all()
+        mask = None
+        for field, value in filters.items():
+            if value is None:
+                continue
+            if field not in FILTER_FIELDS:
+                raise ValueError(f"Can't filter anomalies by '{field}'")
+            if field not in table.column_names:
+                # Nothing in this run has the field at all
+                return table.slice(0, 0)
+            column = table.column(field)
+            if pa.types.is_dictionary(column.type):
+                column = column.cast(column.type.value_type)
+            condition = pc.equal(pc.cast(column, pa.string()), str(value))
+            mask = condition if mask is None else pc.and_(mask, condition)
+        if mask is None:
+            return table
+        return table.filter(pc.fill_null(mask, False))
+
+    def _path(self, run_id: str) -> Path:
+        return self.root / f"{run_id}.arrow"
+
+    def _remove(self, run_id: str) -> None:
+        try:
+            self._path(run_id).unlink()
+        except OSError:
+            pass
+
+    def _prune(self) -> None:
+        while len(self._runs) > self.max_runs:
+            run_id, _ = self._runs.popitem(last=False)
+            self._remove(run_id)
+
+    def _load_index(self) -> None:
+        if not self.root.exists():
+            return
+        runs = []
+        for path in self.root.glob("*.arrow"):
+            try:
+                with pa.memory_map(str(path)) as source:
+                    schema = pa.ipc.open_file(source).schema
+                runs.append(json.loads(schema.metadata[_META_KEY]))
+            except Exception as exc:
+                print(f"Anomaly runs: ignoring unreadable run {path.name} ({exc})")
+        for meta in sorted(runs, key=lambda m: m["created_at"]):
+            self._runs[meta["run_id"]] = meta
+
+
+def _details_frame(details: List[Dict[str, Any]]) -> pd.DataFrame:
+    frame = pd.DataFrame.from_records(details) if details else pd.DataFrame({"type": pd.Series([], dtype="str")})
+    for col in frame.columns:
+        series = frame[col]
+        if col in _CATEGORICAL_FIELDS:
+            frame[col] = series.astype("str").where(series.notna()).astype("category")
+        elif col in _INTEGER_FIELDS and pd.api.types.is_float_dtype(series.dtype):
+            try:
+                frame[col] = series.astype("Int64")
+            except (TypeError, ValueError):
+                pass
+        elif series.dtype == object:
+            # Mixed values (e.g. row labels of different types) can't become
+            # one Arrow column
+            try:
+                pa.array(series, from_pandas=True)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                frame[col] = series.astype("str").where(series.notna())
+    return frame
+
+
+def _slice(reader: pa.ipc.RecordBatchFileReader, offset: int, limit: int) -> pa.Table:
+    """Rows offset..offset+limit of a file, reading only the batches they fall in."""
+    batches = []
+    start = 0
+    for i in range(reader.num_record_batches):
+        if limit <= 0:
+            break
+        batch = reader.get_batch(i)
+        end = start + batch.num_rows
+        if end > offset:
+            piece = batch.slice(max(0, offset - start), limit)
+            batches.append(piece)
+            limit -= piece.num_rows
+        start = end
+    return pa.Table.from_batches(batches, schema=reader.schema)
+
+
+def _records(table: Union[pa.Table, pa.RecordBatch]) -> List[Dict[str, Any]]:
+    """Rows as dicts in their original shape: fields a detail didn't have are left out."""
+    return [
+        {key: value for key, value in row.items() if value is not None}
+        for row in table.to_pylist()
+    ]
@@ -0,0 +1,119 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import pandas as pd
+
+PARSED_COLUMN_CACHE_MAX_BYTES = int(os.environ.get("PARSED_COLUMN_CACHE_MAX_MB", "256")) * 1024 * 1024
+
+# (dataset name, dataset version)
+DatasetToken = Tuple[str, int]
+
+
+def _to_datetime(series: pd.Series) -> pd.Series:
+    parsed = pd.to_datetime(series, errors="coerce")
+    # The format is inferred from the first value; values written differently
+    # get a second, per-value attempt instead of silently becoming NaT
+    failed = parsed.isna() & series.notna()
+    if failed.any():
+        parsed = parsed.copy()
+        parsed[failed] = pd.to_datetime(series[failed], errors="coerce", format="mixed")
+    return parsed
+
+
+def _to_datetime_strict(series: pd.Series) -> pd.Series:
+    return pd.to_datetime(series)
+
+
+def _to_numeric(series: pd.Series) -> pd.Series:
+    return pd.to_numeric(series, errors="coerce")
+
+
+PARSERS = {
+    "datetime": _to_datetime,                # unparseable values become NaT
+    "datetime_strict": _to_datetime_strict,  # raises on unparseable values
+    "numeric": _to_numeric,                  # unparseable values become NaN
+}
+
+
+def dataset_token(data_store, name: str) -> Optional[DatasetToken]:
+    """Cache token for a stored dataset, or None if the store doesn't version datasets."""
+    version = getattr(data_store, "version", None)
+    if version is None or name not in data_store:
+        return None
+    return name, version(name)
+
+
+class ParsedColumnCache:
+    """
+    Datetime / numeric coercions of dataset columns, shared by anomaly rules,
+    insights, settlement checks and previews so each column is parsed once.
+
+    Entries are keyed by (dataset name, dataset version, column, kind): a new
+    version of a dataset simply stops matching its old entries, which are
+    dropped. Source frames are never modified; callers get the parsed Series
+    and must treat it as read-only. Total size is kept under `max_bytes`
+    (least recently used first).
+    """
+
+    def __init__(self, max_bytes: int = PARSED_COLUMN_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[Any, ...], pd.Series]" = OrderedDict()
+        self._sizes: Dict[Tuple[Any, ...], int] = {}
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0}
+
+    def get(self, token: Optional[DatasetToken], df, column: str, kind: str = "datetime") -> pd.Series:
+        """
+        `df[column]` parsed as `kind`. Columns that already have the target
+        dtype are returned as they are; without a token nothing is cached.
+        """
+        parser = PARSERS[kind]
+        series = df[column]
+        if _has_kind(series, kind):
+            return series
+        if token is None:
+            return parser(series)
+
+        key = (token[0], token[1], column, kind)
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and len(cached) == len(series):
+                self._entries.move_to_end(key)
+                self._counters["hits"] += 1
+                return cached
+
+        parsed = parser(series)
+        with self._lock:
+            self._counters["misses"] += 1
+            # Entries of older versions of this dataset can't be hit again
+            for stale in [k for k in self._entries if k[0] == token[0] and k[1] != token[1]]:
+                self._drop(stale)
+            self._entries[key] = parsed
+            self._sizes[key] = int(parsed.memory_usage(index=False, deep=True))
+            self._evict()
+        return parsed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": sum(self._sizes.values()),
+                "max_bytes": self.max_bytes,
+                **self._counters,
+            }
+
+    def _evict(self) -> None:
+        while self._entries and sum(self._sizes.values()) > self.max_bytes:
+            self._drop(next(iter(self._entries)))
+
+    def _drop(self, key) -> None:
+        self._entries.pop(key, None)
+        self._sizes.pop(key, None)
+
+
+def _has_kind(series: pd.Series, kind: str) -> bool:
+    if kind.startswith("datetime"):
+        return pd.api.types.is_datetime64_any_dtype(series.dtype)
+    return pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype)
@@ -0,0 +1,329 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from app.core.partitioned import PartitionedDataset
+
+MANIFEST_FILE = "manifest.json"
+
+
+class DatasetStore(MutableMapping):
+    """
+    Persistent replacement for the plain `data_store` dict.
+
+    Every dataset assigned to the store is written under `root` (uncompressed
+    Arrow IPC, pickle for frames Arrow can't represent; chunked datasets are
+    already on disk and only referenced) and recorded in a manifest. After a
+    restart only the manifest is read; a dataset is memory-mapped and
+    converted back to a DataFrame the first time it is accessed, so the
+    resident set only holds datasets that are actually in use.
+
+    Resident datasets are kept within `memory_budget` bytes (deep memory
+    usage): when over budget, the least recently used unpinned datasets are
+    dropped from memory. Since everything is already on disk, that spill is
+    free, and the next access transparently maps the file again.
+
+    Only assignment persists: a frame changed in place keeps the change
+    while it is resident but loses it on eviction or restart, and its
+    version doesn't move, so caches keyed by version stay stale. Reassign
+    it (or call `touch`) after modifying a stored frame.
+    """
+
+    def __init__(self, root: Union[str, Path], memory_budget: Optional[int] = None):
+        self.root = Path(root)
+        self.datasets_dir = self.root / "datasets"
+        self.memory_budget = memory_budget
+        self._lock = threading.RLock()
+        # Resident datasets, least recently used first
+        self._resident: "OrderedDict[str, Any]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._last_access: Dict[str, float] = {}
+        self._pinned = set()
+        self._counters = {"hits": 0, "loads": 0, "evictions": 0}
+        self._manifest: Dict[str, Dict[str, Any]] = self._read_manifest()
+        # Every assignment gets a new, store-wide unique version
+        self._version_counter = max((e.get("version", 0) for e in self._manifest.values()), default=0)
+
+    # --- Mapping protocol ---
+
+    def __getitem__(self, name: str):
+        with self._lock:
+            self._last_access[name] = time.time()
+            if name in self._resident:
+                self._resident.move_to_end(name)
+                self._counters["hits"] += 1
+                return self._resident[name]
+            if name not in self._manifest:
+                raise KeyError(name)
+            data = self._load(self._manifest[name])
+            self._counters["loads"] += 1
+            self._make_resident(name, data)
+            return data
+
+    def __setitem__(self, name: str, data) -> None:
+        self._assign(name, data, self._write(name, data))
+
+    def put_arrow(self, name: str, data: pd.DataFrame, arrow_path: Union[str, Path]) -> None:
+        """
+        Store `data` whose uncompressed Arrow file already exists at
+        `arrow_path` (an upload cache entry) by hard-linking that file rather
+        than writing the same frame a second time. Both files are immutable
+        (replaced, never rewritten), so either can be removed independently.
+        Falls back to a regular write if linking isn't possible.
+        """
+        self.datasets_dir.mkdir(parents=True, exist_ok=True)
+        target = self.datasets_dir / f"{_file_stem(name)}.arrow"
+        try:
+            os.link(arrow_path, target)
+        except OSError:
+            self[name] = data
+            return
+        self._assign(name, data, {"kind": "arrow", "path": str(target)})
+
+    def _assign(self, name: str, data, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            previous = self._manifest.get(name)
+            self._version_counter += 1
+            entry["version"] = self._version_counter
+            self._manifest[name] = entry
+            self._last_access[name] = time.time()
+            self._make_resident(name, data)
+            self._write_manifest()
+            orphaned = previous is not None and not self._referenced(previous["path"])
+        if orphaned:
+            self._remove_files(previous)
+
+    def __delitem__(self, name: str) -> None:
+        with self._lock:
+            entry = self._manifest.pop(name)
+            self._resident.pop(name, None)
+            self._sizes.pop(name, None)
+            self._last_access.pop(name, None)
+            self._pinned.discard(name)
+            self._write_manifest()
+            orphaned = not self._referenced(entry["path"])
+        # Other names can refer to the same files (e.g. a partitioned dataset stored twice)
+        if orphaned:
+            self._remove_files(entry)
+
+    def __contains__(self, name) -> bool:
+        # Membership must not load the dataset
+        return name in self._manifest
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._manifest))
+
+    def __len__(self) -> int:
+        return len(self._manifest)
+
+    def is_resident(self, name: str) -> bool:
+        return name in self._resident
+
+    # --- Versions ---
+
+    def version(self, name: str) -> int:
+        """Current version of a dataset; changes whenever the dataset is replaced."""
+        return self._manifest[name]["version"]
+
+    def versions(self) -> Dict[str, int]:
+        with self._lock:
+            return {name: entry["version"] for name, entry in self._manifest.items()}
+
+    def touch(self, name: str) -> int:
+        """Bump the version of a dataset that was modified in place (the file is rewritten)."""
+        self[name] = self[name]
+        return self.version(name)
+
+    def cached_metadata(self, name: str) -> Optional[Dict[str, Any]]:
+        """Metadata stored for the dataset's current version, if any (None once deleted)."""
+        with self._lock:
+            entry = self._manifest.get(name)
+            cached = entry.get("metadata") if entry else None
+            if cached and cached["version"] == entry["version"]:
+                return cached["data"]
+            return None
+
+    def cache_metadata(self, name: str, version: int, metadata: Dict[str, Any]) -> None:
+        """Remember metadata for a version; kept in the manifest so it survives restarts."""
+        self.cache_metadata_many([(name, version, metadata)])
+
+    def cache_metadata_many(self, items: List[Tuple[str, int, Dict[str, Any]]]) -> None:
+        """`cache_metadata` for several datasets with a single manifest write."""
+        with self._lock:
+            changed = False
+            for name, version, metadata in items:
+                entry = self._manifest.get(name)
+                if entry is None or entry["version"] != version:
+                    continue
+                entry["metadata"] = {"version": version, "data": metadata}
+                changed = True
+            if changed:
+                self._write_manifest()
+
+    # --- Memory budget ---
+
+    def pin(self, name: str, pinned: bool = True) -> None:
+        """Pinned datasets are loaded if needed and never evicted from memory."""
+        if name not in self._manifest:
+            raise KeyError(name)
+        with self._lock:
+            if pinned:
+                self._pinned.add(name)
+                self[name]
+            else:
+                self._pinned.discard(name)
+                self._enforce_budget()
+
+    def resident_bytes(self) -> int:
+        return sum(self._sizes.values())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            datasets = []
+            for name, entry in self._manifest.items():
+                try:
+                    disk_bytes = _disk_size(Path(entry["path"]))
+                except OSError:
+                    disk_bytes = None
+                datasets.append({
+                    "name": name,
+                    "kind": entry["kind"],
+                    "resident": name in self._resident,
+                    "memory_bytes": self._sizes.get(name, 0),
+                    "disk_bytes": disk_bytes,
+                    "pinned": name in self._pinned,
+                    "last_access": self._last_access.get(name),
+                })
+            return {
+                "memory_budget_bytes": self.memory_budget,
+                "resident_bytes": self.resident_bytes(),
+                "resident_count": len(self._resident),
+                "dataset_count": len(self._manifest),
+                **self._counters,
+                "datasets": datasets,
+            }
+
+    def _make_resident(self, name: str, data) -> None:
+        self._resident[name] = data
+        self._resident.move_to_end(name)
+        self._sizes[name] = _memory_size(data)
+        self._enforce_budget(keep=name)
+
+    def _enforce_budget(self, keep: Optional[str] = None) -> None:
+        if self.memory_budget is None:
+            return
+        for name in list(self._resident):
+            if self.resident_bytes() <= self.memory_budget:
+                break
+            if name == keep or name in self._pinned:
+                continue
+            # Already persisted, so spilling is just dropping the reference
+            del self._resident[name]
+            self._sizes.pop(name, None)
+            self._counters["evictions"] += 1
+
+    # --- Persistence ---
+
+    def _write(self, name: str, data) -> Dict[str, Any]:
+        if isinstance(data, PartitionedDataset):
+            return {"kind": "partitioned", "path": str(data.path)}
+
+        self.datasets_dir.mkdir(parents=True, exist_ok=True)
+        stem = _file_stem(name)
+        arrow_path = self.datasets_dir / f"{stem}.arrow"
+        try:
+            # A Table (rather than the DataFrame) so non-default indexes
+            # from filters/sorts are kept instead of rejected
+            table = pa.Table.from_pandas(data, preserve_index=None)
+            feather.write_feather(table, arrow_path, compression="uncompressed")
+            return {"kind": "arrow", "path": str(arrow_path)}
+        except Exception:
+            # Mixed-type object columns, non-string column names, ...
+            if arrow_path.exists():
+                arrow_path.unlink()
+            pickle_path = self.datasets_dir / f"{stem}.pkl"
+            data.to_pickle(pickle_path)
+            return {"kind": "pickle", "path": str(pickle_path)}
+
+    def _load(self, entry: Dict[str, Any]):
+        kind = entry["kind"]
+        if kind == "arrow":
+            return feather.read_table(entry["path"], memory_map=True).to_pandas()
+        if kind == "pickle":
+            return pd.read_pickle(entry["path"])
+        if kind == "partitioned":
+            return PartitionedDataset(entry["path"])
+        raise ValueError(f"Unknown dataset kind: {kind}")
+
+    def _referenced(self, path: str) -> bool:
+        return any(entry["path"] == path for entry in self._manifest.values())
+
+    def _remove_files(self, entry: Dict[str, Any]) -> None:
+        path = Path(entry["path"])
+        try:
+            if entry["kind"] == "partitioned":
+                # Only clean up partitions the app itself created
+                if self.root.parent in path.parents:
+                    shutil.rmtree(path, ignore_errors=True)
+            elif path.exists():
+                path.unlink()
+        except OSError as exc:
+            print(f"Dataset store: could not remove {path}: {exc}")
+
+    def _read_manifest(self) -> Dict[str, Dict[str, Any]]:
+        path = self.root / MANIFEST_FILE
+        if not path.exists():
+            return {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as exc:
+            print(f"Dataset store: ignoring unreadable manifest ({exc})")
+            return {}
+        # Drop entries whose files vanished
+        return {name: entry for name, entry in manifest.items() if Path(entry["path"]).exists()}
+
+    def _write_manifest(self) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.root / f".{MANIFEST_FILE}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._manifest, f, ensure_ascii=False, default=_json_default)
+        os.replace(tmp_path, self.root / MANIFEST_FILE)
+
+
+def _file_stem(name: str) -> str:
+    return f"{hashlib.sha1(name.encode('utf-8')).hexdigest()[:16]}-{uuid.uuid4().hex[:8]}"
+
+
+def _memory_size(data) -> int:
+    if isinstance(data, pd.DataFrame):
+        return int(data.memory_usage(index=True, deep=True).sum())
+    # Lazy datasets keep nothing but their schema in memory
+    return 0
+
+
+def _disk_size(path: Path) -> int:
+    if path.is_dir():
+        return sum(p.stat().st_size for p in path.iterdir() if p.is_file())
+    return path.stat().st_size
+
+
+def _json_default(value):
+    # Cached metadata previews can hold pandas/numpy scalars
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
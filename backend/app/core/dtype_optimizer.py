@@ -0,0 +1,121 @@
+import re
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Text columns with at most this share of distinct values become categoricals
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+
+# A text column is parsed as dates when this share of a sample looks like a
+# date and almost every non-empty value parses
+DATE_SAMPLE_SIZE = 200
+DATE_SAMPLE_MIN_RATIO = 0.9
+DATE_MAX_FAILURE_RATIO = 0.01
+DATE_PATTERN = re.compile(r"^\s*\d{4}[-/.]\d{1,2}[-/.]\d{1,2}(?:[ T]\d{1,2}:\d{2}(?::\d{2}(?:\.\d+)?)?)?\s*$")
+
+
+def _arrow_string_dtype():
+    """Arrow-backed string dtype that keeps NaN (not pd.NA) for missing values, if available."""
+    try:
+        return pd.StringDtype("pyarrow", na_value=np.nan)  # pandas >= 2.3
+    except (TypeError, ImportError):
+        pass
+    try:
+        return pd.api.types.pandas_dtype("string[pyarrow_numpy]")  # pandas 2.1 / 2.2
+    except (TypeError, ImportError):
+        return None
+
+
+ARROW_STRING_DTYPE = _arrow_string_dtype()
+
+
+def optimize_dtypes(df: pd.DataFrame) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """
+    Shrink a freshly loaded DataFrame's memory footprint.
+
+    - text columns that are obviously dates are parsed once
+    - low-cardinality text becomes `category`, other text Arrow-backed strings
+
+    Numeric columns keep their int64/float64 dtype: narrower types overflow
+    silently in element-wise arithmetic (qty * price, differences) and sum
+    with less precision, and amounts feed reconcile and transforms.
+
+    Each candidate conversion is only kept if it actually saves memory.
+    Returns the optimized frame and a report of bytes saved per column.
+    """
+    optimized = {}
+    report_columns = {}
+    bytes_before = 0
+    bytes_after = 0
+
+    for idx, col in enumerate(df.columns):
+        series = df.iloc[:, idx]
+        before = int(series.memory_usage(index=False, deep=True))
+        best = series
+        best_bytes = before
+
+        for candidate in _candidates(series):
+            size = int(candidate.memory_usage(index=False, deep=True))
+            if size < best_bytes:
+                best, best_bytes = candidate, size
+
+        optimized[idx] = best
+        bytes_before += before
+        bytes_after += best_bytes
+        report_columns[str(col)] = {
+            "dtype": str(best.dtype),
+            "bytes_before": before,
+            "bytes_after": best_bytes,
+            "bytes_saved": before - best_bytes,
+        }
+
+    result = pd.DataFrame(optimized, index=df.index)
+    result.columns = df.columns
+
+    return result, {
+        "bytes_before": bytes_before,
+        "bytes_after": bytes_after,
+        "bytes_saved": bytes_before - bytes_after,
+        "columns": report_columns,
+    }
+
+
+def _candidates(series: pd.Series):
+    dtype = series.dtype
+
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_numeric_dtype(dtype):
+        return
+
+    if not (dtype == object or pd.api.types.is_string_dtype(dtype)):
+        return
+
+    non_null = series.dropna()
+    if non_null.empty or pd.api.types.infer_dtype(non_null, skipna=True) != "string":
+        # Mixed numbers/text: converting would change values
+        return
+
+    parsed = _parse_dates(non_null, series)
+    if parsed is not None:
+        yield parsed
+        return
+
+    if non_null.nunique() <= CATEGORY_MAX_UNIQUE_RATIO * len(series):
+        yield series.astype("category")
+
+    if ARROW_STRING_DTYPE is not None and dtype != ARROW_STRING_DTYPE:
+        yield series.astype(ARROW_STRING_DTYPE)
+
+
+def _parse_dates(non_null: pd.Series, series: pd.Series) -> Optional[pd.Series]:
+    sample = non_null.head(DATE_SAMPLE_SIZE)
+    if sample.str.match(DATE_PATTERN).mean() < DATE_SAMPLE_MIN_RATIO:
+        return None
+
+    try:
+        parsed = pd.to_datetime(series, errors="coerce")
+    except (ValueError, TypeError):
+        return None
+
+    failures = parsed.notna().sum() < len(non_null) * (1 - DATE_MAX_FAILURE_RATIO)
+    return None if failures else parsed
@@ -1,5 +1,12 @@
 import pandas as pd
+import numpy as np
 import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from app.core.partitioned import PartitionedDataset, widen_dtype
+
+ANONYMIZE_WORKERS = int(os.environ.get("ANONYMIZE_WORKERS", "4"))
 
 class ETLPipeline:
     def __init__(self):
@@ -24,52 +31,207 @@ class ETLPipeline:
             return "*" * (len(str_val) - 4) + str_val[-4:]
         return value
 
-    def _anonymize_dataframe(self, df):
+    def _anonymize_series(self, series, method="hash"):
         """
-        Detect and anonymize sensitive columns in a DataFrame.
+        Anonymize a whole column; same output as `_anonymize_value` per cell.
+
+        Call logs repeat the same phone/card numbers many times, so each
+        distinct value is anonymized once and mapped back to the rows.
+        """
+        codes, uniques = pd.factorize(series)
+        if len(uniques) == 0:
+            return series
+
+        str_uniques = [str(value) for value in uniques]
+        if method == "hash":
+            anonymized = np.array(
+                [hashlib.sha256(value.encode()).hexdigest()[:16] for value in str_uniques],
+                dtype=object,
+            )
+        elif method == "mask":
+            # Mask all but last 4 chars
+            values = pd.Series(str_uniques, dtype=object)
+            lengths = values.str.len()
+            stars = pd.Series("*", index=values.index, dtype=object).str.repeat(lengths.sub(4).clip(lower=0))
+            short = pd.Series("*", index=values.index, dtype=object).str.repeat(lengths)
+            anonymized = np.where(lengths <= 4, short, stars + values.str[-4:]).astype(object)
+        else:
+            return series
+
+        result = anonymized[codes]
+        missing = codes < 0
+        if missing.any():
+            # Missing values are left as they were
+            result[missing] = series.to_numpy(dtype=object)[missing]
+        return pd.Series(result, index=series.index, name=series.name)
+
+    def _sensitive_columns(self, columns):
+        """
+        Detect sensitive columns by name; returns {column: anonymization method}.
         """
         sensitive_keywords = ['resident_id', 'jumin', 'ssn', 'phone', 'mobile', 'tel', 'credit_card', 'card_no']
-        
-        for col in df.columns:
-            col_lower = col.lower()
+
+        targets = {}
+        for col in columns:
+            col_lower = str(col).lower()
             if any(keyword in col_lower for keyword in sensitive_keywords):
                 # Determine method based on column type
-                method = "mask" if "phone" in col_lower or "card" in col_lower else "hash"
-                df[col] = df[col].apply(lambda x: self._anonymize_value(x, method=method))
-        
+                targets[col] = "mask" if "phone" in col_lower or "card" in col_lower else "hash"
+        return targets
+
+    def _anonymize_dataframe(self, df, targets=None):
+        """
+        Detect and anonymize sensitive columns in a DataFrame.
+        """
+        if targets is None:
+            targets = self._sensitive_columns(df.columns)
+
+        if len(targets) > 1:
+            with ThreadPoolExecutor(max_workers=min(len(targets), ANONYMIZE_WORKERS)) as pool:
+                futures = {col: pool.submit(self._anonymize_series, df[col], method) for col, method in targets.items()}
+                anonymized = {col: future.result() for col, future in futures.items()}
+        else:
+            anonymized = {col: self._anonymize_series(df[col], method) for col, method in targets.items()}
+
+        for col, values in anonymized.items():
+            df[col] = values
+
         return df
 
-    def merge_files(self, data_store, filenames):
+    def merge_files(self, data_store, filenames, column_mapping=None, output_path=None):
         """
-        Merge multiple DataFrames from the data store.
-        
+        Merge multiple datasets from the data store.
+
+        Schemas are aligned up front: columns are renamed through
+        `column_mapping` ({filename: {column: output_column}}, e.g. ontology
+        concepts), and each output column gets one dtype that every input is
+        cast to, instead of whatever pd.concat falls back to. Inputs are never
+        copied as a whole; the output is built one column at a time, with
+        `_source_file` stored as a categorical.
+
+        If any input is a lazy (chunked) dataset, the merge streams chunk by
+        chunk into a partitioned dataset at `output_path` instead, so memory
+        stays bounded by the chunk size.
+
         Args:
             data_store (dict): Dictionary of {filename: DataFrame}
             filenames (list): List of filenames to merge
-            
+
         Returns:
-            pd.DataFrame: Merged DataFrame
+            pd.DataFrame or PartitionedDataset: Merged dataset
         """
-        dfs_to_merge = []
-        
+        inputs = []
         for filename in filenames:
             if filename in data_store:
-                df = data_store[filename].copy()
-                # Add source column to track origin
-                df['_source_file'] = filename
-                
-                # Anonymize before merging
-                df = self._anonymize_dataframe(df)
-                
-                dfs_to_merge.append(df)
+                data = data_store[filename]
+                renames = dict((column_mapping or {}).get(filename, {}))
+                # {output column: source column}; the first source wins on collisions
+                sources = {}
+                for col in data.columns:
+                    sources.setdefault(renames.get(col, col), col)
+                inputs.append((filename, data, sources))
             else:
                 print(f"Warning: File {filename} not found in data store.")
-        
-        if not dfs_to_merge:
+
+        if not inputs:
             raise ValueError("No valid files to merge.")
-            
-        # Concatenate all DataFrames
-        # ignore_index=True to reset index
-        merged_df = pd.concat(dfs_to_merge, ignore_index=True)
-        
-        return merged_df
+
+        columns, dtypes = self._aligned_schema(inputs)
+        source_dtype = pd.CategoricalDtype(list(dict.fromkeys(filename for filename, _, _ in inputs)))
+
+        # Anonymize by output name or by any of the source names
+        targets = {}
+        for col in columns:
+            names = [col] + [sources[col] for _, _, sources in inputs if col in sources]
+            methods = self._sensitive_columns(names)
+            if methods:
+                targets[col] = next(iter(methods.values()))
+
+        if output_path is not None and any(isinstance(data, PartitionedDataset) for _, data, _ in inputs):
+            chunks = self._aligned_chunks(inputs, columns, dtypes, source_dtype, targets)
+            return PartitionedDataset.from_chunks(chunks, output_path)
+
+        lengths = [len(data) for _, data, _ in inputs]
+        merged = {}
+        for col in columns:
+            pieces = [
+                self._aligned_column(data, sources, col, dtypes[col], n)
+                for (_, data, sources), n in zip(inputs, lengths)
+            ]
+            merged[col] = pd.concat(pieces, ignore_index=True) if len(pieces) > 1 else pieces[0].reset_index(drop=True)
+            if col in targets:
+                merged[col] = self._anonymize_series(merged[col], targets[col])
+            del pieces
+
+        # Add source column to track origin
+        codes = np.repeat(np.arange(len(inputs)), lengths)
+        merged['_source_file'] = pd.Categorical.from_codes(codes, dtype=source_dtype)
+
+        return pd.DataFrame(merged, index=pd.RangeIndex(sum(lengths)))
+
+    def _aligned_schema(self, inputs):
+        """Ordered union of output columns and the one dtype each is cast to."""
+        columns = []
+        seen = set()
+        for _, _, sources in inputs:
+            for col in sources:
+                if col not in seen and col != '_source_file':
+                    seen.add(col)
+                    columns.append(col)
+
+        dtypes = {}
+        for col in columns:
+            present = [data.dtypes[sources[col]] for _, data, sources in inputs if col in sources]
+            partial = len(present) < len(inputs)
+            dtypes[col] = _unify_dtypes(present, partial)
+        return columns, dtypes
+
+    def _aligned_column(self, data, sources, col, dtype, n):
+        if col not in sources:
+            # All-missing block for inputs without this column
+            return pd.Series(index=pd.RangeIndex(n), dtype=dtype)
+        series = data[sources[col]]
+        return series.astype(dtype, copy=False) if series.dtype != dtype else series
+
+    def _aligned_chunks(self, inputs, columns, dtypes, source_dtype, targets, chunk_rows=250_000):
+        for code, (_, data, sources) in enumerate(inputs):
+            needed = [sources[col] for col in columns if col in sources]
+            if isinstance(data, PartitionedDataset):
+                chunks = data.iter_chunks(needed)
+            else:
+                chunks = (data.iloc[start:start + chunk_rows] for start in range(0, len(data), chunk_rows))
+
+            for chunk in chunks:
+                n = len(chunk)
+                out = {
+                    col: self._aligned_column(chunk, sources, col, dtypes[col], n).reset_index(drop=True)
+                    for col in columns
+                }
+                out['_source_file'] = pd.Categorical.from_codes(np.full(n, code), dtype=source_dtype)
+                frame = pd.DataFrame(out, index=pd.RangeIndex(n))
+                yield self._anonymize_dataframe(frame, targets)
+
+
+def _unify_dtypes(dtypes, partial):
+    """
+    One dtype for a column across merge inputs. `partial` means some inputs
+    lack the column, so it must be able to hold missing values.
+    """
+    if all(isinstance(dtype, pd.CategoricalDtype) for dtype in dtypes):
+        categories = []
+        for dtype in dtypes:
+            categories.extend(dtype.categories)
+        return pd.CategoricalDtype(list(dict.fromkeys(categories)))
+
+    dtype = None
+    for current in dtypes:
+        if isinstance(current, pd.CategoricalDtype):
+            current = current.categories.dtype
+        dtype = widen_dtype(dtype, current)
+
+    if partial:
+        if pd.api.types.is_bool_dtype(dtype):
+            return np.dtype("object")
+        if pd.api.types.is_integer_dtype(dtype):
+            return np.dtype("float64")
+    return dtype
@@ -0,0 +1,114 @@
+import hashlib
+import zipfile
+from typing import Optional, Tuple
+
+# Detected container formats
+XLS = "xls"                  # legacy BIFF inside an OLE2 compound file
+XLSX = "xlsx"                # OOXML workbook (transitional)
+XLSM = "xlsm"                # OOXML workbook with macros
+XLSX_STRICT = "xlsx_strict"  # OOXML saved as "Strict Open XML"
+XLSB = "xlsb"                # binary OOXML workbook
+CSV = "csv"                  # plain text, whatever the extension says
+UNKNOWN = "unknown"
+
+OLE2_MAGIC = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+ZIP_MAGIC = b"PK\x03\x04"
+STRICT_SPREADSHEETML_NS = b"http://purl.oclc.org/ooxml/spreadsheetml/main"
+
+# The one Excel engine each spreadsheet format is routed to (CSV is read
+# with pandas' CSV reader regardless of the extension)
+ENGINE_FOR_FORMAT = {
+    XLS: "xlrd",
+    XLSX: "openpyxl",
+    XLSM: "openpyxl",
+}
+
+TEXT_SAMPLE_BYTES = 64 * 1024
+CSV_DELIMITERS = (b",", b";", b"\t", b"|")
+
+
+def sniff_format(file_obj) -> Tuple[str, Optional[str]]:
+    """
+    Detect the real format of a spreadsheet upload from its bytes.
+
+    Returns (format, signature). The signature identifies the file's
+    "template" (container type plus workbook structure), so files exported
+    from the same template share it even when their data differs. Legacy
+    .xls files get None: nothing in their header tells templates apart, and
+    xlrd is their only engine, so there is no engine choice to remember.
+    The stream must be seekable; it is rewound before returning.
+    """
+    file_obj.seek(0)
+    head = file_obj.read(8)
+    file_obj.seek(0)
+
+    if head.startswith(OLE2_MAGIC):
+        return XLS, None
+
+    if head.startswith(ZIP_MAGIC):
+        try:
+            return _sniff_ooxml(file_obj)
+        finally:
+            file_obj.seek(0)
+
+    sample = file_obj.read(TEXT_SAMPLE_BYTES)
+    file_obj.seek(0)
+    first_line = sample.splitlines()[0] if sample else b""
+    if _looks_like_text(sample) and any(delim in first_line for delim in CSV_DELIMITERS):
+        return CSV, _signature(CSV, first_line)
+
+    return UNKNOWN, _signature(UNKNOWN)
+
+
+def _sniff_ooxml(file_obj) -> Tuple[str, str]:
+    try:
+        with zipfile.ZipFile(file_obj) as zf:
+            names = zf.namelist()
+            content_types = zf.read("[Content_Types].xml") if "[Content_Types].xml" in names else b""
+
+            if "xl/workbook.bin" in names:
+                return XLSB, _signature(XLSB, *sorted(names))
+
+            workbook = zf.read("xl/workbook.xml") if "xl/workbook.xml" in names else b""
+    except zipfile.BadZipFile:
+        return UNKNOWN, _signature(UNKNOWN)
+
+    if not workbook:
+        # A zip, but not a spreadsheet (docx, plain archive, ...)
+        return UNKNOWN, _signature(UNKNOWN, *sorted(names))
+
+    if STRICT_SPREADSHEETML_NS in workbook[:4096]:
+        fmt = XLSX_STRICT
+    elif b"macroEnabled" in content_types:
+        fmt = XLSM
+    else:
+        fmt = XLSX
+
+    # Part names + workbook.xml (sheet names, defined names) describe the template
+    return fmt, _signature(fmt, *sorted(names), workbook)
+
+
+def _looks_like_text(sample: bytes) -> bool:
+    if not sample:
+        return False
+    if sample.startswith((b"\xff\xfe", b"\xfe\xff")):
+        return True  # UTF-16 BOM
+    if b"\x00" in sample:
+        return False
+    for encoding in ("utf-8", "cp949"):
+        try:
+            # The sample may end mid-character
+            sample.decode(encoding)
+            return True
+        except UnicodeDecodeError as exc:
+            if exc.start >= len(sample) - 4:
+                return True
+    return False
+
+
+def _signature(*parts) -> str:
+    h = hashlib.sha1()
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else str(part).encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
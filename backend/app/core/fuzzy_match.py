@@ -0,0 +1,166 @@
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.core.key_index import KEY_SEPARATOR
+
+# Candidate pairs allowed per normalized key (internal rows x external rows);
+# larger blocks (e.g. a placeholder key shared by thousands of rows) are skipped
+MAX_BLOCK_PAIRS = int(os.environ.get("FUZZY_MAX_BLOCK_PAIRS", "10000"))
+
+NAT = np.iinfo(np.int64).min
+DAY_NS = 86_400 * 10**9
+
+
+def normalize_key(series: pd.Series, strip_leading_zeros: bool = True) -> pd.Series:
+    """
+    Canonical form of a key column, vectorized: integral floats lose their
+    ".0", full-width characters become ASCII (NFKC), case is folded, spaces
+    and punctuation such as hyphens are dropped and, optionally, leading
+    zeros are removed ("００１２-3４" -> "1234").
+    """
+    if pd.api.types.is_float_dtype(series.dtype):
+        values = series.to_numpy(dtype=float, na_value=np.nan)
+        if np.all(np.isnan(values) | (values == np.round(values))):
+            series = series.astype("Int64")
+    text = series.astype(str)
+    # Unicode normalization is a per-value Python call; ASCII keys don't need it
+    wide = ~text.str.isascii()
+    if wide.any():
+        text = text.copy()
+        text[wide] = text[wide].str.normalize("NFKC")
+    text = text.str.upper()
+    text = text.str.replace(r"[\W_]+", "", regex=True)
+    if strip_leading_zeros:
+        text = text.str.replace(r"^0+(?=.)", "", regex=True)
+    return text.reset_index(drop=True)
+
+
+def normalize_keys(df: pd.DataFrame, columns: List[str], strip_leading_zeros: bool = True) -> pd.Series:
+    """One normalized string per row over several key columns."""
+    joined = normalize_key(df[columns[0]], strip_leading_zeros)
+    for col in columns[1:]:
+        joined = joined + KEY_SEPARATOR + normalize_key(df[col], strip_leading_zeros)
+    return joined
+
+
+def day_numbers(parsed: pd.Series) -> np.ndarray:
+    """Whole days since the epoch (NAT where missing) of a parsed datetime column."""
+    values = parsed.to_numpy(dtype="datetime64[ns]").view(np.int64)
+    days = np.floor_divide(values, DAY_NS)
+    return np.where(values == NAT, NAT, days)
+
+
+def candidate_pairs(
+    int_keys: pd.Series,
+    ext_keys: pd.Series,
+    int_days: Optional[np.ndarray] = None,
+    ext_days: Optional[np.ndarray] = None,
+    day_tolerance: int = 0,
+    max_block_pairs: int = MAX_BLOCK_PAIRS,
+) -> Tuple[np.ndarray, np.ndarray, int]:
+    """
+    Blocking: (internal row, external row) pairs sharing a normalized key and,
+    when days are given, posted within `day_tolerance` days of each other.
+    Dated rows are blocked by (key, day bucket) and only neighbouring buckets
+    are joined, so no block is compared pairwise; rows without a date pair
+    with every row of their key. Rows with a missing key are never
+    candidates. Keys whose block would exceed `max_block_pairs` pairs are
+    skipped; returns their number as well.
+    """
+    codes, _ = pd.factorize(pd.concat([int_keys, ext_keys], ignore_index=True))
+    int_codes, ext_codes = codes[:len(int_keys)], codes[len(int_keys):]
+
+    # Oversized blocks (missing keys have code -1 and are left out)
+    n_codes = codes.max() + 1 if len(codes) else 0
+    int_keyed, ext_keyed = int_codes >= 0, ext_codes >= 0
+    block_pairs = (
+        np.bincount(int_codes[int_keyed], minlength=n_codes).astype(np.int64)
+        * np.bincount(ext_codes[ext_keyed], minlength=n_codes)
+    )
+    oversized = block_pairs > max_block_pairs
+    int_rows = np.flatnonzero(int_keyed & ~oversized[int_codes]) if n_codes else np.empty(0, dtype=np.int64)
+    ext_rows = np.flatnonzero(ext_keyed & ~oversized[ext_codes]) if n_codes else np.empty(0, dtype=np.int64)
+    skipped = int(np.count_nonzero(oversized & (block_pairs > 0)))
+
+    int_side = pd.DataFrame({"code": int_codes[int_rows], "int_row": int_rows})
+    ext_side = pd.DataFrame({"code": ext_codes[ext_rows], "ext_row": ext_rows})
+    if int_days is None or ext_days is None:
+        pairs = int_side.merge(ext_side, on="code")
+        return pairs["int_row"].to_numpy(), pairs["ext_row"].to_numpy(), skipped
+
+    int_side["day"] = int_days[int_rows]
+    ext_side["day"] = ext_days[ext_rows]
+    int_dated, ext_dated = int_side["day"] != NAT, ext_side["day"] != NAT
+
+    # Buckets as wide as the tolerance: matches lie in the same or a neighbouring bucket
+    width = max(int(day_tolerance), 1)
+    dated_int = int_side[int_dated.to_numpy()].assign(bucket=lambda f: f["day"] // width)
+    dated_ext = ext_side[ext_dated.to_numpy()].assign(bucket=lambda f: f["day"] // width)
+    shifted = pd.concat([dated_int.assign(bucket=dated_int["bucket"] + shift) for shift in (-1, 0, 1)])
+    dated = shifted.merge(dated_ext, on=["code", "bucket"], suffixes=("_int", "_ext"))
+    dated = dated[((dated["day_int"] - dated["day_ext"]).abs() <= day_tolerance).to_numpy()]
+
+    undated = pd.concat([
+        int_side[~int_dated.to_numpy()].merge(ext_side, on="code"),
+        int_side[int_dated.to_numpy()].merge(ext_side[~ext_dated.to_numpy()], on="code"),
+    ])
+    int_pos = np.concatenate([dated["int_row"].to_numpy(), undated["int_row"].to_numpy()])
+    ext_pos = np.concatenate([dated["ext_row"].to_numpy(), undated["ext_row"].to_numpy()])
+    return int_pos, ext_pos, skipped
+
+
+def assign_one_to_one(int_pos: np.ndarray, ext_pos: np.ndarray, scores: np.ndarray) -> np.ndarray:
+    """
+    Greedy one-to-one matching: indexes of the chosen candidates, best score
+    first. Each round accepts every remaining candidate that is the best one
+    left for both its rows (the overall best always is), then drops the
+    candidates of rows that got matched.
+    """
+    order = np.lexsort((ext_pos, int_pos, -scores))
+    int_pos, ext_pos = int_pos[order], ext_pos[order]
+    alive = np.ones(len(order), dtype=bool)
+    chosen: List[np.ndarray] = []
+    while alive.any():
+        idx = np.flatnonzero(alive)
+        _, first_int = np.unique(int_pos[idx], return_index=True)
+        _, first_ext = np.unique(ext_pos[idx], return_index=True)
+        firsts = np.zeros(len(idx), dtype=np.int8)
+        firsts[first_int] += 1
+        firsts[first_ext] += 1
+        winners = idx[firsts == 2]
+        chosen.append(winners)
+        alive &= ~np.isin(int_pos, int_pos[winners]) & ~np.isin(ext_pos, ext_pos[winners])
+    if not chosen:
+        return np.empty(0, dtype=np.int64)
+    return np.sort(order[np.concatenate(chosen)])
+
+
+def day_difference(int_days: Optional[np.ndarray], ext_days: Optional[np.ndarray], int_pos: np.ndarray, ext_pos: np.ndarray) -> np.ndarray:
+    """Days between paired rows (NaN where either date is missing)."""
+    if int_days is None or ext_days is None:
+        return np.full(len(int_pos), np.nan)
+    a, b = int_days[int_pos], ext_days[ext_pos]
+    return np.where((a == NAT) | (b == NAT), np.nan, (a - b).astype(float))
+
+
+def key_confidence(raw_equal: np.ndarray) -> np.ndarray:
+    return np.where(raw_equal, 1.0, 0.9)
+
+
+def date_confidence(days: np.ndarray, day_tolerance: int, dated: bool) -> np.ndarray:
+    """1 for the same day, down towards 0.5 as the gap nears tolerance + 1 days; 0.8 when a date is missing."""
+    if not dated:
+        return np.ones(len(days))
+    scaled = np.abs(days) / (day_tolerance + 1)
+    return np.where(np.isnan(days), 0.8, 1.0 - 0.5 * scaled)
+
+
+def value_confidence(agreement: Dict[str, np.ndarray], n: int) -> np.ndarray:
+    """0.5 when no compared value agrees, 1 when all do."""
+    if not agreement:
+        return np.ones(n)
+    share = np.mean(np.vstack(list(agreement.values())), axis=0)
+    return 0.5 + 0.5 * share
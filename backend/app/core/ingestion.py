@@ -0,0 +1,183 @@
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", "2"))
+# Finished jobs kept around for status polling
+JOB_HISTORY = int(os.environ.get("INGEST_JOB_HISTORY", "200"))
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class IngestionJob:
+    """State of one background upload; updated by the worker, read by status polls."""
+
+    def __init__(self, filename: str, bytes_total: int):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.status = QUEUED
+        self.stage = QUEUED
+        self.bytes_read = 0
+        self.bytes_total = bytes_total
+        self.rows = None
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_requested = False
+        self.future = None
+
+    def report(self, stage: str, rows: Optional[int] = None) -> None:
+        """Progress callback for DataProcessor.load_file / load_sheets."""
+        self.check_cancelled()
+        self.stage = stage
+        if rows is not None:
+            self.rows = rows
+
+    def check_cancelled(self) -> None:
+        if self.cancel_requested:
+            raise JobCancelled(f"Upload of {self.filename} was cancelled")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "filename": self.filename,
+            "status": self.status,
+            "stage": self.stage,
+            "bytes_read": self.bytes_read,
+            "bytes_total": self.bytes_total,
+            "rows": self.rows,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class ProgressReader(io.RawIOBase):
+    """
+    Seekable wrapper around the job's copy of the upload that records how far
+    the parser has read and aborts the read once the job is cancelled.
+    """
+
+    def __init__(self, raw, job: IngestionJob):
+        self.raw = raw
+        self.job = job
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        self.job.check_cancelled()
+        n = self.raw.readinto(buffer)
+        self.job.bytes_read = self.raw.tell()
+        return n
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        return self.raw.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self.raw.tell()
+
+
+class IngestionJobManager:
+    """
+    Runs uploads in a bounded worker pool so the request returns a job ID right
+    away. Each job works on its own anonymous temp copy of the upload (the
+    request's UploadFile is closed once the response is sent) and reports its
+    stage, bytes read and rows parsed while it runs.
+    """
+
+    def __init__(self, max_workers: int = INGEST_WORKERS):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+        self._jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, file_obj, filename: str, work: Callable[[Any, Callable], Any]) -> IngestionJob:
+        """
+        Copy `file_obj` aside and queue `work(stream, progress)`; its return
+        value becomes the job result.
+        """
+        scratch = tempfile.TemporaryFile()
+        file_obj.seek(0)
+        shutil.copyfileobj(file_obj, scratch)
+        size = scratch.tell()
+        scratch.seek(0)
+
+        job = IngestionJob(filename, size)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        job.future = self._pool.submit(self._run, job, scratch, work)
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self) -> List[IngestionJob]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id: str) -> Optional[IngestionJob]:
+        """Cancel a queued job, or ask a running one to stop at its next read/stage."""
+        job = self.get(job_id)
+        if job is None or job.status not in (QUEUED, RUNNING):
+            return job
+        job.cancel_requested = True
+        if job.future is not None and job.future.cancel():
+            self._finish(job, CANCELLED)
+        return job
+
+    def _run(self, job: IngestionJob, scratch, work) -> None:
+        try:
+            if job.cancel_requested:
+                self._finish(job, CANCELLED)
+                return
+            job.status = job.stage = RUNNING
+            job.started_at = time.time()
+            stream = io.BufferedReader(ProgressReader(scratch, job))
+            job.result = work(stream, job.report)
+            job.bytes_read = job.bytes_total
+            self._finish(job, SUCCEEDED)
+        except JobCancelled:
+            self._finish(job, CANCELLED)
+        except Exception as exc:
+            job.error = str(exc)
+            self._finish(job, FAILED)
+        finally:
+            scratch.close()
+
+    def _finish(self, job: IngestionJob, status: str) -> None:
+        job.status = status
+        job.stage = status
+        job.finished_at = time.time()
+        # Finished jobs past the history limit go now, not at the next upload
+        with self._lock:
+            self._prune()
+
+    def _prune(self) -> None:
+        """Drop the oldest finished jobs beyond JOB_HISTORY; caller holds the lock."""
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished_at is not None]
+        for job_id in finished[:max(0, len(finished) - JOB_HISTORY)]:
+            del self._jobs[job_id]
@@ -0,0 +1,116 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.core.column_cache import DatasetToken
+
+KEY_INDEX_CACHE_MAX_BYTES = int(os.environ.get("KEY_INDEX_CACHE_MAX_MB", "512")) * 1024 * 1024
+
+# Joins the parts of multi-column keys; sorts before any printable character,
+# so joined keys order like the key tuples
+KEY_SEPARATOR = "\x1f"
+
+
+class KeyIndex:
+    """
+    Reconciliation keys of one dataset, prepared once: the key columns as
+    strings, each row's position in the unique keys (`codes`) and a hashed
+    Index over the unique keys for lookups from the other side.
+    """
+
+    def __init__(self, df: pd.DataFrame, columns: List[str]):
+        self.columns = list(columns)
+        self.values: Dict[str, pd.Series] = {
+            col: df[col].astype(str).reset_index(drop=True) for col in self.columns
+        }
+        joined = self.values[self.columns[0]]
+        for col in self.columns[1:]:
+            joined = joined + KEY_SEPARATOR + self.values[col]
+        codes, uniques = pd.factorize(joined)
+        self.codes = codes.astype(np.int64)
+        self.index = pd.Index(uniques)
+        # One row per key: rows and unique keys correspond one to one
+        self.unique = len(self.index) == len(self.codes)
+        self._rank: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def lookup(self, other: "KeyIndex") -> np.ndarray:
+        """Position of each of `other`'s unique keys in this index (-1 if absent)."""
+        return self.index.get_indexer(other.index)
+
+    def rank(self) -> np.ndarray:
+        """Sort rank of each unique key (string order, like an outer merge)."""
+        with self._lock:
+            if self._rank is None:
+                order = self.index.argsort()
+                rank = np.empty(len(order), dtype=np.int64)
+                rank[order] = np.arange(len(order))
+                self._rank = rank
+            return self._rank
+
+    def nbytes(self) -> int:
+        size = self.codes.nbytes + int(self.index.memory_usage(deep=True))
+        return size + sum(int(s.memory_usage(index=False, deep=True)) for s in self.values.values())
+
+
+class KeyIndexCache:
+    """
+    KeyIndexes keyed by (dataset name, dataset version, key columns), so
+    reconciling one ledger against several files, or re-running after a
+    mapping tweak, reuses its prepared keys. A new dataset version drops the
+    entries of the old one; total size stays under `max_bytes` (LRU).
+    """
+
+    def __init__(self, max_bytes: int = KEY_INDEX_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[Any, ...], KeyIndex]" = OrderedDict()
+        self._sizes: Dict[Tuple[Any, ...], int] = {}
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0}
+
+    def get(self, token: Optional[DatasetToken], df: pd.DataFrame, columns: List[str]) -> KeyIndex:
+        """KeyIndex of `df` over `columns`; without a token nothing is cached."""
+        if token is None:
+            return KeyIndex(df, columns)
+
+        key = (token[0], token[1], tuple(columns))
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and len(cached) == len(df):
+                self._entries.move_to_end(key)
+                self._counters["hits"] += 1
+                return cached
+
+        index = KeyIndex(df, columns)
+        with self._lock:
+            self._counters["misses"] += 1
+            for stale in [k for k in self._entries if k[0] == token[0] and k[1] != token[1]]:
+                self._drop(stale)
+            self._entries[key] = index
+            self._sizes[key] = index.nbytes()
+            self._evict()
+        return index
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": sum(self._sizes.values()),
+                "max_bytes": self.max_bytes,
+                **self._counters,
+            }
+
+    def _evict(self) -> None:
+        while self._entries and sum(self._sizes.values()) > self.max_bytes:
+            self._drop(next(iter(self._entries)))
+
+    def _drop(self, key) -> None:
+        self._entries.pop(key, None)
+        self._sizes.pop(key, None)
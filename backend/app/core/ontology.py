@@ -3,6 +3,9 @@ from typing import List, Dict, Any, Optional
 from pydantic import BaseModel
 from datetime import datetime
 
+# Sheet name used for datasets that weren't loaded per sheet (CSV, first sheet only)
+DEFAULT_SHEET_NAME = "Sheet1"
+
 class FieldRef(BaseModel):
     source_id: str
     sheet_name: str
@@ -71,28 +74,49 @@ class OntologyEngine:
 
         for file_meta in metadata_list:
             filename = file_meta.get("filename", "")
-            # Mock: assuming single sheet or flattening columns
+            # Per-sheet datasets carry their workbook and sheet; whole-file
+            # datasets are treated as a single sheet
+            source_id = file_meta.get("source_id") or filename
+            sheet_name = file_meta.get("sheet_name") or DEFAULT_SHEET_NAME
             columns = file_meta.get("columns", [])
             
             for col in columns:
-                # Heuristic matching
-                matched = False
-                for concept in self.concepts.values():
-                    # Check against examples/keywords
-                    for keyword in concept.examples:
-                        if keyword.lower() in col.lower():
-                            concept.field_refs.append(FieldRef(
-                                source_id=filename,
-                                sheet_name="Sheet1", # Mock
-                                column_name=col
-                            ))
-                            matched = True
-                            break
-                    if matched:
-                        break
+                concept = self.match_concept(col)
+                if concept:
+                    concept.field_refs.append(FieldRef(
+                        source_id=source_id,
+                        sheet_name=sheet_name,
+                        column_name=col
+                    ))
         
         return list(self.concepts.values())
 
+    def match_concept(self, column: str) -> Optional[OntologyConcept]:
+        """
+        Heuristic matching of a column name against the concepts' examples/keywords.
+        """
+        for concept in self.concepts.values():
+            for keyword in concept.examples:
+                if keyword.lower() in str(column).lower():
+                    return concept
+        return None
+
+    def column_mapping(self, metadata_list: List[Dict[str, Any]]) -> Dict[str, Dict[str, str]]:
+        """
+        Map each file's columns to concept labels ({filename: {column: label}})
+        so differently named columns line up when files are merged. A concept
+        matched by several columns of the same file is left unmapped there.
+        """
+        mapping = {}
+        for file_meta in metadata_list:
+            matches: Dict[str, List[str]] = {}
+            for col in file_meta.get("columns", []):
+                concept = self.match_concept(col)
+                if concept:
+                    matches.setdefault(concept.label, []).append(col)
+            mapping[file_meta["filename"]] = {cols[0]: label for label, cols in matches.items() if len(cols) == 1}
+        return mapping
+
     def infer_snapshots(self, metadata_list: List[Dict[str, Any]]) -> List[Snapshot]:
         """
         Infer time snapshots from filenames.
@@ -100,9 +124,11 @@ class OntologyEngine:
         snapshots = []
         for file_meta in metadata_list:
             filename = file_meta.get("filename", "")
+            source_id = file_meta.get("source_id") or filename
+            sheet_name = file_meta.get("sheet_name")
             
-            # Regex for YYYY_MM or YYYY-MM
-            match = re.search(r"(\d{4})[-_](\d{2})", filename)
+            # Regex for YYYY_MM or YYYY-MM (monthly sheets take precedence over the file name)
+            match = re.search(r"(\d{4})[-_](\d{2})", sheet_name or "") or re.search(r"(\d{4})[-_](\d{2})", source_id)
             if match:
                 year, month = match.groups()
                 sid = f"{year}-{month}"
@@ -120,8 +146,8 @@ class OntologyEngine:
                 
                 # Add ref
                 existing.source_refs.append(FieldRef(
-                    source_id=filename,
-                    sheet_name="Sheet1",
+                    source_id=source_id,
+                    sheet_name=sheet_name or DEFAULT_SHEET_NAME,
                     column_name="*"
                 ))
         
@@ -0,0 +1,204 @@
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+
+SCHEMA_FILE = "_schema.json"
+
+
+def widen_dtype(current, new):
+    """
+    Combine the dtypes pandas inferred for the same column in two chunks.
+
+    - int + int -> int64, int + float -> float64 (a chunk with NaNs turns ints into floats)
+    - bool + bool -> bool
+    - anything mixed with text (or otherwise incompatible) -> the text dtype / object
+    """
+    if current is None:
+        return new
+    if current == new:
+        return current
+
+    is_num = pd.api.types.is_numeric_dtype
+    is_bool = pd.api.types.is_bool_dtype
+    if is_num(current) and is_num(new) and not is_bool(current) and not is_bool(new):
+        if pd.api.types.is_integer_dtype(current) and pd.api.types.is_integer_dtype(new):
+            return np.dtype("int64")
+        return np.dtype("float64")
+
+    # A chunk where the column is entirely empty comes back as float64; it
+    # should not demote a text column.
+    if pd.api.types.is_string_dtype(current) and not is_bool(current):
+        return current
+    if pd.api.types.is_string_dtype(new) and not is_bool(new):
+        return new
+    return np.dtype("object")
+
+
+class PartitionedDataset:
+    """
+    Lazy handle to a dataset stored on disk as a directory of parquet partitions.
+
+    It mimics the read-only parts of the DataFrame API the app relies on
+    (`columns`, `dtypes`, `shape`, `head`, `df[col]`, `df[[cols]]`,
+    `select_dtypes`) so metadata extraction, analytics and anomaly rules can
+    work on it while only ever loading the columns or partitions they need.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        with open(self.path / SCHEMA_FILE, "r", encoding="utf-8") as f:
+            schema = json.load(f)
+
+        self._columns: List[str] = schema["columns"]
+        self._dtypes: Dict[str, Any] = {
+            col: pd.api.types.pandas_dtype(dtype) for col, dtype in schema["dtypes"].items()
+        }
+        for col, categories in schema.get("categories", {}).items():
+            self._dtypes[col] = pd.CategoricalDtype(categories)
+        self._partitions: List[str] = schema["partitions"]
+        self._num_rows: int = schema["num_rows"]
+
+    @classmethod
+    def from_csv(cls, file_obj, path: Union[str, Path], chunksize: int = 250_000, on_chunk=None, **read_csv_kwargs) -> "PartitionedDataset":
+        """
+        Read a CSV stream in bounded-size chunks and write each chunk as one
+        parquet partition under `path`.
+
+        Each chunk is typed independently by pandas; the per-column dtypes are
+        widened across chunks and recorded in the schema, and partitions are
+        cast to that unified schema when they are read back.
+
+        `on_chunk`, if given, is called with the running row count after each
+        partition is written.
+        """
+        chunks = pd.read_csv(file_obj, chunksize=chunksize, **read_csv_kwargs)
+        return cls.from_chunks(chunks, path, on_chunk=on_chunk)
+
+    @classmethod
+    def from_chunks(cls, chunks: Iterable[pd.DataFrame], path: Union[str, Path], on_chunk=None) -> "PartitionedDataset":
+        """Write an iterable of DataFrames (same columns) as parquet partitions under `path`."""
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+
+        columns: Optional[List[str]] = None
+        dtypes: Dict[str, Any] = {}
+        partitions: List[str] = []
+        num_rows = 0
+
+        for idx, chunk in enumerate(chunks):
+            if columns is None:
+                columns = [str(c) for c in chunk.columns]
+            chunk.columns = columns
+
+            for col in columns:
+                dtypes[col] = widen_dtype(dtypes.get(col), chunk[col].dtype)
+
+            part_name = f"part-{idx:05d}.parquet"
+            chunk.to_parquet(path / part_name, index=False)
+            partitions.append(part_name)
+            num_rows += len(chunk)
+            if on_chunk is not None:
+                on_chunk(num_rows)
+
+        schema = {
+            "columns": columns or [],
+            "dtypes": {col: str(dtype) for col, dtype in dtypes.items()},
+            # Categories aren't part of str(dtype); keep them so every
+            # partition is read back with the same categorical dtype
+            "categories": {
+                col: list(dtype.categories)
+                for col, dtype in dtypes.items()
+                if isinstance(dtype, pd.CategoricalDtype) and dtype.categories is not None
+                and all(isinstance(c, str) for c in dtype.categories)
+            },
+            "partitions": partitions,
+            "num_rows": num_rows,
+        }
+        with open(path / SCHEMA_FILE, "w", encoding="utf-8") as f:
+            json.dump(schema, f, ensure_ascii=False)
+
+        return cls(path)
+
+    # --- DataFrame-like surface ---
+
+    @property
+    def columns(self) -> pd.Index:
+        return pd.Index(self._columns)
+
+    @property
+    def dtypes(self) -> pd.Series:
+        return pd.Series([self._dtypes[c] for c in self._columns], index=self._columns, dtype=object)
+
+    @property
+    def shape(self):
+        return (self._num_rows, len(self._columns))
+
+    def __len__(self) -> int:
+        return self._num_rows
+
+    def head(self, n: int = 5) -> pd.DataFrame:
+        frames = []
+        remaining = n
+        for chunk in self.iter_chunks():
+            frames.append(chunk.head(remaining))
+            remaining -= len(frames[-1])
+            if remaining <= 0:
+                break
+        if not frames:
+            return self._empty_frame(self._columns)
+        return pd.concat(frames, ignore_index=True)
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.select([key])[key]
+        return self.select(list(key))
+
+    def select_dtypes(self, include=None, exclude=None) -> pd.DataFrame:
+        """Same selection rules as DataFrame.select_dtypes, loading only the matching columns."""
+        selected = self._empty_frame(self._columns).select_dtypes(include=include, exclude=exclude)
+        return self.select(list(selected.columns))
+
+    # --- Lazy access ---
+
+    def iter_chunks(self, columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+        """Yield partitions one at a time, projected to `columns` and cast to the unified schema."""
+        columns = list(columns) if columns is not None else list(self._columns)
+        missing = [c for c in columns if c not in self._dtypes]
+        if missing:
+            raise KeyError(f"Columns not found: {missing}")
+
+        for part in self._partitions:
+            chunk = pd.read_parquet(self.path / part, columns=columns)
+            yield self._cast(chunk)
+
+    def select(self, columns: List[str]) -> pd.DataFrame:
+        """Materialize only the given columns."""
+        frames = list(self.iter_chunks(columns))
+        if not frames:
+            return self._empty_frame(columns)
+        return pd.concat(frames, ignore_index=True)
+
+    def to_pandas(self) -> pd.DataFrame:
+        """Materialize the whole dataset. Only for callers that genuinely need an eager frame."""
+        return self.select(self._columns)
+
+    def _cast(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        for col in chunk.columns:
+            target = self._dtypes[col]
+            if chunk[col].dtype != target:
+                chunk[col] = chunk[col].astype(target)
+        return chunk
+
+    def _empty_frame(self, columns: List[str]) -> pd.DataFrame:
+        return pd.DataFrame({c: pd.Series(dtype=self._dtypes[c]) for c in columns}, columns=columns)
+
+
+def as_dataframe(data) -> pd.DataFrame:
+    """Return an eager DataFrame for either a DataFrame or a lazy PartitionedDataset."""
+    if isinstance(data, PartitionedDataset):
+        return data.to_pandas()
+    return data
@@ -1,72 +1,369 @@
 import pandas as pd
 import numpy as np
+import os
 import traceback
+import shutil
+import tempfile
+import uuid
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from io import BytesIO
 
 from openpyxl import load_workbook
 
+from app.core import file_format
+from app.core.file_format import sniff_format
+from app.core.dataset_store import DatasetStore
+from app.core.dtype_optimizer import optimize_dtypes
+from app.core.partitioned import PartitionedDataset, as_dataframe
+from app.core.upload_cache import UploadCache, hash_stream
+
+# Root for on-disk datasets (partitioned CSVs, caches, ...).
+DEFAULT_DATA_DIR = Path(__file__).resolve().parents[2] / ".data"
+
+# CSVs larger than this are ingested in chunked (out-of-core) mode unless the
+# caller says otherwise.
+CHUNKED_CSV_THRESHOLD_BYTES = int(os.environ.get("CHUNKED_CSV_THRESHOLD_MB", "512")) * 1024 * 1024
+CSV_CHUNK_ROWS = int(os.environ.get("CSV_CHUNK_ROWS", "250000"))
+DATA_STORE_MEMORY_BUDGET_BYTES = int(os.environ.get("DATA_STORE_MEMORY_BUDGET_MB", "2048")) * 1024 * 1024
+UPLOAD_CACHE_MAX_BYTES = int(os.environ.get("UPLOAD_CACHE_MAX_MB", "2048")) * 1024 * 1024
+
+SHEET_WORKERS = int(os.environ.get("SHEET_WORKERS", str(os.cpu_count() or 1)))
+
+# Datasets loaded per sheet are named "<file>::<sheet>"
+SHEET_SEPARATOR = "::"
+
+CSV_SUFFIXES = ('.csv',)
+EXCEL_SUFFIXES = ('.xls', '.xlsx', '.xlsm', '.xltx', '.xltm')
+
 class DataProcessor:
-    def __init__(self):
-        self.data_store = {}
+    def __init__(self, data_dir=None):
+        self.data_dir = Path(data_dir or os.environ.get("DATA_DIR", DEFAULT_DATA_DIR))
+        # Persists every dataset under the data dir and reloads lazily after a restart
+        self.data_store = DatasetStore(self.data_dir / "store", memory_budget=DATA_STORE_MEMORY_BUDGET_BYTES)
+        # File signature -> engine that parsed it (see file_format.sniff_format)
+        self._engine_by_signature = {}
+        self.upload_cache = UploadCache(self.data_dir / "upload_cache", UPLOAD_CACHE_MAX_BYTES)
 
-    def load_file(self, file_obj, filename):
+    def load_file(self, file_obj, filename, chunked=None, progress=None):
         """
         Load a file into a pandas DataFrame and store it.
+
+        `file_obj` can be any binary stream, e.g. the spooled file behind an
+        UploadFile. CSVs are parsed straight from the stream; a seekable copy
+        is only made when the stream itself can't seek.
+
+        chunked: for CSVs, read in bounded chunks into an on-disk partitioned
+        dataset and store a lazy PartitionedDataset handle instead of an eager
+        DataFrame. None (default) picks chunked mode for large files.
+
+        progress: optional callable `progress(stage, rows=None)` notified as
+        loading moves through its stages; it may raise to abort the load.
         """
         try:
             suffix = Path(filename).suffix.lower()
-            if suffix == '.csv':
-                file_obj.seek(0)
-                df = pd.read_csv(file_obj)
-            elif suffix in ('.xls', '.xlsx', '.xlsm', '.xltx', '.xltm'):
-                df = self._read_excel_with_fallback(file_obj, suffix)
-            else:
+            if suffix not in CSV_SUFFIXES + EXCEL_SUFFIXES:
                 raise ValueError("Unsupported file format")
 
-            self.data_store[filename] = df
-            return self._extract_metadata(df, filename)
+            file_obj = self._as_seekable(file_obj)
+
+            # Route by what the bytes are, not by the extension
+            _report(progress, "detecting")
+            fmt, signature = sniff_format(file_obj)
+            is_csv = fmt == file_format.CSV or (fmt == file_format.UNKNOWN and suffix in CSV_SUFFIXES)
+            if is_csv and chunked is None:
+                chunked = self._stream_size(file_obj) > CHUNKED_CSV_THRESHOLD_BYTES
+
+            # Chunked datasets already live on disk; everything else goes
+            # through the content-addressed cache
+            digest = None
+            if not (is_csv and chunked):
+                _report(progress, "hashing")
+                digest = hash_stream(file_obj)
+            df = self.upload_cache.get(digest) if digest else None
+            cache_hit = df is not None
+
+            optimization = None
+            if df is None:
+                _report(progress, "parsing")
+                if is_csv:
+                    df = self._read_csv(file_obj, chunked, progress)
+                else:
+                    df = self._read_excel_with_fallback(file_obj, suffix, fmt, signature)
+                if isinstance(df, pd.DataFrame):
+                    _report(progress, "optimizing", rows=len(df))
+                    df, optimization = optimize_dtypes(df)
+                if digest:
+                    self.upload_cache.put(digest, df)
+
+            _report(progress, "storing", rows=len(df))
+            self._store(filename, df, digest)
+            meta = dict(self.get_metadata(filename))
+            meta["cache_hit"] = cache_hit
+            meta["memory_optimization"] = optimization
+            return meta
         except Exception as e:
             print(f"Error loading file {filename}: {e}")
             raise e
 
-    def _read_excel_with_fallback(self, file_obj, suffix):
+    def load_sheets(self, file_obj, filename, sheets=None, progress=None):
         """
-        Try reading an Excel file with multiple engines to work around pandas engine
-        detection issues that were reported for some customer files.
+        Load every sheet of a workbook (or just `sheets`) as separate datasets.
 
-        If all standard engines fail (often due to highly formatted / merged-cell
-        spreadsheets), fall back to a more tolerant openpyxl-based loader that
-        tries to extract the main rectangular table from the sheet.
+        Sheets are parsed concurrently in a process pool, each stored in
+        data_store as "<filename>::<sheet>". Returns one metadata dict per sheet.
         """
-        file_obj.seek(0)
-        if suffix == '.xls':
-            engines = ['xlrd', 'openpyxl']
+        try:
+            suffix = Path(filename).suffix.lower()
+            if suffix not in EXCEL_SUFFIXES:
+                raise ValueError("Per-sheet loading is only supported for Excel files")
+
+            file_obj = self._as_seekable(file_obj)
+            fmt, signature = sniff_format(file_obj)
+            if fmt == file_format.CSV:
+                # A CSV with an Excel extension only has one "sheet"
+                return [self.load_file(file_obj, filename, progress=progress)]
+            self._check_excel_format(fmt, suffix)
+
+            file_obj.seek(0)
+            with pd.ExcelFile(file_obj, engine=file_format.ENGINE_FOR_FORMAT[fmt]) as workbook:
+                available = workbook.sheet_names
+            if sheets:
+                missing = [s for s in sheets if s not in available]
+                if missing:
+                    raise ValueError(f"Sheets not found in {filename}: {', '.join(missing)}")
+                selected = [s for s in available if s in sheets]
+            else:
+                selected = available
+
+            _report(progress, "hashing")
+            digest = hash_stream(file_obj)
+            frames = {}
+            for sheet_name in selected:
+                cached = self.upload_cache.get(digest, sheet_name)
+                if cached is not None:
+                    frames[sheet_name] = cached
+
+            to_parse = [name for name in selected if name not in frames]
+            if to_parse:
+                _report(progress, "parsing")
+            parsed = self._parse_sheets(file_obj, suffix, fmt, signature, to_parse)
+            optimizations = {}
+            if parsed:
+                _report(progress, "optimizing", rows=sum(len(df) for df in parsed.values()))
+            for sheet_name, df in parsed.items():
+                df, optimizations[sheet_name] = optimize_dtypes(df)
+                self.upload_cache.put(digest, df, sheet_name)
+                frames[sheet_name] = df
+
+            _report(progress, "storing", rows=sum(len(frames[name]) for name in selected))
+            results = []
+            for sheet_name in selected:
+                name = f"{filename}{SHEET_SEPARATOR}{sheet_name}"
+                self._store(name, frames[sheet_name], digest, sheet_name)
+                meta = dict(self.get_metadata(name))
+                meta["cache_hit"] = sheet_name not in parsed
+                meta["memory_optimization"] = optimizations.get(sheet_name)
+                results.append(meta)
+            return results
+        except Exception as e:
+            print(f"Error loading sheets of {filename}: {e}")
+            raise e
+
+    def _store(self, name, df, digest, variant=""):
+        """
+        Store a loaded dataset. Frames that are in the upload cache share its
+        Arrow file (hard link) instead of being written to disk again.
+        """
+        cached = self.upload_cache.path(digest, variant) if digest else None
+        if cached is not None and isinstance(df, pd.DataFrame):
+            self.data_store.put_arrow(name, df, cached)
         else:
-            engines = ['openpyxl', 'xlrd']
+            self.data_store[name] = df
 
-        last_exception = None
-        for engine in engines:
-            try:
+    def _parse_sheets(self, file_obj, suffix, fmt, signature, sheet_names):
+        """Parse sheets in worker processes; returns {sheet_name: DataFrame}."""
+        if len(sheet_names) <= 1:
+            return {
+                name: self._read_excel_with_fallback(file_obj, suffix, fmt, signature, name)
+                for name in sheet_names
+            }
+
+        # Workers read from one uniquely named scratch copy rather than each
+        # receiving the workbook bytes through the pool
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        try:
+            with os.fdopen(fd, "wb") as scratch:
                 file_obj.seek(0)
-                return pd.read_excel(file_obj, engine=engine)
-            except Exception as exc:
-                last_exception = exc
-                continue
+                shutil.copyfileobj(file_obj, scratch)
+
+            engine = self._engine_by_signature.get(signature, file_format.ENGINE_FOR_FORMAT[fmt])
+            workers = min(len(sheet_names), SHEET_WORKERS)
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = {
+                    name: pool.submit(_parse_sheet, path, suffix, fmt, engine, name)
+                    for name in sheet_names
+                }
+                frames = {}
+                for name, future in futures.items():
+                    frames[name], used = future.result()
+                    if signature is not None:
+                        self._engine_by_signature[signature] = used
+            return frames
+        finally:
+            os.remove(path)
+
+    def get_metadata(self, name):
+        """
+        Metadata for a stored dataset, cached per dataset version so repeated
+        listings neither recompute it nor load datasets that aren't resident.
+        """
+        cached = self.data_store.cached_metadata(name)
+        if cached is not None:
+            return cached
+        version = self.data_store.version(name)
+        meta = self._extract_metadata(self.data_store[name], name)
+        self.data_store.cache_metadata(name, version, meta)
+        return meta
+
+    def get_metadata_many(self, names):
+        """
+        `get_metadata` for several datasets (e.g. a listing), recording
+        newly computed metadata with one manifest write. Datasets deleted
+        meanwhile are left out.
+        """
+        metadata, computed = [], []
+        for name in names:
+            cached = self.data_store.cached_metadata(name)
+            if cached is None:
+                try:
+                    version = self.data_store.version(name)
+                    cached = self._extract_metadata(self.data_store[name], name)
+                except KeyError:
+                    continue
+                computed.append((name, version, cached))
+            metadata.append(cached)
+        if computed:
+            self.data_store.cache_metadata_many(computed)
+        return metadata
+
+    def get_dataframe(self, name):
+        """
+        Return the stored dataset as an eager DataFrame, materializing lazy
+        (chunked) datasets. Raises KeyError if the dataset doesn't exist.
+        """
+        return as_dataframe(self.data_store[name])
+
+    def _stream_size(self, file_obj):
+        pos = file_obj.tell()
+        file_obj.seek(0, os.SEEK_END)
+        size = file_obj.tell()
+        file_obj.seek(pos)
+        return size
+
+    def _as_seekable(self, file_obj):
+        """
+        Return a seekable stream with the same content as `file_obj`.
+
+        Upload streams are normally already seekable (spooled in memory or in
+        an anonymous temp file), so this is a no-op for them. Otherwise the
+        bytes are copied once into an unnamed temporary file, which can't
+        collide with concurrent uploads of the same filename.
+        """
+        seekable = getattr(file_obj, "seekable", None)
+        if seekable is not None and seekable():
+            return file_obj
+
+        scratch = tempfile.TemporaryFile()
+        shutil.copyfileobj(file_obj, scratch)
+        scratch.seek(0)
+        return scratch
+
+    def new_partition_path(self):
+        """Fresh directory for a new on-disk partitioned dataset."""
+        return self.data_dir / "partitioned" / uuid.uuid4().hex
+
+    def _read_csv(self, file_obj, chunked=False, progress=None):
+        file_obj.seek(0)
+        if chunked:
+            path = self.new_partition_path()
+            try:
+                return PartitionedDataset.from_csv(
+                    file_obj,
+                    path,
+                    chunksize=CSV_CHUNK_ROWS,
+                    on_chunk=lambda rows: _report(progress, "parsing", rows=rows),
+                )
+            except BaseException:
+                # Don't leave half-written partitions behind (failed or cancelled load)
+                shutil.rmtree(path, ignore_errors=True)
+                raise
+        return pd.read_csv(file_obj)
+
+    def _read_excel_with_fallback(self, file_obj, suffix, fmt, signature, sheet_name=0):
+        """
+        Read an Excel file with the one engine its sniffed format calls for
+        (see `_read_excel_sheet`). The engine that worked is remembered per
+        file signature (if the format has one), so the next upload of the
+        same template goes straight to it.
+        """
+        engine = self._engine_by_signature.get(signature, file_format.ENGINE_FOR_FORMAT.get(fmt))
+        df, engine = self._read_excel_sheet(file_obj, suffix, fmt, engine, sheet_name)
+        if signature is not None:
+            self._engine_by_signature[signature] = engine
+        return df
+
+    @staticmethod
+    def _read_excel_sheet(file_obj, suffix, fmt, engine, sheet_name=0):
+        """
+        Read one sheet with `engine`; returns (DataFrame, engine used).
+
+        If that engine fails on an OOXML workbook (often due to highly
+        formatted / merged-cell spreadsheets), fall back to a more tolerant
+        openpyxl-based loader that tries to extract the main rectangular
+        table from the sheet.
+        """
+        DataProcessor._check_excel_format(fmt, suffix)
 
-        # Last resort: tolerant loader that can handle merged cells / complex layouts
         try:
-            file_obj.seek(0)
-            return self._read_excel_tolerant(file_obj)
-        except Exception as exc:
-            file_obj.seek(0)
+            df = DataProcessor._read_excel_with_engine(file_obj, engine, sheet_name)
+        except Exception as engine_exc:
+            if engine == "tolerant" or fmt not in (file_format.XLSX, file_format.XLSM):
+                raise ValueError(
+                    f"Excel file format ({suffix}) could not be reliably parsed "
+                    f"with engine '{engine}' (detected: {fmt}, error: {engine_exc})."
+                ) from engine_exc
+
+            # Last resort: tolerant loader that can handle merged cells / complex layouts
+            try:
+                df = DataProcessor._read_excel_with_engine(file_obj, "tolerant", sheet_name)
+            except Exception as exc:
+                raise ValueError(
+                    f"Excel file format ({suffix}) could not be reliably parsed. "
+                    f"Tried engine '{engine}' (error: {engine_exc}) "
+                    f"and tolerant parser (error: {exc})."
+                ) from exc
+            engine = "tolerant"
+        return df, engine
+
+    @staticmethod
+    def _check_excel_format(fmt, suffix):
+        if fmt == file_format.XLSX_STRICT:
             raise ValueError(
-                f"Excel file format ({suffix}) could not be reliably parsed. "
-                f"Tried pandas engines {engines} (last error: {last_exception}) "
-                f"and tolerant parser (last error: {exc})."
-            ) from exc
+                "Excel file is saved as 'Strict Open XML Spreadsheet', which the available "
+                "engines can't read. Please re-save it as a regular Excel Workbook (.xlsx)."
+            )
+        if fmt not in file_format.ENGINE_FOR_FORMAT:
+            raise ValueError(f"Excel file format ({suffix}) is not supported (detected: {fmt}).")
 
-    def _read_excel_tolerant(self, file_obj):
+    @staticmethod
+    def _read_excel_with_engine(file_obj, engine, sheet_name=0):
+        file_obj.seek(0)
+        if engine == "tolerant":
+            return DataProcessor._read_excel_tolerant(file_obj, None if sheet_name == 0 else sheet_name)
+        return pd.read_excel(file_obj, engine=engine, sheet_name=sheet_name)
+
+    @staticmethod
+    def _read_excel_tolerant(file_obj, sheet_name=None):
         """
         Very tolerant Excel parser using openpyxl directly.
 
@@ -74,44 +371,69 @@ class DataProcessor:
         - Trims completely empty rows/columns
         - Uses the first non-empty row as header if possible
         - Falls back to generic column names when headers are messy
+
+        Streams the sheet (the active one unless `sheet_name` is given) in read-only mode: rows are visited once,
+        leading/trailing empty rows are trimmed on the fly and values go
+        straight into per-column lists, so time and memory stay linear in the
+        number of cells instead of building the full workbook object model.
         """
-        data = file_obj.read()
-        wb = load_workbook(BytesIO(data), data_only=True)
-        ws = wb.active
+        wb = load_workbook(file_obj, read_only=True, data_only=True)
+        try:
+            ws = wb[sheet_name] if sheet_name is not None else wb.active
 
-        # Collect all rows as plain values
-        raw_rows = [[cell for cell in row] for row in ws.iter_rows(values_only=True)]
+            header = None
+            column_values = []   # one list per column, data rows only
+            n_rows = 0
+            pending_empty = 0    # empty rows since the last non-empty one
 
-        # Drop completely empty rows from top and bottom
-        def is_empty(row):
-            return all((cell is None or str(cell).strip() == "") for cell in row)
+            for row in ws.iter_rows(values_only=True):
+                # Effective width: up to the last non-empty cell (formatted
+                # but empty trailing cells are common in customer files)
+                width = len(row)
+                while width and (row[width - 1] is None or (isinstance(row[width - 1], str) and not row[width - 1].strip())):
+                    width -= 1
+                if width == 0:
+                    if header is not None:
+                        pending_empty += 1
+                    continue
 
-        while raw_rows and is_empty(raw_rows[0]):
-            raw_rows.pop(0)
-        while raw_rows and is_empty(raw_rows[-1]):
-            raw_rows.pop()
+                if header is None:
+                    header = row[:width]
+                    column_values = [[] for _ in range(width)]
+                    continue
 
-        if not raw_rows:
-            # No usable data – return empty DataFrame
-            return pd.DataFrame()
+                if width > len(column_values):
+                    column_values.extend([None] * n_rows for _ in range(width - len(column_values)))
 
-        # Normalize row lengths
-        max_len = max(len(r) for r in raw_rows)
-        normalized_rows = [list(r) + [None] * (max_len - len(r)) for r in raw_rows]
+                # Empty rows in the middle of the table are kept, as before;
+                # only the ones at the edges are dropped
+                if pending_empty:
+                    for values in column_values:
+                        values.extend([None] * pending_empty)
+                    n_rows += pending_empty
+                    pending_empty = 0
 
-        # Heuristic: first non-empty row is header
-        header_row = normalized_rows[0]
-        data_rows = normalized_rows[1:] if len(normalized_rows) > 1 else []
+                for idx, values in enumerate(column_values):
+                    values.append(row[idx] if idx < width else None)
+                n_rows += 1
+        finally:
+            wb.close()
+
+        if header is None:
+            # No usable data – return empty DataFrame
+            return pd.DataFrame()
 
         # Build column names
         columns = []
-        for idx, val in enumerate(header_row):
+        for idx in range(len(column_values)):
+            val = header[idx] if idx < len(header) else None
             if val is None or str(val).strip() == "":
                 columns.append(f"col_{idx+1}")
             else:
                 columns.append(str(val))
 
-        df = pd.DataFrame(data_rows, columns=columns)
+        df = pd.DataFrame(dict(enumerate(column_values)), index=pd.RangeIndex(n_rows))
+        df.columns = columns
 
         # Drop columns that are completely empty
         df = df.dropna(axis=1, how="all")
@@ -120,14 +442,19 @@ class DataProcessor:
 
     def _extract_metadata(self, df, filename):
         """
-        Extract metadata from a DataFrame.
+        Extract metadata from a DataFrame (or a lazy PartitionedDataset, which
+        only reads its first partition for the preview).
         """
         # Replace NaN/NaT with None so that JSON serialization doesn't fail
         # (json.dumps does not support NaN by default).
         safe_preview = df.head(3).replace({np.nan: None, pd.NaT: None})
 
+        source_id, sheet_name = split_dataset_name(filename)
+
         return {
             "filename": filename,
+            "source_id": source_id,
+            "sheet_name": sheet_name,
             "columns": list(df.columns),
             "dtypes": {col: str(dtype) for col, dtype in df.dtypes.items()},
             "shape": df.shape,
@@ -165,3 +492,22 @@ class DataProcessor:
                 "error": str(e),
                 "traceback": traceback.format_exc()
             }
+
+
+def _report(progress, stage, rows=None):
+    if progress is not None:
+        progress(stage, rows=rows)
+
+
+def split_dataset_name(name):
+    """Split a "<file>::<sheet>" dataset name into (file, sheet); sheet is None for whole-file datasets."""
+    if SHEET_SEPARATOR in name:
+        source_id, sheet_name = name.split(SHEET_SEPARATOR, 1)
+        return source_id, sheet_name
+    return name, None
+
+
+def _parse_sheet(path, suffix, fmt, engine, sheet_name):
+    """Process-pool worker: parse one sheet, returning (DataFrame, engine used)."""
+    with open(path, "rb") as f:
+        return DataProcessor._read_excel_sheet(f, suffix, fmt, engine, sheet_name)
@@ -1,12 +1,112 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
 import pandas as pd
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple, Union
+
+from app.core import fuzzy_match
+from app.core.column_cache import DatasetToken, ParsedColumnCache
+from app.core.key_index import KEY_SEPARATOR, KeyIndex, KeyIndexCache
+from app.core.partitioned import PartitionedDataset
+
+# Numeric values closer than this count as equal
+TOLERANCE = 0.01
+
+RECONCILE_MODES = ("exact", "fuzzy", "partitioned", "incremental", "aggregate")
+
+# Aggregate mode: how member rows of a key are combined per value column
+AGGREGATIONS = ("sum", "count", "first")
+# Member rows returned per side by a drill-down
+MAX_DRILLDOWN_ROWS = 1000
+
+# Partitioned mode: target rows per hash partition, worker processes
+PARTITION_ROWS = int(os.environ.get("RECONCILE_PARTITION_ROWS", "500000"))
+RECONCILE_WORKERS = int(os.environ.get("RECONCILE_WORKERS", str(os.cpu_count() or 1)))
+
+# Matched pairs listed (with their confidence) in a fuzzy result
+MAX_REPORTED_PAIRS = 100_000
+
+# Dataset pairs whose last result incremental reconciles keep
+RECONCILE_STATE_HISTORY = int(os.environ.get("RECONCILE_STATE_HISTORY", "16"))
+
+# Stands for a missing key part in incremental key hashes
+_NULL_KEY = "\x00"
+
+# Result frames and the counts reported for them
+_RESULT_FRAMES = {
+    "missing_in_external": "missing_in_external_count",
+    "missing_in_internal": "missing_in_internal_count",
+    "mismatches": "value_mismatch_count",
+}
+
+
+class ReconcileState:
+    """
+    What incremental reconciles remember about a pair of datasets: per side
+    the version, each row's key hash and a fingerprint and row count per key
+    (indexed by key hash); the result frames of the last run and the key
+    hash of each of their rows.
+    """
+
+    def __init__(self, sides: Dict[str, Tuple[int, np.ndarray, pd.DataFrame]], parts: Dict[str, Any], hashes: Dict[str, np.ndarray]):
+        self.sides = sides
+        self.parts = parts
+        self.hashes = hashes
+
+    @property
+    def versions(self) -> Tuple[int, int]:
+        return self.sides["internal"][0], self.sides["external"][0]
+
 
 class Reconciler:
+    def __init__(self, key_indexes: Optional[KeyIndexCache] = None, column_cache: Optional[ParsedColumnCache] = None, scratch_dir=None):
+        # Prepared key columns per dataset version, reused across runs
+        self.key_indexes = key_indexes or KeyIndexCache()
+        self.column_cache = column_cache or ParsedColumnCache()
+        # Where partitioned reconciles spill (system temp dir if None)
+        self.scratch_dir = scratch_dir
+        # (internal name, external name, mapping) -> ReconcileState, oldest first
+        self._states: "OrderedDict[Tuple[str, str, str], ReconcileState]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def reconcile(
+        self,
+        df_internal: pd.DataFrame,
+        df_external: pd.DataFrame,
+        mapping: Dict[str, Dict[str, str]],
+        mode: str = "exact",
+        options: Optional[Dict[str, Any]] = None,
+        internal_token: Optional[DatasetToken] = None,
+        external_token: Optional[DatasetToken] = None,
+    ) -> Dict[str, Any]:
+        """Run one of RECONCILE_MODES; `options` are mode specific."""
+        options = options or {}
+        if mode == "exact":
+            return self.reconcile_datasets(df_internal, df_external, mapping, internal_token, external_token)
+        if mode == "fuzzy":
+            return self.reconcile_fuzzy(df_internal, df_external, mapping, options, internal_token, external_token)
+        if mode == "partitioned":
+            return self.reconcile_partitioned(df_internal, df_external, mapping, options)
+        if mode == "incremental":
+            return self.reconcile_incremental(df_internal, df_external, mapping, internal_token, external_token)
+        if mode == "aggregate":
+            return self.reconcile_aggregate(df_internal, df_external, mapping, options, internal_token, external_token)
+        raise ValueError(f"Unknown reconcile mode '{mode}' (expected one of: {', '.join(RECONCILE_MODES)})")
+
     def reconcile_datasets(
-        self, 
-        df_internal: pd.DataFrame, 
-        df_external: pd.DataFrame, 
-        mapping: Dict[str, Dict[str, str]]
+        self,
+        df_internal: pd.DataFrame,
+        df_external: pd.DataFrame,
+        mapping: Dict[str, Dict[str, str]],
+        internal_token: Optional[DatasetToken] = None,
+        external_token: Optional[DatasetToken] = None,
     ) -> Dict[str, Any]:
         """
         Reconciles two datasets with potentially different column names.
@@ -15,114 +115,874 @@ class Reconciler:
             "keys": {"internal_col": "external_col", ...},
             "values": {"internal_col": "external_col", ...}
         }
+        The tokens identify the dataset versions, so the prepared keys of
+        each side are cached between runs.
         """
-        # Create copies to avoid modifying originals
-        df_int = df_internal.copy()
-        df_ext = df_external.copy()
-
-        # Normalize keys (strip whitespace, lowercase) - Optional but good for robustness
-        # for int_key in mapping['keys'].keys():
-        #     df_int[int_key] = df_int[int_key].astype(str).str.strip()
-        
-        # for ext_key in mapping['keys'].values():
-        #     df_ext[ext_key] = df_ext[ext_key].astype(str).str.strip()
-
-        # Rename external columns to match internal for merging
-        # We will use internal column names as the 'standard' for the result
-        ext_rename_map = {}
-        for int_k, ext_k in mapping['keys'].items():
-            ext_rename_map[ext_k] = int_k
-            # Ensure keys are string for merging
-            df_int[int_k] = df_int[int_k].astype(str)
-            df_ext[ext_k] = df_ext[ext_k].astype(str)
-            
-        for int_v, ext_v in mapping['values'].items():
-            ext_rename_map[ext_v] = int_v
-
-        df_ext_renamed = df_ext.rename(columns=ext_rename_map)
-
-        # Key columns (now same name in both)
+        parts = self._reconcile_frames(df_internal, df_external, mapping, internal_token, external_token)
+        return _result(parts, list(mapping['keys'].keys()))
+
+    def _reconcile_frames(
+        self,
+        df_internal: pd.DataFrame,
+        df_external: pd.DataFrame,
+        mapping: Dict[str, Dict[str, str]],
+        internal_token: Optional[DatasetToken] = None,
+        external_token: Optional[DatasetToken] = None,
+        tolerance: Union[float, Dict[str, float]] = TOLERANCE,
+    ) -> Dict[str, Any]:
+        """Exact reconcile up to (not including) serialization: counts plus the missing/mismatch frames."""
+        # Key columns (internal names are the standard for the result)
         merge_keys = list(mapping['keys'].keys())
-        
+
         # Value columns to compare
         compare_cols = list(mapping['values'].keys())
 
-        # Merge datasets
-        merged = pd.merge(
-            df_int, 
-            df_ext_renamed, 
-            on=merge_keys, 
-            how='outer', 
-            suffixes=('_int', '_ext'), 
-            indicator=True
+        # Keys are compared as strings
+        int_index = self.key_indexes.get(internal_token, df_internal, merge_keys)
+        ext_index = self.key_indexes.get(external_token, df_external, list(mapping['keys'].values()))
+
+        if int_index.unique and ext_index.unique:
+            int_only, ext_only, matched_int, matched_ext = _align_unique(int_index, ext_index)
+            int_values = _values(df_internal, mapping['values'], internal=True)
+            ext_values = _values(df_external, mapping['values'], internal=False)
+
+            # 1. Missing in External (Present in Internal only)
+            missing_in_external = _rows(int_index, merge_keys, int_values, int_only)
+            # 2. Missing in Internal (Present in External only)
+            missing_in_internal = _rows(ext_index, merge_keys, ext_values, ext_only)
+            # 3. Matched rows, side by side
+            matched_keys = _rows(int_index, merge_keys, {}, matched_int)
+            matched_int_values = _rows(int_index, [], int_values, matched_int)
+            matched_ext_values = _rows(ext_index, [], ext_values, matched_ext)
+        else:
+            # Duplicate keys: an outer merge pairs every duplicate (many-to-many)
+            merged = pd.merge(
+                _project(df_internal, int_index, merge_keys, mapping['values'], internal=True),
+                _project(df_external, ext_index, merge_keys, mapping['values'], internal=False),
+                on=merge_keys,
+                how='outer',
+                suffixes=('_int', '_ext'),
+                indicator=True
+            )
+            side = merged['_merge']
+            missing_in_external = _side_values(merged[(side == 'left_only').to_numpy()], merge_keys, compare_cols, '_int')
+            missing_in_internal = _side_values(merged[(side == 'right_only').to_numpy()], merge_keys, compare_cols, '_ext')
+            matched = merged[(side == 'both').to_numpy()]
+            matched_keys = matched[merge_keys]
+            matched_int_values = _side_values(matched, [], compare_cols, '_int')
+            matched_ext_values = _side_values(matched, [], compare_cols, '_ext')
+
+        return {
+            "total_internal": len(df_internal),
+            "total_external": len(df_external),
+            "matched_count": len(matched_keys),
+            "missing_in_external": missing_in_external,
+            "missing_in_internal": missing_in_internal,
+            # Value Mismatches
+            "mismatches": mismatch_frame(matched_keys, matched_int_values, matched_ext_values, tolerance),
+        }
+
+    def reconcile_incremental(
+        self,
+        df_internal: pd.DataFrame,
+        df_external: pd.DataFrame,
+        mapping: Dict[str, Dict[str, str]],
+        internal_token: Optional[DatasetToken] = None,
+        external_token: Optional[DatasetToken] = None,
+    ) -> Dict[str, Any]:
+        """
+        Exact reconcile that only redoes the keys that changed since the last
+        run on the same two datasets and mapping.
+
+        Every row gets a content fingerprint (a vectorized hash of its mapped
+        values) and fingerprints are summed per key, so a key changed when
+        its sum or row count differs, or it appeared or disappeared, on
+        either side. Only rows of changed keys are reconciled again and
+        patched into the previous result. The response adds a "delta" with
+        what was added to and removed from each list and how the counts
+        moved. Without tokens, or on the first run, this is a full run.
+        """
+        merge_keys = list(mapping['keys'].keys())
+        if internal_token is None or external_token is None:
+            result = self.reconcile_datasets(df_internal, df_external, mapping)
+            result["delta"] = {"mode": "full", "changed_keys": None}
+            return result
+
+        state_key = (internal_token[0], external_token[0], json.dumps(mapping, sort_keys=True))
+        versions = (internal_token[1], external_token[1])
+        with self._lock:
+            state = self._states.get(state_key)
+            if state is not None:
+                self._states.move_to_end(state_key)
+        if state is not None and state.versions == versions:
+            result = _result(state.parts, merge_keys)
+            empty = {field: state.parts[field].iloc[:0] for field in _RESULT_FRAMES}
+            result["delta"] = _delta(state.parts, state.parts, empty, empty, merge_keys, 0, (0, 0))
+            return result
+
+        # A side whose version didn't change keeps its fingerprints
+        sides = {}
+        for side, df, token, keys, values in (
+            ("internal", df_internal, internal_token, merge_keys, list(mapping['values'].keys())),
+            ("external", df_external, external_token, list(mapping['keys'].values()), list(mapping['values'].values())),
+        ):
+            if state is not None and state.sides[side][0] == token[1]:
+                sides[side] = state.sides[side]
+            else:
+                index = self.key_indexes.get(token, df, keys)
+                sides[side] = (token[1], *_key_fingerprints(df, index, values))
+
+        if state is None:
+            parts = self._reconcile_frames(df_internal, df_external, mapping, internal_token, external_token)
+            hashes = {field: _frame_key_hashes(parts[field], merge_keys) for field in _RESULT_FRAMES}
+            self._save_state(state_key, ReconcileState(sides, parts, hashes))
+            result = _result(parts, merge_keys)
+            result["delta"] = {"mode": "full", "changed_keys": None}
+            return result
+
+        (_, int_hashes, int_keys), (_, ext_hashes, ext_keys) = sides["internal"], sides["external"]
+        old_int_keys, old_ext_keys = state.sides["internal"][2], state.sides["external"][2]
+        changed = np.union1d(_changed_keys(old_int_keys, int_keys), _changed_keys(old_ext_keys, ext_keys))
+        int_rows = np.flatnonzero(np.isin(int_hashes, changed))
+        ext_rows = np.flatnonzero(np.isin(ext_hashes, changed))
+        redone = self._reconcile_frames(df_internal.iloc[int_rows], df_external.iloc[ext_rows], mapping)
+
+        # Previous results of the changed keys are replaced by the new ones
+        old = state.parts
+        parts = {
+            "total_internal": len(df_internal),
+            "total_external": len(df_external),
+            "matched_count": old["matched_count"] - _pair_count(old_int_keys, old_ext_keys, changed) + redone["matched_count"],
+        }
+        hashes, before, after = {}, {}, {}
+        for field in _RESULT_FRAMES:
+            stale = np.isin(state.hashes[field], changed)
+            before[field] = old[field][stale]
+            after[field] = redone[field]
+            frame = pd.concat([old[field][~stale], redone[field]], ignore_index=True)
+            frame_hashes = np.concatenate([state.hashes[field][~stale], _frame_key_hashes(redone[field], merge_keys)])
+            by = ["column"] + merge_keys if field == "mismatches" else merge_keys
+            order = _key_order(frame, by)
+            parts[field] = frame.iloc[order].reset_index(drop=True)
+            hashes[field] = frame_hashes[order]
+
+        self._save_state(state_key, ReconcileState(sides, parts, hashes))
+        result = _result(parts, merge_keys)
+        result["delta"] = _delta(old, parts, before, after, merge_keys, len(changed), (len(int_rows), len(ext_rows)))
+        return result
+
+    def _save_state(self, state_key: Tuple[str, str, str], state: ReconcileState) -> None:
+        with self._lock:
+            self._states[state_key] = state
+            self._states.move_to_end(state_key)
+            while len(self._states) > RECONCILE_STATE_HISTORY:
+                self._states.popitem(last=False)
+
+    def reconcile_partitioned(
+        self,
+        df_internal,
+        df_external,
+        mapping: Dict[str, Dict[str, str]],
+        options: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Exact reconcile of ledgers too large to merge in memory. Both sides
+        (DataFrames or lazy PartitionedDatasets, read chunk by chunk) are
+        projected to the mapped columns and hash-partitioned by key into
+        scratch files; equal keys always land in the same partition, so
+        partitions are reconciled independently in worker processes and only
+        their results are combined. Peak memory is about one partition per
+        worker.
+
+        options:
+            partitions: number of partitions (default: enough for about
+                PARTITION_ROWS rows each, at least one per worker)
+            workers: worker processes (default RECONCILE_WORKERS)
+        """
+        options = options or {}
+        merge_keys = list(mapping['keys'].keys())
+        workers = max(1, int(options.get("workers", RECONCILE_WORKERS)))
+        partitions = int(options.get("partitions") or max(
+            workers, -(-(len(df_internal) + len(df_external)) // PARTITION_ROWS)
+        ))
+
+        if self.scratch_dir is not None:
+            os.makedirs(self.scratch_dir, exist_ok=True)
+        scratch = Path(tempfile.mkdtemp(prefix="reconcile-", dir=self.scratch_dir))
+        try:
+            int_pieces = _partition_side(df_internal, mapping, True, partitions, scratch / "internal")
+            ext_pieces = _partition_side(df_external, mapping, False, partitions, scratch / "external")
+            # Every side is stored under the internal column names
+            identity = {
+                'keys': {key: key for key in merge_keys},
+                'values': {col: col for col in mapping['values']},
+            }
+            jobs = [
+                (int_pieces[p], ext_pieces[p], identity)
+                for p in range(partitions)
+                if int_pieces[p] or ext_pieces[p]
+            ]
+            if workers == 1 or len(jobs) <= 1:
+                partials = [_reconcile_partition(*job) for job in jobs]
+            else:
+                with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+                    partials = list(pool.map(_reconcile_partition, *zip(*jobs)))
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+        parts = _combine_partials(partials, merge_keys, list(mapping['values'].keys()))
+        parts["total_internal"] = len(df_internal)
+        parts["total_external"] = len(df_external)
+        result = _result(parts, merge_keys)
+        result["summary"]["partitions"] = partitions
+        return result
+
+    def reconcile_aggregate(
+        self,
+        df_internal: pd.DataFrame,
+        df_external: pd.DataFrame,
+        mapping: Dict[str, Dict[str, str]],
+        options: Optional[Dict[str, Any]] = None,
+        internal_token: Optional[DatasetToken] = None,
+        external_token: Optional[DatasetToken] = None,
+    ) -> Dict[str, Any]:
+        """
+        Reconcile of many-to-many ledgers (e.g. several partial payments per
+        approval number): each side is first aggregated by key in one grouped
+        pass, then the one-row-per-key aggregates are reconciled exactly, so
+        nothing is paired row by row. Missing entries carry their number of
+        member rows ("member_rows"); `drilldown` lists the rows of a key.
+
+        options:
+            aggregations: {"value_col": "sum" | "count" | "first"} (default:
+                sum when the column is numeric on both sides, otherwise
+                first non-missing value)
+            tolerances: {"value_col": tolerance} (default TOLERANCE)
+        """
+        options = options or {}
+        merge_keys = list(mapping['keys'].keys())
+        compare_cols = list(mapping['values'].keys())
+        aggregations = options.get("aggregations") or {}
+        unknown = [col for col in aggregations if col not in mapping['values']]
+        if unknown:
+            raise ValueError(f"Aggregations for unmapped columns: {', '.join(unknown)}")
+
+        int_values = _values(df_internal, mapping['values'], internal=True)
+        ext_values = _values(df_external, mapping['values'], internal=False)
+        how = {
+            col: aggregations.get(col) or ("sum" if _summable(int_values[col]) and _summable(ext_values[col]) else "first")
+            for col in compare_cols
+        }
+
+        int_index = self.key_indexes.get(internal_token, df_internal, merge_keys)
+        ext_index = self.key_indexes.get(external_token, df_external, list(mapping['keys'].values()))
+        int_groups = _aggregate_side(int_index, merge_keys, int_values, how)
+        ext_groups = _aggregate_side(ext_index, merge_keys, ext_values, how)
+
+        # Both aggregates use the internal column names and have unique keys
+        identity = {
+            'keys': {key: key for key in merge_keys},
+            'values': {col: col for col in compare_cols},
+        }
+        parts = self._reconcile_frames(int_groups, ext_groups, identity, tolerance=options.get("tolerances") or TOLERANCE)
+        for field, groups in (("missing_in_external", int_groups), ("missing_in_internal", ext_groups)):
+            parts[field] = parts[field].merge(groups[merge_keys + ["member_rows"]], on=merge_keys, how="left")
+        parts["total_internal"] = len(df_internal)
+        parts["total_external"] = len(df_external)
+
+        result = _result(parts, merge_keys)
+        result["summary"].update({
+            "mode": "aggregate",
+            "internal_groups": len(int_groups),
+            "external_groups": len(ext_groups),
+            "aggregations": how,
+        })
+        return result
+
+    def drilldown(
+        self,
+        df_internal: pd.DataFrame,
+        df_external: pd.DataFrame,
+        mapping: Dict[str, Dict[str, str]],
+        key: Dict[str, Any],
+        internal_token: Optional[DatasetToken] = None,
+        external_token: Optional[DatasetToken] = None,
+        limit: int = MAX_DRILLDOWN_ROWS,
+    ) -> Dict[str, Any]:
+        """
+        Member rows of one key on both sides, e.g. the partial payments
+        behind an aggregate mismatch. `key` maps the internal key columns to
+        values as reconcile results report them (null for missing parts).
+        """
+        merge_keys = list(mapping['keys'].keys())
+        missing = [col for col in merge_keys if col not in key]
+        if missing:
+            raise ValueError(f"Key is missing columns: {', '.join(missing)}")
+        parts = [None if _is_missing(key[col]) else str(key[col]) for col in merge_keys]
+
+        sides = {}
+        for side, df, token, columns in (
+            ("internal", df_internal, internal_token, merge_keys),
+            ("external", df_external, external_token, list(mapping['keys'].values())),
+        ):
+            index = self.key_indexes.get(token, df, columns)
+            if all(part is not None for part in parts):
+                code = index.index.get_indexer([KEY_SEPARATOR.join(parts)])[0]
+                rows = np.flatnonzero(index.codes == code) if code >= 0 else np.empty(0, dtype=np.int64)
+            else:
+                # Keys with missing parts aren't in the index; compare column by column
+                match = np.ones(len(index), dtype=bool)
+                for col, part in zip(index.columns, parts):
+                    column = index.values[col]
+                    match &= (column.isna() if part is None else column == part).to_numpy(dtype=bool, na_value=False)
+                rows = np.flatnonzero(match)
+            members = df.iloc[rows[:max(0, limit)]]
+            sides[side] = {
+                "count": len(rows),
+                "truncated": len(rows) > limit,
+                "row": members.index.tolist(),
+                "rows": _records(members.reset_index(drop=True)),
+            }
+        return {"key": dict(zip(merge_keys, parts)), **sides}
+
+    def reconcile_fuzzy(
+        self,
+        df_internal: pd.DataFrame,
+        df_external: pd.DataFrame,
+        mapping: Dict[str, Dict[str, str]],
+        options: Optional[Dict[str, Any]] = None,
+        internal_token: Optional[DatasetToken] = None,
+        external_token: Optional[DatasetToken] = None,
+    ) -> Dict[str, Any]:
+        """
+        Tolerant matching for files that format keys differently or post a
+        day apart. Keys are normalized (see fuzzy_match.normalize_key);
+        candidates are blocked by normalized key and date bucket, scored, and
+        paired one-to-one, best confidence first. Matched pairs are then
+        compared like an exact reconcile, with per-column tolerances.
+
+        options:
+            date_columns: {"internal_col": "external_col"} used for blocking
+                (a single pair)
+            date_tolerance_days: max days between paired dates (default 1)
+            tolerances: {"value_col": tolerance} (default TOLERANCE)
+            strip_leading_zeros: drop leading zeros of keys (default true)
+            min_confidence: candidates below it are never paired (default 0)
+            max_block_pairs: skip keys with more candidate pairs than this
+        """
+        options = options or {}
+        merge_keys = list(mapping['keys'].keys())
+        ext_keys = list(mapping['keys'].values())
+        compare_cols = list(mapping['values'].keys())
+        tolerances = options.get("tolerances") or {}
+        day_tolerance = int(options.get("date_tolerance_days", 1))
+        strip_zeros = bool(options.get("strip_leading_zeros", True))
+
+        int_norm = fuzzy_match.normalize_keys(df_internal, merge_keys, strip_zeros)
+        ext_norm = fuzzy_match.normalize_keys(df_external, ext_keys, strip_zeros)
+
+        int_days = ext_days = None
+        date_columns = options.get("date_columns") or {}
+        if len(date_columns) > 1:
+            raise ValueError("Fuzzy reconcile blocks on one date column pair; got several date_columns")
+        if date_columns:
+            int_date, ext_date = next(iter(date_columns.items()))
+            int_days = fuzzy_match.day_numbers(self.column_cache.get(internal_token, df_internal, int_date, "datetime"))
+            ext_days = fuzzy_match.day_numbers(self.column_cache.get(external_token, df_external, ext_date, "datetime"))
+
+        int_pos, ext_pos, skipped_keys = fuzzy_match.candidate_pairs(
+            int_norm, ext_norm, int_days, ext_days, day_tolerance,
+            int(options.get("max_block_pairs", fuzzy_match.MAX_BLOCK_PAIRS)),
         )
 
-        # 1. Missing in External (Present in Internal only)
-        missing_in_external = merged[merged['_merge'] == 'left_only']
-        
-        # 2. Missing in Internal (Present in External only)
-        missing_in_internal = merged[merged['_merge'] == 'right_only']
+        # Score every candidate: raw key equality, date distance, value agreement
+        int_index = self.key_indexes.get(internal_token, df_internal, merge_keys)
+        ext_index = self.key_indexes.get(external_token, df_external, ext_keys)
+        raw_equal = np.ones(len(int_pos), dtype=bool)
+        for int_col, ext_col in zip(int_index.columns, ext_index.columns):
+            raw_equal &= int_index.values[int_col].to_numpy()[int_pos] == ext_index.values[ext_col].to_numpy()[ext_pos]
 
-        # 3. Value Mismatches
-        matched = merged[merged['_merge'] == 'both'].copy()
-        mismatches = []
-        
+        int_values = _values(df_internal, mapping['values'], internal=True)
+        ext_values = _values(df_external, mapping['values'], internal=False)
+        agreement = {}
         for col in compare_cols:
-            col_int = f"{col}_int"
-            # If the column didn't exist in one of them, it might be NaN, handled by float conversion usually
-            # But if we renamed, it should be col_int and col_ext
-            col_ext = f"{col}_ext"
-            
-            # Calculate difference
-            try:
-                # Try numeric comparison first
-                matched[f'{col}_diff'] = matched[col_int].astype(float) - matched[col_ext].astype(float)
-                diff_mask = matched[f'{col}_diff'].abs() > 0.01 
-                mismatch_rows = matched[diff_mask]
-                
-                for idx, row in mismatch_rows.iterrows():
-                    mismatches.append({
-                        "key": {k: row[k] for k in merge_keys},
-                        "column": col,
-                        "internal_value": row[col_int],
-                        "external_value": row[col_ext],
-                        "diff": row[f'{col}_diff']
-                    })
-            except Exception:
-                # Fallback for string comparison
-                diff_mask = matched[col_int].astype(str) != matched[col_ext].astype(str)
-                mismatch_rows = matched[diff_mask]
-                for idx, row in mismatch_rows.iterrows():
-                    mismatches.append({
-                        "key": {k: row[k] for k in merge_keys},
-                        "column": col,
-                        "internal_value": row[col_int],
-                        "external_value": row[col_ext],
-                        "diff": "Mismatch"
-                    })
-
-        # Calculate Net Financial Impact
-        net_financial_impact = 0.0
-        for m in mismatches:
-            if isinstance(m['diff'], (int, float)):
-                net_financial_impact += m['diff']
-
-        # Prepare results
-        # For missing records, we want to show the original columns if possible
-        # But since we renamed df_ext, the missing_in_internal will have internal-like column names
-        # This is actually better for consistency in the UI table.
+            mask, _ = compare_column(
+                int_values[col].iloc[int_pos].reset_index(drop=True),
+                ext_values[col].iloc[ext_pos].reset_index(drop=True),
+                tolerances.get(col, TOLERANCE),
+            )
+            agreement[col] = ~mask
 
+        days = fuzzy_match.day_difference(int_days, ext_days, int_pos, ext_pos)
+        confidence = (
+            fuzzy_match.key_confidence(raw_equal)
+            * fuzzy_match.date_confidence(days, day_tolerance, int_days is not None)
+            * fuzzy_match.value_confidence(agreement, len(int_pos))
+        )
+        eligible = np.flatnonzero(confidence >= float(options.get("min_confidence", 0.0)))
+        chosen = eligible[fuzzy_match.assign_one_to_one(int_pos[eligible], ext_pos[eligible], confidence[eligible])]
+        # Internal row order
+        chosen = chosen[np.argsort(int_pos[chosen], kind="stable")]
+        matched_int, matched_ext = int_pos[chosen], ext_pos[chosen]
+
+        int_hit = np.zeros(len(df_internal), dtype=bool)
+        int_hit[matched_int] = True
+        ext_hit = np.zeros(len(df_external), dtype=bool)
+        ext_hit[matched_ext] = True
+        missing_in_external = _rows(int_index, merge_keys, int_values, np.flatnonzero(~int_hit))
+        missing_in_internal = _rows(ext_index, merge_keys, ext_values, np.flatnonzero(~ext_hit))
+
+        mismatches = mismatch_frame(
+            _rows(int_index, merge_keys, {}, matched_int),
+            _rows(int_index, [], int_values, matched_int),
+            _rows(ext_index, [], ext_values, matched_ext),
+            tolerances,
+        )
+        net_financial_impact = float(np.nansum(mismatches['diff'].to_numpy(dtype=float)))
+
+        pair_confidence = confidence[chosen]
+        reported = slice(0, MAX_REPORTED_PAIRS)
         return {
             "summary": {
+                "mode": "fuzzy",
                 "total_internal": len(df_internal),
                 "total_external": len(df_external),
-                "matched_count": len(matched),
+                "candidate_pairs": len(int_pos),
+                "skipped_keys": skipped_keys,
+                "matched_count": len(chosen),
+                "exact_key_matches": int(raw_equal[chosen].sum()),
+                "normalized_key_matches": int((~raw_equal[chosen]).sum()),
+                "mean_confidence": round(float(pair_confidence.mean()), 4) if len(chosen) else None,
                 "missing_in_external_count": len(missing_in_external),
                 "missing_in_internal_count": len(missing_in_internal),
                 "value_mismatch_count": len(mismatches),
                 "net_financial_impact": round(net_financial_impact, 2)
             },
-            "missing_in_external": missing_in_external[merge_keys + compare_cols].to_dict(orient='records') if not missing_in_external.empty else [],
-            "missing_in_internal": missing_in_internal[merge_keys + compare_cols].to_dict(orient='records') if not missing_in_internal.empty else [],
-            "mismatches": mismatches
+            "matches": {
+                "count": len(chosen),
+                "truncated": len(chosen) > MAX_REPORTED_PAIRS,
+                "internal_row": df_internal.index.to_numpy()[matched_int[reported]].tolist(),
+                "external_row": df_external.index.to_numpy()[matched_ext[reported]].tolist(),
+                "internal_key": {key: int_index.values[col].to_numpy()[matched_int[reported]].tolist() for key, col in zip(merge_keys, int_index.columns)},
+                "external_key": {key: ext_index.values[col].to_numpy()[matched_ext[reported]].tolist() for key, col in zip(merge_keys, ext_index.columns)},
+                "confidence": np.round(pair_confidence[reported], 4).tolist(),
+                "date_diff_days": _json_values(pd.Series(days[chosen][reported])),
+            },
+            "missing_in_external": _records(missing_in_external),
+            "missing_in_internal": _records(missing_in_internal),
+            "mismatches": serialize_mismatches(mismatches, merge_keys)
         }
+
+
+def _result(parts: Dict[str, Any], merge_keys: List[str]) -> Dict[str, Any]:
+    """Response of an exact reconcile from its counts and frames."""
+    mismatches = parts["mismatches"]
+    # Net Financial Impact: text mismatches have no numeric diff
+    net_financial_impact = float(np.nansum(mismatches['diff'].to_numpy(dtype=float)))
+    return {
+        "summary": {
+            "total_internal": parts["total_internal"],
+            "total_external": parts["total_external"],
+            "matched_count": parts["matched_count"],
+            "missing_in_external_count": len(parts["missing_in_external"]),
+            "missing_in_internal_count": len(parts["missing_in_internal"]),
+            "value_mismatch_count": len(mismatches),
+            "net_financial_impact": round(net_financial_impact, 2)
+        },
+        "missing_in_external": _records(parts["missing_in_external"]),
+        "missing_in_internal": _records(parts["missing_in_internal"]),
+        "mismatches": serialize_mismatches(mismatches, merge_keys)
+    }
+
+
+def _partition_side(data, mapping: Dict[str, Dict[str, str]], internal: bool, partitions: int, root: Path) -> List[List[str]]:
+    """
+    Write one side's mapped columns (internal names, keys as strings) into
+    `partitions` hash buckets by key; returns the piece files per bucket.
+    """
+    sources = {
+        (col if internal else ext): col
+        for col, ext in list(mapping['keys'].items()) + list(mapping['values'].items())
+    }
+    keys = list(mapping['keys'].keys())
+    pieces: List[List[str]] = [[] for _ in range(partitions)]
+
+    if isinstance(data, PartitionedDataset):
+        chunks = data.iter_chunks(list(sources))
+    else:
+        chunks = (data.iloc[start:start + PARTITION_ROWS] for start in range(0, len(data), PARTITION_ROWS))
+
+    for i, chunk in enumerate(chunks):
+        frame = pd.DataFrame({name: chunk[source].reset_index(drop=True) for source, name in sources.items()})
+        joined = None
+        for key in keys:
+            frame[key] = frame[key].astype(str)
+            joined = frame[key] if joined is None else joined + KEY_SEPARATOR + frame[key]
+        bucket = pd.util.hash_array(joined.to_numpy(dtype=object)) % np.uint64(partitions)
+
+        order = np.argsort(bucket, kind="stable")
+        bounds = np.searchsorted(bucket[order], np.arange(partitions + 1, dtype=np.uint64))
+        for p in range(partitions):
+            if bounds[p] == bounds[p + 1]:
+                continue
+            piece = frame.iloc[order[bounds[p]:bounds[p + 1]]]
+            path = root / f"p{p:04d}-c{i:05d}.pkl"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            piece.to_pickle(path)
+            pieces[p].append(str(path))
+    return pieces
+
+
+def _reconcile_partition(int_paths: List[str], ext_paths: List[str], mapping: Dict[str, Dict[str, str]]) -> Dict[str, Any]:
+    """Process-pool worker: exact reconcile of one hash partition."""
+    columns = list(mapping['keys']) + list(mapping['values'])
+    df_int = _read_pieces(int_paths, columns)
+    df_ext = _read_pieces(ext_paths, columns)
+    return Reconciler()._reconcile_frames(df_int, df_ext, mapping)
+
+
+def _read_pieces(paths: List[str], columns: List[str]) -> pd.DataFrame:
+    if not paths:
+        return pd.DataFrame({col: pd.Series(dtype=object) for col in columns})
+    return pd.concat([pd.read_pickle(path) for path in paths], ignore_index=True)
+
+
+def _combine_partials(partials: List[Dict[str, Any]], merge_keys: List[str], compare_cols: List[str]) -> Dict[str, Any]:
+    """Concatenate partition results back into the key order of a single exact reconcile."""
+    def combined(field: str, by: List[str]) -> pd.DataFrame:
+        frames = [partial[field] for partial in partials if len(partial[field])]
+        if not frames:
+            return partials[0][field] if partials else pd.DataFrame(columns=merge_keys + compare_cols)
+        return _key_sorted(pd.concat(frames, ignore_index=True), by)
+
+    mismatches = combined("mismatches", ["column"] + merge_keys) if partials else mismatch_frame(
+        pd.DataFrame(columns=merge_keys), pd.DataFrame(columns=compare_cols), pd.DataFrame(columns=compare_cols)
+    )
+    return {
+        "matched_count": sum(partial["matched_count"] for partial in partials),
+        "missing_in_external": combined("missing_in_external", merge_keys),
+        "missing_in_internal": combined("missing_in_internal", merge_keys),
+        "mismatches": mismatches,
+    }
+
+
+def _is_missing(value) -> bool:
+    return value is None or (isinstance(value, float) and np.isnan(value))
+
+
+def _summable(series: pd.Series) -> bool:
+    return pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype)
+
+
+def _aggregate_side(index: KeyIndex, keys: List[str], values: Dict[str, pd.Series], how: Dict[str, str]) -> pd.DataFrame:
+    """
+    One row per key of a side: the key strings (named `keys`), each value
+    column aggregated over the key's rows as `how` says, and the number of
+    rows ("member_rows"). Groups are the KeyIndex codes, so one grouped pass.
+    """
+    for col, agg in how.items():
+        if agg not in AGGREGATIONS:
+            raise ValueError(f"Unknown aggregation '{agg}' for '{col}' (expected one of: {', '.join(AGGREGATIONS)})")
+        if agg == "sum" and not _summable(values[col]):
+            raise ValueError(f"Column '{col}' isn't numeric and can't be summed")
+
+    # Keys with missing parts form groups of their own, like NaN pairing
+    # with NaN in the exact outer merge
+    codes, null_keys = _group_codes(index)
+    n_keys = len(index.index) + len(null_keys)
+    _, firsts = np.unique(codes, return_index=True)
+    groups = pd.DataFrame({name: index.values[col].to_numpy()[firsts] for name, col in zip(keys, index.columns)})
+
+    if how:
+        frame = pd.DataFrame({col: series.reset_index(drop=True) for col, series in values.items()})
+        aggregated = frame.groupby(codes, sort=True).agg(how)
+        for col in how:
+            groups[col] = aggregated[col].reset_index(drop=True)
+    groups["member_rows"] = np.bincount(codes, minlength=n_keys)
+    return groups
+
+
+def _key_sorted(frame: pd.DataFrame, by: List[str]) -> pd.DataFrame:
+    """Rows in the key order of an exact reconcile (outer merge order)."""
+    if not len(frame):
+        return frame
+    return frame.sort_values(by, kind="stable", ignore_index=True)
+
+
+def _key_order(frame: pd.DataFrame, by: List[str]) -> np.ndarray:
+    """Row positions of `frame` in the order of `_key_sorted`."""
+    if not len(frame):
+        return np.empty(0, dtype=np.int64)
+    return frame[by].reset_index(drop=True).sort_values(by, kind="stable").index.to_numpy()
+
+
+def _hash_keys(joined: np.ndarray) -> np.ndarray:
+    return pd.util.hash_array(np.asarray(joined, dtype=object))
+
+
+def _joined_keys(columns: List[pd.Series]) -> np.ndarray:
+    """
+    One string per row over the key columns, missing parts written as
+    _NULL_KEY, so keys with gaps still hash (an outer merge pairs them with
+    equal keys of the other side, NaN matching NaN).
+    """
+    joined = columns[0].astype(object).fillna(_NULL_KEY).astype(str)
+    for column in columns[1:]:
+        joined = joined + KEY_SEPARATOR + column.astype(object).fillna(_NULL_KEY).astype(str)
+    return joined.to_numpy(dtype=object)
+
+
+def _group_codes(index: KeyIndex) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    KeyIndex codes with keys that have missing parts (code -1) numbered
+    after the complete ones, one group per distinct such key; also returns
+    those keys joined as in `_joined_keys`.
+    """
+    null_rows = np.flatnonzero(index.codes < 0)
+    if not len(null_rows):
+        return index.codes, np.empty(0, dtype=object)
+    null_codes, null_keys = pd.factorize(_joined_keys([index.values[col].iloc[null_rows] for col in index.columns]))
+    codes = index.codes.copy()
+    codes[null_rows] = len(index.index) + null_codes
+    return codes, np.asarray(null_keys, dtype=object)
+
+
+def _key_fingerprints(df: pd.DataFrame, index: KeyIndex, value_columns: List[str]) -> Tuple[np.ndarray, pd.DataFrame]:
+    """
+    Key hash of every row, plus per key hash the sum of its rows' content
+    fingerprints (order independent, wrapping uint64) and its row count.
+    Keys with missing parts (code -1 in the KeyIndex) get buckets of their own.
+    """
+    codes, null_keys = _group_codes(index)
+    unique_hashes = np.concatenate([_hash_keys(index.index.to_numpy(dtype=object)), _hash_keys(null_keys)])
+
+    if value_columns:
+        row_fp = pd.util.hash_pandas_object(
+            pd.DataFrame({col: df[col].reset_index(drop=True) for col in value_columns}), index=False
+        ).to_numpy()
+    else:
+        row_fp = np.zeros(len(df), dtype=np.uint64)
+
+    n_keys = len(unique_hashes)
+    order = np.argsort(codes, kind="stable")
+    counts = np.bincount(codes, minlength=n_keys)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]]).astype(np.int64)
+    present = counts > 0
+    sums = np.zeros(n_keys, dtype=np.uint64)
+    if len(order):
+        sums[present] = np.add.reduceat(row_fp[order], starts[present])
+    keys = pd.DataFrame({"fp": sums, "rows": counts}, index=pd.Index(unique_hashes, name="key"))
+    return unique_hashes[codes], keys
+
+
+def _changed_keys(old: pd.DataFrame, new: pd.DataFrame) -> np.ndarray:
+    """Key hashes added, removed or with different rows between two fingerprint tables."""
+    joined = old.join(new, how="outer", lsuffix="_old", rsuffix="_new")
+    differs = (
+        joined["fp_old"].isna() | joined["fp_new"].isna()
+        | (joined["fp_old"] != joined["fp_new"]) | (joined["rows_old"] != joined["rows_new"])
+    )
+    return joined.index[differs.to_numpy()].to_numpy(dtype=np.uint64)
+
+
+def _pair_count(int_keys: pd.DataFrame, ext_keys: pd.DataFrame, hashes: np.ndarray) -> int:
+    """Matched rows an outer merge produced for these keys (internal rows x external rows)."""
+    int_rows = int_keys["rows"].reindex(hashes, fill_value=0).to_numpy()
+    ext_rows = ext_keys["rows"].reindex(hashes, fill_value=0).to_numpy()
+    return int((int_rows * ext_rows).sum())
+
+
+def _frame_key_hashes(frame: pd.DataFrame, keys: List[str]) -> np.ndarray:
+    """Key hash per row of a result frame (keys are the stringified key columns)."""
+    if not len(frame):
+        return np.empty(0, dtype=np.uint64)
+    return _hash_keys(_joined_keys([frame[key] for key in keys]))
+
+
+def _delta(
+    old: Dict[str, Any],
+    new: Dict[str, Any],
+    before: Dict[str, pd.DataFrame],
+    after: Dict[str, pd.DataFrame],
+    merge_keys: List[str],
+    changed_keys: int,
+    rows: Tuple[int, int],
+) -> Dict[str, Any]:
+    """
+    What an incremental run added to and removed from each list, and how the
+    counts moved; `before`/`after` hold the entries of the changed keys.
+    """
+    delta = {
+        "mode": "incremental",
+        "changed_keys": changed_keys,
+        "rows_reconciled": {"internal": rows[0], "external": rows[1]},
+        "summary_change": {
+            "total_internal": new["total_internal"] - old["total_internal"],
+            "total_external": new["total_external"] - old["total_external"],
+            "matched_count": new["matched_count"] - old["matched_count"],
+        },
+    }
+    for field, count in _RESULT_FRAMES.items():
+        delta["summary_change"][count] = len(new[field]) - len(old[field])
+        # Entries of changed keys that came out the same aren't news
+        before_rows = _row_hashes(before[field])
+        after_rows = _row_hashes(after[field])
+        removed = before[field][~np.isin(before_rows, after_rows)]
+        added = after[field][~np.isin(after_rows, before_rows)]
+        if field == "mismatches":
+            delta[field] = {"added": serialize_mismatches(added, merge_keys), "removed": serialize_mismatches(removed, merge_keys)}
+        else:
+            delta[field] = {"added": _records(added), "removed": _records(removed)}
+    delta["summary_change"]["net_financial_impact"] = round(
+        float(np.nansum(after["mismatches"]["diff"].to_numpy(dtype=float)))
+        - float(np.nansum(before["mismatches"]["diff"].to_numpy(dtype=float))), 2
+    )
+    return delta
+
+
+def _row_hashes(frame: pd.DataFrame) -> np.ndarray:
+    if not len(frame):
+        return np.empty(0, dtype=np.uint64)
+    return pd.util.hash_pandas_object(frame.astype(str), index=False).to_numpy()
+
+
+def _align_unique(int_index: KeyIndex, ext_index: KeyIndex) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Row positions for one-row-per-key sides: internal-only rows, external-only
+    rows and the matched (internal, external) pairs, each in key order as an
+    outer merge would list them.
+    """
+    # Unique keys, so a key's position is its row's position
+    int_rows_by_key = np.empty(len(int_index), dtype=np.int64)
+    int_rows_by_key[int_index.codes] = np.arange(len(int_index))
+    ext_rows_by_key = np.empty(len(ext_index), dtype=np.int64)
+    ext_rows_by_key[ext_index.codes] = np.arange(len(ext_index))
+
+    found = int_index.lookup(ext_index)
+    has_match = found >= 0
+    matched_ext = ext_rows_by_key[has_match]
+    matched_int = int_rows_by_key[found[has_match]]
+    int_hit = np.zeros(len(int_index), dtype=bool)
+    int_hit[found[has_match]] = True
+
+    int_rank, ext_rank = int_index.rank(), ext_index.rank()
+    int_only = int_rows_by_key[~int_hit]
+    int_only = int_only[np.argsort(int_rank[int_index.codes[int_only]], kind="stable")]
+    ext_only = ext_rows_by_key[~has_match]
+    ext_only = ext_only[np.argsort(ext_rank[ext_index.codes[ext_only]], kind="stable")]
+    order = np.argsort(int_rank[int_index.codes[matched_int]], kind="stable")
+    return int_only, ext_only, matched_int[order], matched_ext[order]
+
+
+def _values(df: pd.DataFrame, values: Dict[str, str], internal: bool) -> Dict[str, pd.Series]:
+    """One side's value columns under their internal names."""
+    return {col: df[col if internal else ext] for col, ext in values.items()}
+
+
+def _rows(index: KeyIndex, keys: List[str], values: Dict[str, pd.Series], rows: np.ndarray) -> pd.DataFrame:
+    """Key strings (named `keys`) and value columns at row positions `rows`."""
+    picked = {name: index.values[col].to_numpy()[rows] for name, col in zip(keys, index.columns)}
+    for col, series in values.items():
+        picked[col] = series.iloc[rows].reset_index(drop=True)
+    return pd.DataFrame(picked, index=pd.RangeIndex(len(rows)))
+
+
+def _project(df: pd.DataFrame, index: KeyIndex, keys: List[str], values: Dict[str, str], internal: bool) -> pd.DataFrame:
+    """Key strings and value columns of one side under their internal names."""
+    projected = pd.DataFrame({name: index.values[col] for name, col in zip(keys, index.columns)})
+    for col, series in _values(df, values, internal).items():
+        projected[col] = series.reset_index(drop=True)
+    return projected
+
+
+def _side_values(merged: pd.DataFrame, keys: List[str], columns: List[str], suffix: str) -> pd.DataFrame:
+    """Key columns plus one side's value columns (suffix dropped) of a merged frame."""
+    picked = {key: merged[key] for key in keys}
+    for col in columns:
+        picked[col] = merged[col + suffix] if col + suffix in merged.columns else merged[col]
+    return pd.DataFrame(picked, index=merged.index)
+
+
+def compare_column(internal: pd.Series, external: pd.Series, tolerance: float = TOLERANCE) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (mismatch mask, diff) of two row-aligned columns. Values that convert to
+    float are compared within `tolerance` (a missing value on either side is
+    not a mismatch), the rest as strings with a NaN diff.
+    """
+    try:
+        diff = internal.to_numpy(dtype=float) - external.to_numpy(dtype=float)
+        with np.errstate(invalid="ignore"):
+            mask = np.abs(diff) > tolerance
+    except (TypeError, ValueError):
+        # Fallback for string comparison
+        mask = (internal.astype(str).to_numpy() != external.astype(str).to_numpy())
+        diff = np.full(len(mask), np.nan)
+    return mask, diff
+
+
+def mismatch_frame(keys: pd.DataFrame, internal: pd.DataFrame, external: pd.DataFrame, tolerance: Union[float, Dict[str, float]] = TOLERANCE) -> pd.DataFrame:
+    """
+    Long-format mismatches between two row-aligned frames with the same value
+    columns: one row per (row, column) that differs, with the row's keys,
+    `column`, `internal_value`, `external_value` and `diff` (internal -
+    external; NaN for columns compared as text).
+
+    Columns are compared by `compare_column`; `tolerance` can be given per
+    column ({column: tolerance}, TOLERANCE for the rest). The per column masks
+    are stacked into one (column, row) matrix and all mismatching cells are
+    gathered at once, grouped by column like the old row loop.
+    """
+    columns = list(internal.columns)
+    masks, diffs = [], []
+    for col in columns:
+        col_tolerance = tolerance.get(col, TOLERANCE) if isinstance(tolerance, dict) else tolerance
+        mask, diff = compare_column(internal[col], external[col], col_tolerance)
+        masks.append(mask)
+        diffs.append(diff)
+
+    if not columns:
+        col_pos = rows = np.empty(0, dtype=np.int64)
+    else:
+        col_pos, rows = np.nonzero(np.vstack(masks))
+    starts = np.searchsorted(col_pos, np.arange(len(columns) + 1))
+
+    def gather(frame: pd.DataFrame) -> np.ndarray:
+        parts = [
+            frame[col].to_numpy(dtype=object)[rows[starts[j]:starts[j + 1]]]
+            for j, col in enumerate(columns)
+        ]
+        return np.concatenate(parts) if parts else np.empty(0, dtype=object)
+
+    long = keys.iloc[rows].reset_index(drop=True)
+    long["column"] = pd.Categorical.from_codes(col_pos, categories=columns) if columns else pd.Categorical([])
+    long["internal_value"] = gather(internal)
+    long["external_value"] = gather(external)
+    long["diff"] = np.vstack(diffs)[col_pos, rows] if columns else np.empty(0)
+    return long
+
+
+def serialize_mismatches(mismatches: pd.DataFrame, keys: List[str]) -> Dict[str, Any]:
+    """
+    Column-wise JSON form of a mismatch frame: one list per field, keys
+    nested under "key". Text mismatches have diff "Mismatch".
+    """
+    diff = mismatches["diff"]
+    return {
+        "count": len(mismatches),
+        "key": {key: _json_values(mismatches[key]) for key in keys},
+        "column": mismatches["column"].astype(str).tolist(),
+        "internal_value": _json_values(mismatches["internal_value"]),
+        "external_value": _json_values(mismatches["external_value"]),
+        "diff": diff.astype(object).where(diff.notna(), "Mismatch").tolist(),
+    }
+
+
+def _json_values(series: pd.Series) -> List[Any]:
+    # NaN isn't valid JSON
+    return series.astype(object).where(series.notna(), None).tolist()
+
+
+def _records(frame: pd.DataFrame) -> List[Dict[str, Any]]:
+    if frame.empty:
+        return []
+    return frame.astype(object).where(frame.notna(), None).to_dict(orient='records')
@@ -2,31 +2,48 @@ import pandas as pd
 import numpy as np
 from typing import Dict, List, Any, Optional
 
+from app.core.column_cache import ParsedColumnCache, DatasetToken
+
 class FranchiseSettlement:
-    def check_integrity(self, admin_df: pd.DataFrame, call_df: Optional[pd.DataFrame], payment_df: Optional[pd.DataFrame], billing_df: Optional[pd.DataFrame]) -> Dict[str, Any]:
+    def __init__(self, column_cache: Optional[ParsedColumnCache] = None):
+        self.column_cache = column_cache or ParsedColumnCache()
+
+    def _parsed_time(self, df: pd.DataFrame, token: Optional[DatasetToken], primary: str, fallback: str) -> pd.Series:
+        """
+        `primary` parsed as datetime, falling back to `fallback` where it is
+        empty (or missing altogether); unparseable values become NaT.
+        """
+        result = pd.Series(pd.NaT, index=df.index, dtype="datetime64[ns]")
+        for col in (fallback, primary):
+            if col in df.columns:
+                raw = df[col]
+                present = raw.notna()
+                if raw.dtype == object or pd.api.types.is_string_dtype(raw.dtype):
+                    present &= raw != ""
+                result = result.mask(present, self.column_cache.get(token, df, col, "datetime"))
+        return result
+
+    def check_integrity(self, admin_df: pd.DataFrame, call_df: Optional[pd.DataFrame], payment_df: Optional[pd.DataFrame], billing_df: Optional[pd.DataFrame], admin_token: Optional[DatasetToken] = None) -> Dict[str, Any]:
         """
         Workflow A: Franchise Settlement - Integrity Check
         """
         results = []
         
         # Mocking logic: We assume 'admin_df' is the master list of trips
-        
-        for _, row in admin_df.iterrows():
+
+        # 1. Timestamp Validation (Payment vs Call), for all rows at once
+        # Mock column names
+        call_times = self._parsed_time(admin_df, admin_token, "call_time", "start_time")
+        pay_times = self._parsed_time(admin_df, admin_token, "payment_time", "end_time")
+        paid_before_call = (pay_times < call_times).to_numpy()
+
+        for position, (_, row) in enumerate(admin_df.iterrows()):
             status = "green"
             issues = []
             
-            # 1. Timestamp Validation (Payment vs Call)
-            # Mock column names
-            call_time = row.get("call_time") or row.get("start_time")
-            pay_time = row.get("payment_time") or row.get("end_time")
-            
-            if call_time and pay_time:
-                try:
-                    if pd.to_datetime(pay_time) < pd.to_datetime(call_time):
-                        status = "red"
-                        issues.append("Payment before Call")
-                except:
-                    pass
+            if paid_before_call[position]:
+                status = "red"
+                issues.append("Payment before Call")
 
             # 2. Status Check (Empty Car vs Payment)
             trip_status = row.get("status", "")
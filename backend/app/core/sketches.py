@@ -0,0 +1,62 @@
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+
+class KLLSketch:
+    """
+    KLL quantile sketch (Karnin, Lang, Liberty) over float values.
+
+    Keeps O(k log(n/k)) items in a hierarchy of compactors: level h holds
+    items that each stand for 2**h inputs. When a level overflows it is
+    sorted and every other item (random offset) is promoted to the next
+    level. Rank error is roughly 1.7/k; updates take whole arrays, so
+    appending a day of rows is a handful of sorts rather than a Python loop.
+    """
+
+    def __init__(self, k: int = 200, seed: Optional[int] = None):
+        self.k = k
+        self.n = 0
+        self.levels: List[np.ndarray] = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, values: Sequence[float]) -> None:
+        values = np.asarray(values, dtype="float64")
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        self.n += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+
+    def quantiles(self, qs: Sequence[float]) -> np.ndarray:
+        """Approximate quantiles (NaN while empty)."""
+        qs = np.asarray(qs, dtype="float64")
+        if self.n == 0:
+            return np.full(len(qs), np.nan)
+
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2.0 ** h) for h, level in enumerate(self.levels)])
+        order = np.argsort(items, kind="stable")
+        items, cumulative = items[order], np.cumsum(weights[order])
+        positions = np.searchsorted(cumulative, qs * cumulative[-1], side="left")
+        return items[np.clip(positions, 0, len(items) - 1)]
+
+    def _capacity(self, level: int) -> int:
+        # The top level holds k items, each level below 2/3 of the one above
+        depth = len(self.levels) - level - 1
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self) -> None:
+        level = 0
+        while level < len(self.levels):
+            if len(self.levels[level]) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(self.levels[level])
+                leftover = items[-1:] if len(items) % 2 else items[:0]
+                items = items[:len(items) - len(leftover)]
+                promoted = items[int(self._rng.integers(2))::2]
+                self.levels[level] = leftover
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            level += 1
@@ -403,7 +403,7 @@ class SmartTransformer:
                                 rename_map[agg_field] = agg["as"]
                         
                         if aggs:
-                            temp_df = temp_df.groupby(keys).agg(aggs).reset_index()
+                            temp_df = temp_df.groupby(keys, observed=True).agg(aggs).reset_index()
                             temp_df = temp_df.rename(columns=rename_map)
                             
                 elif op["type"] == "ORDER_BY":
@@ -0,0 +1,102 @@
+import hashlib
+import os
+import threading
+import uuid
+from pathlib import Path
+from typing import Optional, Union
+
+import pandas as pd
+import pyarrow.feather as feather
+
+# Bump when parsing/post-processing changes so stale entries aren't served
+CACHE_FORMAT_VERSION = "2"
+
+HASH_BLOCK_BYTES = 1024 * 1024
+
+
+def hash_stream(file_obj) -> str:
+    """SHA-256 of a seekable binary stream's full content; the stream is rewound afterwards."""
+    h = hashlib.sha256()
+    file_obj.seek(0)
+    for block in iter(lambda: file_obj.read(HASH_BLOCK_BYTES), b""):
+        h.update(block)
+    file_obj.seek(0)
+    return h.hexdigest()
+
+
+class UploadCache:
+    """
+    Content-addressed cache of parsed uploads.
+
+    Entries are keyed by the SHA-256 of the uploaded bytes (plus a variant,
+    e.g. the sheet name) and stored as uncompressed Arrow IPC (Feather v2)
+    files, so a hit is a memory-map instead of an Excel/CSV parse. The
+    directory is kept under `max_bytes` by evicting the least recently used
+    entries (file mtime is bumped on every hit).
+    """
+
+    SUFFIX = ".arrow"
+
+    def __init__(self, cache_dir: Union[str, Path], max_bytes: int):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _path(self, digest: str, variant: str = "") -> Path:
+        key = hashlib.sha1(f"{CACHE_FORMAT_VERSION}\x00{digest}\x00{variant}".encode("utf-8")).hexdigest()
+        return self.cache_dir / f"{key}{self.SUFFIX}"
+
+    def get(self, digest: str, variant: str = "") -> Optional[pd.DataFrame]:
+        path = self._path(digest, variant)
+        try:
+            table = feather.read_table(path, memory_map=True)
+            os.utime(path)
+        except (FileNotFoundError, OSError):
+            return None
+        return table.to_pandas()
+
+    def path(self, digest: str, variant: str = "") -> Optional[Path]:
+        """File of an existing entry (to be linked, not modified), or None."""
+        path = self._path(digest, variant)
+        return path if path.exists() else None
+
+    def put(self, digest: str, df: pd.DataFrame, variant: str = "") -> bool:
+        """
+        Store a parsed frame. Returns False (and caches nothing) for frames
+        Arrow can't represent, e.g. non-string column names or object columns
+        mixing numbers and text.
+        """
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self._path(digest, variant)
+        tmp_path = path.with_name(f".{uuid.uuid4().hex}.tmp")
+        try:
+            feather.write_feather(df, tmp_path, compression="uncompressed")
+            os.replace(tmp_path, path)
+        except Exception as exc:
+            print(f"Upload cache: not caching entry ({exc})")
+            if tmp_path.exists():
+                tmp_path.unlink()
+            return False
+
+        self._evict()
+        return True
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            for entry in self.cache_dir.glob(f"*{self.SUFFIX}"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, entry in sorted(entries, key=lambda e: e[0]):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    entry.unlink()
+                except FileNotFoundError:
+                    pass
+                total -= size
@@ -2,6 +2,7 @@ from app.core.processor import DataProcessor
 from app.core.agent import LLMAgent
 from app.core.etl_pipeline import ETLPipeline
 from app.core.anomaly import AnomalyDetector
+from app.core.anomaly_runs import AnomalyRunStore
 from app.core.reconciliation import Reconciler
 from app.core.smart_transformer import SmartTransformer
 from app.core.analytics_engine import AnalyticsEngine
@@ -9,17 +10,24 @@ from app.core.lineage import LineageTracker
 from app.core.dictionary import DataDictionary
 from app.core.settlement import FranchiseSettlement, BizSettlement
 from app.core.ontology import OntologyEngine
+from app.core.ingestion import IngestionJobManager
+from app.core.column_cache import ParsedColumnCache
 
 # Global State / Singletons
 processor = DataProcessor()
-agent = LLMAgent()
+# Parsed (datetime/numeric) columns shared by the engines below
+column_cache = ParsedColumnCache()
+agent = LLMAgent(column_cache)
 etl = ETLPipeline()
-anomaly_detector = AnomalyDetector()
-reconciler = Reconciler()
+anomaly_detector = AnomalyDetector(column_cache)
+# Stored anomaly results, served by page / as NDJSON
+anomaly_runs = AnomalyRunStore(processor.data_dir / "anomaly_runs")
+reconciler = Reconciler(column_cache=column_cache, scratch_dir=processor.data_dir / "reconcile")
 smart_transformer = SmartTransformer()
 analytics_engine = AnalyticsEngine()
 lineage_tracker = LineageTracker()
 data_dictionary = DataDictionary()
-franchise_settlement = FranchiseSettlement()
+franchise_settlement = FranchiseSettlement(column_cache)
 biz_settlement = BizSettlement()
 ontology_engine = OntologyEngine()
+ingestion_jobs = IngestionJobManager()
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Tests import the backend as `app`, like the server does
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.core.anomaly import AnomalyDetector
+
+RULES = {
+    "statistical_outliers": True,
+    "overlapping_time": {"start_col": "start", "end_col": "end", "user_id_col": "user"},
+    "zero_distance": {"distance_col": "distance", "amount_col": "fare"},
+}
+
+
+def _trips(rng, n, span, offset=0):
+    start = pd.Timestamp("2024-01-01") + pd.to_timedelta(np.sort(rng.integers(0, span, n)) + offset, unit="s")
+    end = start + pd.to_timedelta(rng.integers(60, 3600, n), unit="s")
+    return pd.DataFrame({
+        "user": rng.integers(0, 20, n),
+        "start": start.astype(str),
+        "end": end.astype(str),
+        "fare": rng.normal(100, 10, n),
+        "distance": rng.uniform(0, 10, n),
+    })
+
+
+def _keys(details, anomaly_type, first_new):
+    """Anomalies of a type that involve a row at or after `first_new`."""
+    keys = set()
+    for d in details:
+        if d["type"] != anomaly_type:
+            continue
+        if anomaly_type == "Overlapping Time":
+            if max(d["row_a"], d["row_b"]) >= first_new:
+                keys.add((d["row_a"], d["row_b"]))
+        elif d["row_index"] >= first_new:
+            keys.add(d["row_index"])
+    return keys
+
+
+@pytest.fixture
+def datasets():
+    rng = np.random.default_rng(0)
+    base = _trips(rng, 3000, span=1_000_000)
+    # Appended trips start after every existing one but may still overlap them
+    tail = _trips(rng, 200, span=20_000, offset=1_000_000)
+    tail.loc[tail.index[:5], "distance"] = 0
+    return base, pd.concat([base, tail], ignore_index=True)
+
+
+def test_first_run_is_full(datasets):
+    base, _ = datasets
+    result = AnomalyDetector().check_rules_incremental(base, RULES, "trips")
+    assert result["incremental"]["mode"] == "full"
+    assert result["total_anomalies"] == AnomalyDetector().check_rules(base, RULES)["total_anomalies"]
+
+
+def test_appended_rows_match_a_full_run(datasets):
+    base, full = datasets
+    detector = AnomalyDetector()
+    detector.check_rules_incremental(base, RULES, "trips")
+    result = detector.check_rules_incremental(full, RULES, "trips")
+    assert result["incremental"] == {"mode": "incremental", "rows_scanned": 200, "rows_seen": len(full)}
+
+    expected = AnomalyDetector().check_rules(full, RULES)["details"]
+    for anomaly_type in ("Overlapping Time", "Zero Distance Payment"):
+        assert _keys(result["details"], anomaly_type, len(base)) == _keys(expected, anomaly_type, len(base))
+
+
+def test_no_new_rows_scans_nothing(datasets):
+    base, _ = datasets
+    detector = AnomalyDetector()
+    detector.check_rules_incremental(base, RULES, "trips")
+    result = detector.check_rules_incremental(base, RULES, "trips")
+    assert result["incremental"]["rows_scanned"] == 0
+    assert result["total_anomalies"] == 0
+
+
+def test_replaced_dataset_runs_in_full(datasets):
+    base, _ = datasets
+    detector = AnomalyDetector()
+    detector.check_rules_incremental(base, RULES, "trips")
+    changed = base.copy()
+    changed.loc[0, "fare"] = 1.0
+    result = detector.check_rules_incremental(changed, RULES, "trips")
+    assert result["incremental"]["mode"] == "full"
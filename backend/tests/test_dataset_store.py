@@ -0,0 +1,81 @@
+import pandas as pd
+import pytest
+
+from app.core.dataset_store import DatasetStore
+from app.core.partitioned import PartitionedDataset
+
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame({"id": [1, 2, 3], "name": ["a", "b", None], "amount": [1.5, 2.0, 3.25]})
+
+
+def test_reload_from_manifest(tmp_path, frame):
+    store = DatasetStore(tmp_path / "store")
+    store["ledger.csv"] = frame
+    version = store.version("ledger.csv")
+
+    reopened = DatasetStore(tmp_path / "store")
+    assert "ledger.csv" in reopened
+    assert not reopened.is_resident("ledger.csv")
+    assert reopened.version("ledger.csv") == version
+    pd.testing.assert_frame_equal(reopened["ledger.csv"], frame)
+    assert reopened.is_resident("ledger.csv")
+
+
+def test_replace_bumps_version_and_survives_reload(tmp_path, frame):
+    store = DatasetStore(tmp_path / "store")
+    store["ledger.csv"] = frame
+    first = store.version("ledger.csv")
+    store["ledger.csv"] = frame.iloc[:1]
+    assert store.version("ledger.csv") > first
+
+    reopened = DatasetStore(tmp_path / "store")
+    assert len(reopened["ledger.csv"]) == 1
+
+
+def test_delete_keeps_partitions_referenced_by_another_name(tmp_path):
+    parts = PartitionedDataset.from_chunks([pd.DataFrame({"a": [1, 2]})], tmp_path / "parts")
+    store = DatasetStore(tmp_path / "store")
+    store["x"] = parts
+    store["y"] = store["x"]
+
+    del store["x"]
+    assert parts.path.exists()
+    assert len(store["y"]) == 2
+
+    del store["y"]
+    assert not parts.path.exists()
+
+
+def _sized(rows):
+    return pd.DataFrame({"value": range(rows)})
+
+
+def test_evicts_least_recently_used_within_budget(tmp_path):
+    size = int(_sized(1000).memory_usage(index=True, deep=True).sum())
+    store = DatasetStore(tmp_path / "store", memory_budget=int(size * 2.5))
+    for name in ("a", "b", "c"):
+        store[name] = _sized(1000)
+    store["a"]  # now most recently used
+    store["d"] = _sized(1000)
+
+    assert store.resident_bytes() <= store.memory_budget
+    assert not store.is_resident("b")
+    assert store.is_resident("a") and store.is_resident("d")
+    assert store.stats()["evictions"] >= 1
+
+    # Spilled datasets load again transparently
+    pd.testing.assert_frame_equal(store["b"], _sized(1000))
+
+
+def test_pinned_datasets_are_not_evicted(tmp_path):
+    size = int(_sized(1000).memory_usage(index=True, deep=True).sum())
+    store = DatasetStore(tmp_path / "store", memory_budget=int(size * 1.5))
+    store["pinned"] = _sized(1000)
+    store.pin("pinned")
+    store["other"] = _sized(1000)
+    store["third"] = _sized(1000)
+
+    assert store.is_resident("pinned")
+    assert not store.is_resident("other")
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.core import fuzzy_match
+from app.core.reconciliation import Reconciler
+
+MAPPING = {"keys": {"id": "ref"}, "values": {"amount": "value"}}
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("００１２-3４", "1234"),
+    ("ab-12 c", "AB12C"),
+    ("inv_007", "INV007"),
+    ("000", "0"),
+])
+def test_normalize_key(raw, expected):
+    assert fuzzy_match.normalize_key(pd.Series([raw])).tolist() == [expected]
+
+
+def test_normalize_key_keeps_leading_zeros_on_request():
+    assert fuzzy_match.normalize_key(pd.Series(["0042"]), strip_leading_zeros=False).tolist() == ["0042"]
+
+
+def test_normalize_key_drops_float_suffix():
+    assert fuzzy_match.normalize_key(pd.Series([12.0, 7.0, np.nan])).tolist()[:2] == ["12", "7"]
+    assert fuzzy_match.normalize_key(pd.Series([1.5])).tolist() == ["15"]
+
+
+def test_missing_keys_are_never_candidates():
+    keys = pd.Series(["A", None, "B"])
+    int_norm = fuzzy_match.normalize_key(keys)
+    ext_norm = fuzzy_match.normalize_key(pd.Series([None, "a", "b"]))
+    int_pos, ext_pos, skipped = fuzzy_match.candidate_pairs(int_norm, ext_norm)
+    assert sorted(zip(int_pos.tolist(), ext_pos.tolist())) == [(0, 1), (2, 2)]
+    assert skipped == 0
+
+
+def test_reconcile_matches_normalized_keys_within_day_tolerance():
+    internal = pd.DataFrame({
+        "id": ["００１２-3４", "A-9", "X1", None],
+        "amount": [10.0, 20.0, 30.0, 40.0],
+        "date": ["2024-01-01", "2024-01-05", "2024-01-10", "2024-01-10"],
+    })
+    external = pd.DataFrame({
+        "ref": ["1234", "a9", "x1", None],
+        "value": [10.0, 25.0, 30.0, 40.0],
+        "posted": ["2024-01-02", "2024-01-05", "2024-01-20", "2024-01-10"],
+    })
+    result = Reconciler().reconcile(
+        internal, external, MAPPING, mode="fuzzy",
+        options={"date_columns": {"date": "posted"}, "date_tolerance_days": 1},
+    )
+    summary = result["summary"]
+    assert summary["matched_count"] == 2
+    assert summary["normalized_key_matches"] == 2
+    assert summary["value_mismatch_count"] == 1
+    # X1 is ten days apart, and rows without a key never match
+    assert summary["missing_in_external_count"] == 2
+    assert summary["missing_in_internal_count"] == 2
+    assert result["matches"]["internal_row"] == [0, 1]
+    assert result["matches"]["date_diff_days"] == [-1, 0]
+
+
+def test_reconcile_rejects_several_date_columns():
+    df = pd.DataFrame({"id": ["1"], "amount": [1.0], "d1": ["2024-01-01"], "d2": ["2024-01-01"]})
+    ext = df.rename(columns={"id": "ref", "amount": "value"})
+    with pytest.raises(ValueError):
+        Reconciler().reconcile(df, ext, MAPPING, mode="fuzzy", options={"date_columns": {"d1": "d1", "d2": "d2"}})
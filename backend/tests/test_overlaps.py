@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.core.anomaly import AnomalyDetector
+
+
+@pytest.fixture
+def trips():
+    rng = np.random.default_rng(1)
+    n = 600
+    start = pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 20_000, n), unit="s")
+    end = start + pd.to_timedelta(rng.integers(-100, 7200, n), unit="s")
+    df = pd.DataFrame({
+        "uid": rng.integers(0, 20, n).astype(float),
+        "start": start.astype(str),
+        "end": end.astype(str),
+    })
+    # Gaps: trips without user, start or end
+    df.loc[::37, "uid"] = np.nan
+    df.loc[::41, "start"] = None
+    df.loc[::43, "end"] = None
+    return df
+
+
+def _brute_force(df):
+    parsed = df.assign(start=pd.to_datetime(df["start"]), end=pd.to_datetime(df["end"]))
+    pairs = set()
+    for _, group in parsed.dropna(subset=["uid", "start"]).groupby("uid"):
+        group = group.sort_values("start", kind="stable")
+        labels = list(group.index)
+        for i, a in enumerate(labels):
+            for b in labels[i + 1:]:
+                if pd.notna(group.at[a, "end"]) and group.at[a, "end"] > group.at[b, "start"]:
+                    pairs.add((a, b))
+    return pairs
+
+
+def test_all_pairs_matches_brute_force(trips):
+    found = AnomalyDetector().find_overlaps(trips, "start", "end", "uid", mode="all")
+    assert set(zip(found["row_a"], found["row_b"])) == _brute_force(trips)
+    assert not found.attrs["truncated"]
+
+
+def test_adjacent_pairs_are_a_subset_of_all_pairs(trips):
+    detector = AnomalyDetector()
+    adjacent = detector.find_overlaps(trips, "start", "end", "uid", mode="adjacent")
+    assert set(zip(adjacent["row_a"], adjacent["row_b"])) <= _brute_force(trips)
+
+
+def test_nested_trips_are_all_reported():
+    df = pd.DataFrame({
+        "uid": [1, 1, 1],
+        "start": ["2024-01-01 08:00", "2024-01-01 08:10", "2024-01-01 08:20"],
+        "end": ["2024-01-01 09:00", "2024-01-01 08:15", "2024-01-01 08:25"],
+    })
+    detector = AnomalyDetector()
+    found = detector.find_overlaps(df, "start", "end", "uid", mode="all")
+    assert set(zip(found["row_a"], found["row_b"])) == {(0, 1), (0, 2)}
+    adjacent = detector.find_overlaps(df, "start", "end", "uid", mode="adjacent")
+    assert set(zip(adjacent["row_a"], adjacent["row_b"])) == {(0, 1)}
+
+
+def test_max_pairs_truncates():
+    df = pd.DataFrame({
+        "uid": [1] * 4,
+        "start": ["2024-01-01 08:00"] * 4,
+        "end": ["2024-01-01 09:00"] * 4,
+    })
+    found = AnomalyDetector().find_overlaps(df, "start", "end", "uid", mode="all", max_pairs=2)
+    assert len(found) == 2
+    assert found.attrs["truncated"]